@@ -1,15 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import Annotated
+from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Annotated, Optional
 
 
-from backend import crud, models
-from backend.database import get_db
-from backend.schemas import LearningWebsiteCredentialCreate, LearningWebsiteCredential, SystemUserOut # 修正导入
-from backend.auth import get_current_system_user
+from backend import async_crud, models
+from backend.database import get_async_db
+from backend.schemas import LearningWebsiteCredentialCreate, LearningWebsiteCredentialOut, LearningWebsiteCredentialSummary, SystemUserOut # 修正导入
+from backend.auth import get_current_system_user, get_current_token_claims
 from backend.utils import auto_watcher_runner as auto_watcher_utils # 导入自动化运行工具
 from backend.utils.auto_watcher_runner import console_log # 修正：从 auto_watcher_runner 导入 console_log
 from backend import schemas # 导入 schemas
+from backend.utils.password_hasher import password_hasher
 
 router = APIRouter()
 
@@ -17,67 +18,63 @@ router = APIRouter()
 async def test_credentials_router():
     return {"message": "Credentials router is working!"}
 
-@router.post("/", response_model=LearningWebsiteCredential) # 用于添加或更新用户网站凭据
+@router.post("/", response_model=LearningWebsiteCredentialOut) # 用于添加或更新用户网站凭据
 async def add_learning_website_credential(
     credential: LearningWebsiteCredentialCreate, 
     current_user: SystemUserOut = Depends(get_current_system_user), # 依赖系统用户认证
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """ 添加或更新当前系统用户在学习网站的凭据（网站URL和视频列表URL）。 """
     # 不再需要密码验证，因为密码不再存储在后端
     # if credential.password != credential.password_confirm:
     #     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="两次输入的密码不一致！")
 
-    db_credential = crud.get_learning_website_credential_by_website_url_and_user(db, current_user.id, credential.website_url)
+    db_credential = await async_crud.get_learning_website_credential_by_website_url_and_user(db, current_user.id, credential.website_url)
     if db_credential:
         # 更新现有凭据
-        db_credential.website_name = credential.website_name # 新增：更新网站名称
-        db_credential.task_name = credential.task_name # 新增：更新任务名称
-        db_credential.learning_username = credential.learning_username
-        db_credential.phone_number = credential.phone_number
-        db_credential.video_list_url = credential.video_list_url
-        db_credential.learning_password = credential.learning_password # 新增：更新学习网站密码
-        db.commit()
-        db.refresh(db_credential)
-        return db_credential
+        return await async_crud.update_learning_website_credential(db, db_credential, credential)
     else:
         # 创建新凭据
-        return crud.create_learning_website_credential(db=db, system_user_id=current_user.id, credential=credential)
+        return await async_crud.create_learning_website_credential(db=db, system_user_id=current_user.id, credential=credential)
 
-@router.get("/all", response_model=list[LearningWebsiteCredential]) # 这是一个获取所有凭据的路由
+@router.get("/all", response_model=list[LearningWebsiteCredentialSummary]) # 这是一个获取所有凭据的路由
 async def get_all_learning_website_credentials(
-    current_user: Annotated[models.SystemUser, Depends(get_current_system_user)],
-    db: Session = Depends(get_db),
+    current_user: Annotated[schemas.TokenClaims, Depends(get_current_token_claims)],
+    db: AsyncSession = Depends(get_async_db),
+    include: Optional[str] = Query(None, pattern="^tasks$"), # include=tasks 时附带任务摘要
 ):
-    """ 获取当前用户的所有学习网站凭据。 """
+    """ 获取当前用户的所有学习网站凭据及其任务进度汇总。 """
     console_log(f"用户 {current_user.id}：尝试获取所有学习网站凭据列表。")
-    credentials = crud.get_all_learning_website_credentials_by_user_id(db, system_user_id=current_user.id)
+    credentials = await async_crud.get_learning_website_credential_summaries(db, system_user_id=current_user.id, include_tasks=include == "tasks")
     # 移除404判断，直接返回凭据列表（可能为空）
     # if not credentials:
     #     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="未找到学习网站凭据")
     console_log(f"用户 {current_user.id}：成功获取 {len(credentials)} 条学习网站凭据。")
     return credentials
 
-@router.get("/{credential_id}", response_model=LearningWebsiteCredential) # 新增：获取单个凭据详情
+@router.get("/{credential_id}", response_model=LearningWebsiteCredentialSummary) # 新增：获取单个凭据详情
 async def get_learning_website_credential_detail(
     credential_id: int,
-    current_user: Annotated[models.SystemUser, Depends(get_current_system_user)],
-    db: Session = Depends(get_db),
+    current_user: Annotated[schemas.TokenClaims, Depends(get_current_token_claims)],
+    db: AsyncSession = Depends(get_async_db),
+    include: Optional[str] = Query(None, pattern="^tasks$"), # include=tasks 时附带任务摘要
 ):
-    """ 获取单个学习网站凭据的详细信息。 """
-    db_credential = crud.get_learning_website_credential(db, credential_id=credential_id, system_user_id=current_user.id)
-    if not db_credential:
+    """ 获取单个学习网站凭据的详细信息及其任务进度汇总。 """
+    summaries = await async_crud.get_learning_website_credential_summaries(
+        db, system_user_id=current_user.id, credential_id=credential_id, include_tasks=include == "tasks"
+    )
+    if not summaries:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="未找到指定的学习网站凭据或无权限访问。")
-    return db_credential
+    return summaries[0]
 
 @router.delete("/{credential_id}", response_model=dict)
 async def delete_learning_website_credential(
     credential_id: int,
     current_user: Annotated[models.SystemUser, Depends(get_current_system_user)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     console_log(f"用户 {current_user.id}：尝试删除学习网站凭据，ID: {credential_id}。")
-    success = crud.delete_learning_website_credential(db, credential_id=credential_id, system_user_id=current_user.id)
+    success = await async_crud.delete_learning_website_credential(db, credential_id=credential_id, system_user_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="未找到或无权限删除该凭据")
     console_log(f"用户 {current_user.id}：成功删除凭据，ID: {credential_id}。")
@@ -88,10 +85,10 @@ async def launch_web_for_login(
     credential_id: int, # 新增 credential_id 参数
     current_user: Annotated[models.SystemUser, Depends(get_current_system_user)],
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     console_log(f"用户 {current_user.id}：尝试通过凭据 ID {credential_id} 启动浏览器。")
-    db_credential = crud.get_learning_website_credential(db, credential_id=credential_id, system_user_id=current_user.id)
+    db_credential = await async_crud.get_learning_website_credential(db, credential_id=credential_id, system_user_id=current_user.id)
     if not db_credential:
         raise HTTPException(status_code=404, detail="未找到指定的学习网站凭据")
 
@@ -143,19 +140,19 @@ async def view_learning_password(
     credential_id: int,
     system_user_credentials: schemas.SystemUserCredentials, # 接收系统用户名和密码
     current_user: Annotated[models.SystemUser, Depends(get_current_system_user)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """ 安全地获取学习网站密码，需要验证系统用户密码。 """
     console_log(f"用户 {current_user.id}：尝试查看凭据 ID {credential_id} 的学习网站密码。", current_user.id)
 
     # 1. 验证 credential_id 是否属于当前用户
-    db_credential = crud.get_learning_website_credential(db, credential_id=credential_id, system_user_id=current_user.id)
+    db_credential = await async_crud.get_learning_website_credential(db, credential_id=credential_id, system_user_id=current_user.id)
     if not db_credential:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="未找到指定的学习网站凭据或无权限查看。")
 
     # 2. 验证提供的系统密码是否与当前登录用户匹配且正确
     # 不再需要通过用户名获取用户，直接使用 current_user 对象
-    if not crud.verify_password(system_user_credentials.password, current_user.hashed_password):
+    if not await password_hasher.verify(system_user_credentials.password, current_user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="系统密码不正确。")
 
     # 3. 如果验证成功，返回学习网站密码
@@ -0,0 +1,87 @@
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend import async_crud, models, schemas
+from backend.auth import get_current_token_claims
+from backend.database import get_async_db
+from backend.utils.log_events import EVENT_TEMPLATES, format_event
+
+router = APIRouter()
+
+def _encode_cursor(entry: models.LogEntry) -> str:
+    """ 将一页中最后一条日志的 (timestamp, id) 编码为游标字符串 """
+    return f"{entry.timestamp.isoformat()},{entry.id}"
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """ 解析游标字符串，格式为 "<ISO 时间>,<日志ID>" """
+    try:
+        timestamp_text, entry_id = cursor.rsplit(",", 1)
+        return datetime.fromisoformat(timestamp_text), int(entry_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的分页游标。")
+
+def _entry_to_out(entry: models.LogEntry) -> schemas.LogEntryOut:
+    """ 转换为响应模型，带事件代码的日志在此按模板格式化消息（显示端格式化） """
+    username = entry.user.username if entry.user else None
+    message = entry.message
+    if entry.event_code:
+        message = format_event(entry.event_code, entry.params, entry.message, user_id=entry.user_id, username=username, task_id=entry.task_id, video_id=entry.video_id)
+    return schemas.LogEntryOut(
+        id=entry.id,
+        seq=entry.seq,
+        timestamp=entry.timestamp,
+        level=entry.level,
+        logger_name=entry.logger_name,
+        event_code=entry.event_code,
+        params=entry.params,
+        task_id=entry.task_id,
+        video_id=entry.video_id,
+        message=message,
+        user_id=entry.user_id,
+        username=username,
+        ip_address=entry.ip_address,
+    )
+
+@router.get("", response_model=schemas.LogEntryPage)
+async def query_logs(
+    start: Optional[datetime] = Query(None), # 起始时间（包含）
+    end: Optional[datetime] = Query(None), # 结束时间（不包含）
+    user_id: Optional[int] = Query(None), # 仅管理员可查询其他用户的日志
+    level: Optional[str] = Query(None), # 日志级别，多个级别用逗号分隔，例如 WARNING,ERROR
+    event: Optional[str] = Query(None), # 事件代码，多个代码用逗号分隔，例如 video.progress,task.completed
+    q: Optional[str] = Query(None, max_length=200), # 消息子串，匹配自由文本日志的消息和结构化日志的显示文本
+    cursor: Optional[str] = Query(None), # 上一页返回的 next_cursor
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: schemas.TokenClaims = Depends(get_current_token_claims),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """ 查询历史日志，按时间倒序返回，使用 (timestamp, id) 键集分页。普通用户只能查询自己的日志。 """
+    if not current_user.is_admin:
+        if user_id is not None and user_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="只能查询自己的日志。")
+        user_id = current_user.id
+
+    levels = [name.strip().upper() for name in level.split(",") if name.strip()] if level else None
+    entries = await async_crud.query_log_entries(
+        db,
+        start=start,
+        end=end,
+        user_id=user_id,
+        levels=levels,
+        event_codes=[code.strip() for code in event.split(",") if code.strip()] if event else None,
+        search=q,
+        cursor=_decode_cursor(cursor) if cursor else None,
+        limit=limit,
+    )
+
+    items = [_entry_to_out(entry) for entry in entries]
+    next_cursor = _encode_cursor(entries[-1]) if len(entries) == limit else None
+    return schemas.LogEntryPage(items=items, next_cursor=next_cursor)
+
+@router.get("/event-templates")
+async def get_event_templates(current_user: schemas.TokenClaims = Depends(get_current_token_claims)):
+    """ 返回事件代码到消息模板的映射，前端据此格式化实时推送的结构化日志 """
+    return EVENT_TEMPLATES
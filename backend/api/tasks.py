@@ -1,59 +1,59 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect, Depends, status, Query, Request # 导入 Request
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 import asyncio
 import logging
 import json # 导入 json 模块
 
-from backend import crud, schemas, models # 导入 models
-from backend.database import get_db, SessionLocal # 导入 SessionLocal
+from backend import async_crud, crud, schemas, models # 导入 models
+from backend.database import get_async_db, SessionLocal, AsyncSessionLocal # 导入 SessionLocal
 from backend.utils import auto_watcher_runner as auto_watcher_utils
-from backend.auth import get_current_system_user, verify_access_token # 导入 verify_access_token
-from backend.schemas import SystemUserOut, LaunchWebRequest
-from backend.utils.log_config import _websocket_log_queue # 导入全局日志队列
+from backend.auth import authenticate_token_claims, get_current_token_claims, verify_access_token # 导入 verify_access_token
+from backend.schemas import LaunchWebRequest
+from backend.utils import log_events
+from backend.utils.log_events import log_event
+from backend.utils.log_bus import log_bus, log_entry_to_event
+from backend.utils.metrics import ws_send_lag
+from backend.utils.log_hub import log_hub, encode_event, LogFilter, LogSubscription, SlowConsumerError # 导入日志分发中心
 from backend.context import RequestContext, get_request_context # 导入 RequestContext 和 get_request_context
+from backend.config import settings
 
 router = APIRouter()
 
-# 活跃的WebSocket连接，用于实时日志 (现在是所有连接的集合)
-active_websocket_connections: List[WebSocket] = []
+async def _pump_logs(websocket: WebSocket, subscription: LogSubscription):
+    """ 将订阅队列中的日志事件推送到单个 WebSocket 连接，队列为空时挂起等待。 """
+    async for frame in subscription:
+        # 每个连接拥有独立的推送任务，发送超时视为连接失效，不会拖慢其他连接
+        await asyncio.wait_for(websocket.send_text(frame), timeout=settings.WS_LOG_SEND_TIMEOUT) # 发送发布时已编码好的 JSON 字符串
+        subscription.mark_sent()
+        ws_send_lag.observe(subscription.last_send_lag)
+
+def _load_logs_from_db(after_seq: int, before_seq: int, log_filter: LogFilter) -> List[dict]:
+    """ 在线程池中执行：通过序列号索引范围扫描从数据库读取日志 """
+    db = SessionLocal()
+    try:
+        entries = crud.get_log_entries_in_seq_range(db, after_seq, before_seq, user_id=log_filter.user_id, limit=settings.WS_LOG_REPLAY_LIMIT, by_id=log_bus.seq_is_id)
+        return [event for event in map(log_entry_to_event, entries) if log_filter.matches(event)]
+    finally:
+        db.close()
 
-# 实时日志广播任务的标志
-log_broadcast_task = None
-
-async def broadcast_logs():
-    """ 后台任务：持续从队列中读取日志并广播给所有活跃的WebSocket连接。 """
-    global active_websocket_connections
-    logger = logging.getLogger(__name__)
-    last_processed_index = 0
-    while True:
-        try:
-            # 检查是否有新的日志
-            if len(_websocket_log_queue) > last_processed_index:
-                new_logs = list(_websocket_log_queue)[last_processed_index:]
-                for log_data in new_logs:
-                    for websocket in list(active_websocket_connections):
-                        try:
-                            await websocket.send_text(json.dumps(log_data)) # 发送 JSON 字符串
-                        except WebSocketDisconnect:
-                            logger.warning(
-                                "[WebSocket Broadcaster] 检测到断开连接，移除WebSocket。",
-                                extra={"user_id": log_data.get('user_id'), "username": log_data.get('username'), "ip_address": log_data.get('ip_address')}
-                            )
-                last_processed_index = len(_websocket_log_queue)
-            await asyncio.sleep(0.1) # 短暂休眠，避免CPU空转
-        except Exception as e:
-            logger.error(
-                f"[WebSocket Broadcaster] 发生未预期的错误: {e}",
-                extra={"user_id": None, "username": None, "ip_address": None} # 广播任务的通用错误，无法可靠获取用户上下文
-            )
-            await asyncio.sleep(1) # 错误时休眠长一点
+async def _replay_logs(websocket: WebSocket, subscription: LogSubscription, since: int):
+    """ 补发序列号在 (since, 订阅时刻] 范围内的日志：优先使用内存环形缓冲区，不足部分从数据库补齐。 """
+    events, ring_start = log_hub.replay_from_ring(since, subscription.start_seq, subscription.filter)
+    if since + 1 < ring_start:
+        db_events = await asyncio.to_thread(_load_logs_from_db, since, min(ring_start, subscription.start_seq + 1), subscription.filter)
+        events = db_events + events
+    for event in events[-settings.WS_LOG_REPLAY_LIMIT:]:
+        await asyncio.wait_for(websocket.send_text(encode_event(event)), timeout=settings.WS_LOG_SEND_TIMEOUT)
 
 @router.websocket("/ws/logs")
 async def websocket_endpoint(
     websocket: WebSocket, 
     token: str = Query(...), # 从查询参数中获取 token
-    db: Session = Depends(get_db) # 获取数据库会话
+    level: Optional[str] = Query(None), # 可选：最低日志级别，例如 WARNING
+    logger_name: Optional[str] = Query(None, alias="logger"), # 可选：逗号分隔的日志记录器名称前缀
+    filter_user_id: Optional[int] = Query(None, alias="user_id"), # 可选：仅管理员可指定要查看的用户ID
+    since: Optional[int] = Query(None), # 可选：客户端已收到的最后一个日志序列号，用于断线补发
 ):
     await websocket.accept()
 
@@ -67,6 +67,9 @@ async def websocket_endpoint(
     user_id = None
     username = None
     ip_address = None # 初始化
+    subscription = None
+    sender_task = None
+    receiver_task = None
 
     # 将整个逻辑包裹在一个大的 try-except-finally 块中
     try:
@@ -74,11 +77,9 @@ async def websocket_endpoint(
         if "client" in websocket.scope and websocket.scope["client"] is not None:
             ip_address = websocket.scope["client"][0] # (host, port)
         token_data = verify_access_token(token, credentials_exception) # 验证 token
-        # 尝试根据用户名或手机号找到用户
-        if token_data.learning_username: # 将 username 修改为 learning_username
-            user = crud.get_system_user_by_username(db, username=token_data.learning_username) # 将 username 修改为 learning_username
-        elif token_data.phone_number:
-            user = crud.get_system_user_by_phone_number(db, phone_number=token_data.phone_number)
+        # 尝试根据用户名或手机号找到用户；会话只在查询期间持有，不占用连接池直到连接断开
+        async with AsyncSessionLocal() as db:
+            user = await authenticate_token_claims(db, token_data) # 身份取自 JWT 声明，命中用户缓存时不会占用数据库连接
         
         if user is None:
             raise credentials_exception
@@ -86,40 +87,36 @@ async def websocket_endpoint(
         user_id = user.id
         username = user.username
         
-        # 将当前WebSocket添加到活跃连接列表
-        active_websocket_connections.append(websocket)
-        logging.getLogger(__name__).info(
-            f"用户 {user.username} 已连接到系统日志 WebSocket。总连接数: {len(active_websocket_connections)}",
-            extra={"user_id": user_id, "username": username, "ip_address": ip_address}
+        # 根据认证用户和查询参数确定订阅范围：普通用户只能接收自己的日志，管理员默认接收全部
+        subscribed_user_id = filter_user_id if user.is_admin else user_id
+        try:
+            log_filter = LogFilter.from_params(user_id=subscribed_user_id, level=level, logger=logger_name)
+        except ValueError as e:
+            await websocket.send_text(f"订阅参数无效: {e}")
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+        # 订阅日志分发中心，并启动该连接的推送任务
+        subscription = log_hub.subscribe(
+            log_filter,
+            max_buffer=settings.WS_LOG_BUFFER_SIZE,
+            overflow_policy=settings.WS_LOG_OVERFLOW_POLICY,
         )
-
-        # 启动日志广播任务（如果尚未启动）
-        global log_broadcast_task
-        if log_broadcast_task is None or log_broadcast_task.done():
-            log_broadcast_task = asyncio.create_task(broadcast_logs())
-            logging.getLogger(__name__).info(
-                "系统日志广播任务已启动。",
-                extra={"user_id": user_id, "username": username, "ip_address": ip_address}
-            )
-
-        # 发送历史日志（从数据库获取）
-        # 可以限制条数，例如最近100条
-        # historical_logs = db.query(models.LogEntry).order_by(models.LogEntry.timestamp.asc()).limit(100).all()
-        # for log_entry_obj in historical_logs:
-        #     log_data = {
-        #         "timestamp": log_entry_obj.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-        #         "level": log_entry_obj.level,
-        #         "message": log_entry_obj.message, # 直接使用数据库中存储的消息，因为它现在应该已经是预格式化好的
-        #         "user_id": log_entry_obj.user_id,
-        #         "username": log_entry_obj.user.username if log_entry_obj.user else None,
-        #         "ip_address": log_entry_obj.ip_address
-        #     }
-        #     await websocket.send_text(json.dumps(log_data)) # 发送 JSON 字符串
-
-        # 保持连接活跃，直到客户端断开
+        # 断线重连：先补发客户端错过的日志，期间产生的新日志暂存在订阅缓冲区中
+        if since is not None:
+            await _replay_logs(websocket, subscription, since)
+        sender_task = asyncio.create_task(_pump_logs(websocket, subscription))
+        log_event(logging.getLogger(__name__), logging.INFO, log_events.WS_LOG_CONNECTED, user_id, username, ip_address, connections=log_hub.subscriber_count)
+
+        # 保持连接活跃，直到客户端断开或推送任务异常结束
+        receiver_task = asyncio.create_task(websocket.receive_text())
         while True:
-            # 保持连接，可以监听ping/pong或简单地等待断开
-            await websocket.receive_text() # 只是为了保持连接，实际不处理接收到的消息
+            done, _ = await asyncio.wait({receiver_task, sender_task}, return_when=asyncio.FIRST_COMPLETED)
+            if sender_task in done:
+                sender_task.result() # 推送失败时抛出异常，由下方统一处理
+                break
+            receiver_task.result() # 客户端断开时抛出 WebSocketDisconnect
+            receiver_task = asyncio.create_task(websocket.receive_text()) # 实际不处理接收到的消息
 
     except HTTPException as e:
         logging.getLogger(__name__).warning(
@@ -128,11 +125,17 @@ async def websocket_endpoint(
         )
         await websocket.send_text(f"认证失败: {e.detail}")
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION) # 1008 表示策略违反，例如认证失败
-    except WebSocketDisconnect:
-        logging.getLogger(__name__).info(
-            f"用户 {user.username if 'user' in locals() else '未知'} 已断开系统日志 WebSocket 连接。总连接数: {len(active_websocket_connections)}",
+    except (SlowConsumerError, asyncio.TimeoutError) as e:
+        logging.getLogger(__name__).warning(
+            f"日志WebSocket消费过慢或发送超时，断开连接: {e or '发送超时'}",
             extra={"user_id": user_id, "username": username, "ip_address": ip_address}
         )
+        try:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER) # 1013 表示稍后重试
+        except Exception:
+            pass
+    except WebSocketDisconnect:
+        log_event(logging.getLogger(__name__), logging.INFO, log_events.WS_LOG_DISCONNECTED, user_id, username or '未知', ip_address)
     except Exception as e:
         logging.getLogger(__name__).error(
             f"日志WebSocket发生错误: {e}",
@@ -144,13 +147,17 @@ async def websocket_endpoint(
         except:
             pass
     finally:
-        # 从活跃连接列表中移除
-        if websocket in active_websocket_connections:
-            active_websocket_connections.remove(websocket)
-        logging.getLogger(__name__).info(
-            f"WebSocket连接已清理。当前活跃连接数: {len(active_websocket_connections)}",
-            extra={"user_id": user_id, "username": username, "ip_address": ip_address}
-        )
+        # 取消订阅并停止该连接的后台任务
+        for task in (sender_task, receiver_task):
+            if task is None:
+                continue
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception() # 取出已结束任务的异常，避免 "Task exception was never retrieved"
+        if subscription is not None:
+            log_hub.unsubscribe(subscription)
+        log_event(logging.getLogger(__name__), logging.INFO, log_events.WS_LOG_CLEANED, user_id, username, ip_address, connections=log_hub.subscriber_count)
 
 @router.get("/test")
 async def test_tasks_router():
@@ -162,7 +169,7 @@ async def launch_web_for_login(
     request: schemas.LaunchWebRequest, # 使用新的请求体模型
     background_tasks: BackgroundTasks,
     request_context: RequestContext = Depends(get_request_context), # 获取请求上下文
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     user_id = request_context.user_id
     username = request_context.username # 获取用户名
@@ -174,7 +181,7 @@ async def launch_web_for_login(
     # 使用带有用户ID、用户名和IP的日志记录
     auto_watcher_utils.console_log(f"收到启动Web登录请求，凭据ID: {credential_id}。", user_id, username, ip_address, level=logging.INFO)
 
-    credential = crud.get_learning_website_credential(db, credential_id=credential_id, system_user_id=user_id)
+    credential = await async_crud.get_learning_website_credential(db, credential_id=credential_id, system_user_id=user_id)
     if not credential:
         auto_watcher_utils.console_log(f"未找到凭据 ID {credential_id} 或无权限访问。", user_id, username, ip_address, level=logging.WARNING)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="未找到指定的凭据或无权限访问。")
@@ -205,9 +212,9 @@ async def launch_web_for_login(
 @router.post("/start-auto-watching") # 启动视频观看自动化任务
 async def start_watching(
     background_tasks: BackgroundTasks, 
-    current_user: SystemUserOut = Depends(get_current_system_user),
+    current_user: schemas.TokenClaims = Depends(get_current_token_claims),
     request_context: RequestContext = Depends(get_request_context), # 获取请求上下文
-    db: Session = Depends(get_db) # 重新添加 db 参数
+    db: AsyncSession = Depends(get_async_db) # 重新添加 db 参数
 ):
     """ 启动视频观看自动化任务，使用当前系统用户最近一个已登录的浏览器会话。 """
     user_id = request_context.user_id
@@ -217,7 +224,7 @@ async def start_watching(
     # auto_watcher_utils.console_log("Received start-watching request!") # 已经有下面的更详细日志，这里可以删除
 
     # 获取用户的学习网站凭据，以获取固定的视频列表URL
-    credential = crud.get_learning_website_credential_by_user(db, system_user_id=user_id)
+    credential = await async_crud.get_learning_website_credential_by_user(db, system_user_id=user_id)
     if not credential or not credential.video_list_url:
         auto_watcher_utils.console_log(f"没有找到学习网站凭据或未设置视频列表URL。", user_id, system_username, ip_address, level=logging.WARNING)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="没有找到学习网站凭据或未设置视频列表URL。请先在凭据设置页面添加并设置。")
@@ -241,43 +248,55 @@ async def start_watching(
 
     return {"message": "学习任务已在后台启动。"}
 
+@router.get("/progress-summary", response_model=schemas.TaskProgressSummary) # 任务进度汇总，需在 /{task_id} 之前注册
+async def get_task_progress_summary(
+    by: str = Query("credential", pattern="^(credential|user)$"), # credential：按当前用户的凭据汇总；user：按系统用户汇总（仅管理员）
+    current_user: schemas.TokenClaims = Depends(get_current_token_claims),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """ 在数据库中按凭据或按系统用户分组汇总任务数、完成数、学时和进度，返回固定大小的统计结果。 """
+    if by == "user":
+        if not current_user.is_admin:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="只有管理员可以按用户汇总任务进度。")
+        return await async_crud.get_task_progress_summary(db, group_by="user")
+    return await async_crud.get_task_progress_summary(db, group_by="credential", system_user_id=current_user.id)
+
 @router.get("/{task_id}", response_model=schemas.LearningTaskDetail) # 新增：获取单个任务详情
 async def get_task_detail(
     task_id: int,
-    current_user: SystemUserOut = Depends(get_current_system_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.TokenClaims = Depends(get_current_token_claims),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """ 获取单个学习任务的详细信息，包括其关联的视频列表。 """
     user_id = current_user.id
     
     # 获取任务，并通过 credential_id 确保任务属于当前用户
-    db_task = crud.get_learning_task(db, task_id=task_id)
+    db_task = await async_crud.get_learning_task(db, task_id=task_id)
     if not db_task or db_task.credential.system_user_id != user_id: # 检查任务是否属于当前用户
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="未找到指定的任务或无权限访问。")
         
     return db_task
 
-@router.get("/credentials/{credential_id}/tasks", response_model=List[schemas.LearningTaskDetail]) # 新增：获取某个凭据下的所有任务详情
+@router.get("/credentials/{credential_id}/tasks", response_model=List[schemas.LearningTaskSummary]) # 新增：获取某个凭据下的所有任务摘要
 async def get_tasks_for_credential(
     credential_id: int,
-    current_user: SystemUserOut = Depends(get_current_system_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.TokenClaims = Depends(get_current_token_claims),
+    db: AsyncSession = Depends(get_async_db),
+    include: Optional[str] = Query(None, pattern="^videos$"), # include=videos 时附带每个任务的视频列表
 ):
-    """ 获取某个学习网站凭据下的所有学习任务详情，包括每个任务关联的视频列表。 """
+    """ 获取某个学习网站凭据下的所有学习任务摘要（视频数和完成数），视频列表按需展开或通过任务详情接口获取。 """
     user_id = current_user.id
     
     # 验证凭据是否存在且属于当前用户
-    db_credential = crud.get_learning_website_credential(db, credential_id=credential_id, system_user_id=user_id)
+    db_credential = await async_crud.get_learning_website_credential(db, credential_id=credential_id, system_user_id=user_id)
     if not db_credential:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="未找到指定的凭据或无权限访问。")
 
-    tasks = crud.get_learning_tasks_by_credential_id_with_videos(db, credential_id=credential_id)
-    
-    return tasks
+    return await async_crud.get_learning_task_summaries(db, [credential_id], include_videos=include == "videos")
 
 @router.post("/close-user-browser")
 async def close_browser(
-    current_user: SystemUserOut = Depends(get_current_system_user),
+    current_user: schemas.TokenClaims = Depends(get_current_token_claims),
     request_context: RequestContext = Depends(get_request_context) # 获取请求上下文
 ):
     user_id = request_context.user_id
@@ -291,7 +310,7 @@ async def close_browser(
 @router.post("/stop-auto-watching") # 新增路由：停止自动化学习任务并关闭浏览器
 async def stop_auto_watching(
     background_tasks: BackgroundTasks, # 移动到前面
-    current_user: SystemUserOut = Depends(get_current_system_user),
+    current_user: schemas.TokenClaims = Depends(get_current_token_claims),
     request_context: RequestContext = Depends(get_request_context) # 获取请求上下文
 ):
     user_id = request_context.user_id
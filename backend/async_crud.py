@@ -0,0 +1,342 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Text, and_, case, cast, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+
+from backend import models, schemas
+from backend.utils.log_events import event_codes_matching
+from backend.utils.password_hasher import password_hasher
+from backend.utils.user_cache import user_cache
+
+# FastAPI 路由使用的异步 CRUD 操作；同名的同步版本在 crud.py 中，供后台自动化任务使用，只有一方使用的查询只保留一份。
+# AsyncSession 不支持隐式的延迟加载，响应模型需要用到的关联对象都在查询时预先加载。
+
+# 删除凭据时需要加载任务和视频，以便 ORM 级联删除
+_CREDENTIAL_WITH_TASKS = selectinload(models.LearningWebsiteCredential.tasks).selectinload(models.LearningTask.videos)
+
+def _column_values(obj) -> dict:
+    """ 取出 ORM 对象的列值，构造精简响应模型时不会触发关联对象的延迟加载 """
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+# --- 系统用户 (SystemUser) CRUD 操作 ---
+async def get_system_user_by_username(db: AsyncSession, username: str):
+    """ 根据用户名获取系统用户 """
+    result = await db.execute(select(models.SystemUser).where(models.SystemUser.username == username))
+    return result.scalars().first()
+
+async def get_system_user_by_phone_number(db: AsyncSession, phone_number: str):
+    """ 根据手机号码获取系统用户 """
+    result = await db.execute(select(models.SystemUser).where(models.SystemUser.phone_number == phone_number))
+    return result.scalars().first()
+
+async def get_system_user_by_username_or_phone(db: AsyncSession, username_or_phone: str):
+    """ 根据用户名或手机号码获取系统用户 """
+    if username_or_phone.isdigit() and len(username_or_phone) == 11: # 假设中国手机号码为11位数字
+        return await get_system_user_by_phone_number(db, username_or_phone)
+    return await get_system_user_by_username(db, username_or_phone)
+
+async def create_system_user(db: AsyncSession, user: schemas.SystemUserCreate):
+    """ 创建一个新的系统用户 """
+    db_user = models.SystemUser(
+        username=user.username,
+        phone_number=user.phone_number,
+        hashed_password=await password_hasher.hash(user.password), # 在线程池中哈希，不阻塞事件循环
+        is_active=user.is_active,
+        is_approved=user.is_approved
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def get_system_user(db: AsyncSession, user_id: int):
+    """ 根据ID获取系统用户 """
+    return await db.get(models.SystemUser, user_id)
+
+async def get_unapproved_system_users(db: AsyncSession):
+    """ 获取所有未审批的系统用户 """
+    result = await db.execute(select(models.SystemUser).where(models.SystemUser.is_approved == False))
+    return result.scalars().all()
+
+async def approve_system_user(db: AsyncSession, user_id: int):
+    """ 审批指定ID的系统用户 """
+    db_user = await db.get(models.SystemUser, user_id)
+    if db_user:
+        db_user.is_approved = True
+        await db.commit()
+        await db.refresh(db_user)
+        user_cache.invalidate_user(db_user) # 使已认证用户缓存中的旧记录失效
+    return db_user
+
+async def revoke_system_user_tokens(db: AsyncSession, user_id: int):
+    """ 递增用户的 token_version，使其已签发的所有 token 失效 """
+    db_user = await db.get(models.SystemUser, user_id)
+    if db_user:
+        db_user.token_version = (db_user.token_version or 0) + 1
+        await db.commit()
+        user_cache.invalidate_user(db_user)
+    return db_user
+
+# --- 学习网站凭据 (LearningWebsiteCredential) CRUD 操作 ---
+async def get_learning_website_credential_by_website_url_and_user(db: AsyncSession, system_user_id: int, website_url: str):
+    """ 根据系统用户ID和网站 URL 获取学习网站凭据 """
+    result = await db.execute(
+        select(models.LearningWebsiteCredential).where(
+            models.LearningWebsiteCredential.system_user_id == system_user_id,
+            models.LearningWebsiteCredential.website_url == website_url
+        )
+    )
+    return result.scalars().first()
+
+async def get_learning_website_credential_by_user(db: AsyncSession, system_user_id: int):
+    """ 根据系统用户ID获取其学习网站凭据（假设每个用户只有一个） """
+    result = await db.execute(
+        select(models.LearningWebsiteCredential).where(models.LearningWebsiteCredential.system_user_id == system_user_id)
+    )
+    return result.scalars().first()
+
+async def get_all_learning_website_credentials_by_user_id(db: AsyncSession, system_user_id: int):
+    """ 获取特定系统用户的所有学习网站凭据 """
+    result = await db.execute(
+        select(models.LearningWebsiteCredential).where(
+            models.LearningWebsiteCredential.system_user_id == system_user_id
+        )
+    )
+    return result.scalars().all()
+
+async def get_learning_website_credential(db: AsyncSession, credential_id: int, system_user_id: int):
+    """ 根据 ID 和系统用户ID获取学习网站凭据 """
+    result = await db.execute(
+        select(models.LearningWebsiteCredential).where(
+            models.LearningWebsiteCredential.id == credential_id,
+            models.LearningWebsiteCredential.system_user_id == system_user_id
+        )
+    )
+    return result.scalars().first()
+
+async def create_learning_website_credential(db: AsyncSession, system_user_id: int, credential: schemas.LearningWebsiteCredentialCreate):
+    """ 为特定系统用户创建一个新的学习网站凭据 """
+    db_credential = models.LearningWebsiteCredential(
+        system_user_id=system_user_id,
+        website_url=credential.website_url,
+        website_name=credential.website_name,
+        learning_username=credential.learning_username,
+        learning_password=credential.learning_password,
+    )
+    db.add(db_credential)
+    await db.commit()
+    await db.refresh(db_credential, ["created_at", "updated_at"]) # 加载服务端默认值
+    return db_credential
+
+async def update_learning_website_credential(db: AsyncSession, db_credential: models.LearningWebsiteCredential, credential: schemas.LearningWebsiteCredentialCreate):
+    """ 更新已有的学习网站凭据 """
+    db_credential.website_name = credential.website_name
+    db_credential.learning_username = credential.learning_username
+    db_credential.phone_number = credential.phone_number
+    db_credential.learning_password = credential.learning_password
+    await db.commit()
+    await db.refresh(db_credential, ["updated_at"])
+    return db_credential
+
+async def delete_learning_website_credential(db: AsyncSession, credential_id: int, system_user_id: int):
+    """ 删除指定ID的学习网站凭据，并确保属于当前系统用户 """
+    # 级联删除任务和视频需要先加载关联对象
+    result = await db.execute(
+        select(models.LearningWebsiteCredential).options(_CREDENTIAL_WITH_TASKS).where(
+            models.LearningWebsiteCredential.id == credential_id,
+            models.LearningWebsiteCredential.system_user_id == system_user_id
+        )
+    )
+    db_credential = result.scalars().first()
+    if db_credential:
+        await db.delete(db_credential)
+        await db.commit()
+        return True
+    return False
+
+# --- 学习任务 (LearningTask) CRUD 操作 ---
+async def get_learning_task(db: AsyncSession, task_id: int, credential_id: int = None):
+    """ 根据任务ID和可选的凭据ID获取学习任务及其所有视频和所属凭据 """
+    query = select(models.LearningTask).options(
+        selectinload(models.LearningTask.videos),
+        joinedload(models.LearningTask.credential),
+    ).where(models.LearningTask.id == task_id)
+    if credential_id is not None:
+        query = query.where(models.LearningTask.credential_id == credential_id)
+    result = await db.execute(query)
+    return result.scalars().first()
+
+def _progress_rollup_columns():
+    """ 任务进度汇总的聚合列：任务数、完成数、总学时、已完成学时、学时加权进度之和、进度之和、有进度的任务数 """
+    task = models.LearningTask
+    hours = func.coalesce(task.study_hours_value, 0)
+    return (
+        func.count(task.id).label("task_count"),
+        func.coalesce(func.sum(case((task.is_completed.is_(True), 1), else_=0)), 0).label("completed_task_count"),
+        func.coalesce(func.sum(hours), 0).label("total_hours"),
+        func.coalesce(func.sum(case((task.is_completed.is_(True), hours), else_=0)), 0).label("completed_hours"),
+        func.coalesce(func.sum(hours * func.coalesce(task.progress_percent, 0)), 0).label("weighted_progress"),
+        func.coalesce(func.sum(task.progress_percent), 0).label("progress_sum"),
+        func.count(task.progress_percent).label("progress_count"),
+    )
+
+def _to_progress_rollup(row, id=None, name=None) -> schemas.TaskProgressRollup:
+    """ 由聚合结果计算汇总行（数据库返回的 Decimal 转为 float） """
+    total_hours = float(row.total_hours)
+    if total_hours > 0:
+        percent_complete = float(row.weighted_progress) / total_hours
+    else:
+        percent_complete = float(row.progress_sum) / row.progress_count if row.progress_count else 0.0
+    return schemas.TaskProgressRollup(
+        id=id,
+        name=name,
+        task_count=row.task_count,
+        completed_task_count=int(row.completed_task_count),
+        total_hours=round(total_hours, 2),
+        completed_hours=round(float(row.completed_hours), 2),
+        percent_complete=round(percent_complete, 2),
+    )
+
+async def get_task_progress_summary(db: AsyncSession, group_by: str, system_user_id: Optional[int] = None) -> schemas.TaskProgressSummary:
+    """
+    在数据库中按凭据（group_by="credential"）或按系统用户（group_by="user"）汇总任务进度，不加载任务行。
+    指定 system_user_id 时只统计该用户的凭据；合计行由同样的聚合在一次查询中得到。
+    """
+    task = models.LearningTask
+    credential = models.LearningWebsiteCredential
+    if group_by == "user":
+        user = models.SystemUser
+        keys = (user.id, user.username)
+        source = select(*keys, *_progress_rollup_columns()).select_from(user).outerjoin(credential, credential.system_user_id == user.id)
+    else:
+        keys = (credential.id, credential.website_name)
+        source = select(*keys, *_progress_rollup_columns()).select_from(credential)
+    source = source.outerjoin(task, task.credential_id == credential.id)
+    total_query = select(*_progress_rollup_columns()).select_from(credential).join(task, task.credential_id == credential.id)
+    if system_user_id is not None:
+        source = source.where(credential.system_user_id == system_user_id)
+        total_query = total_query.where(credential.system_user_id == system_user_id)
+
+    rows = (await db.execute(source.group_by(*keys).order_by(keys[0]))).all()
+    total = (await db.execute(total_query)).one()
+    return schemas.TaskProgressSummary(
+        group_by=group_by,
+        items=[_to_progress_rollup(row, id=row[0], name=row[1]) for row in rows],
+        total=_to_progress_rollup(total),
+    )
+
+async def get_learning_task_summaries(db: AsyncSession, credential_ids: List[int], include_videos: bool = False) -> List[schemas.LearningTaskSummary]:
+    """
+    获取若干凭据下的任务摘要，视频数和完成数由一次分组子查询得到，子查询只统计这些凭据下任务的视频；
+    include_videos 为真时才加载视频列表
+    """
+    if not credential_ids:
+        return []
+    task = models.LearningTask
+    video = models.LearningVideo
+    video_counts = select(
+        video.task_id,
+        func.count(video.id).label("video_count"),
+        func.sum(case((video.is_completed.is_(True), 1), else_=0)).label("completed_video_count"),
+    ).join(task, task.id == video.task_id).where(task.credential_id.in_(credential_ids)).group_by(video.task_id).subquery()
+    query = select(
+        task,
+        func.coalesce(video_counts.c.video_count, 0),
+        func.coalesce(video_counts.c.completed_video_count, 0),
+    ).outerjoin(video_counts, video_counts.c.task_id == task.id).where(task.credential_id.in_(credential_ids)).order_by(task.id)
+    if include_videos:
+        query = query.options(selectinload(task.videos))
+    summaries = []
+    for db_task, video_count, completed_video_count in (await db.execute(query)).all():
+        values = _column_values(db_task)
+        if include_videos:
+            values["videos"] = sorted(db_task.videos, key=lambda db_video: db_video.id)
+        summaries.append(schemas.LearningTaskSummary.model_validate({
+            **values, "video_count": video_count, "completed_video_count": int(completed_video_count),
+        }))
+    return summaries
+
+async def get_learning_website_credential_summaries(
+    db: AsyncSession, system_user_id: int, credential_id: Optional[int] = None, include_tasks: bool = False
+) -> List[schemas.LearningWebsiteCredentialSummary]:
+    """
+    获取系统用户的凭据摘要（可只取一个凭据）：每个凭据的任务数、学时和进度由一次分组查询得到，
+    响应大小与任务和视频数量无关；include_tasks 为真时附带任务摘要（不含视频）。
+    """
+    credential = models.LearningWebsiteCredential
+    task = models.LearningTask
+    query = select(credential).where(credential.system_user_id == system_user_id).order_by(credential.id)
+    if credential_id is not None:
+        query = query.where(credential.id == credential_id)
+    credentials = (await db.execute(query)).scalars().all()
+    credential_ids = [db_credential.id for db_credential in credentials]
+    if not credential_ids:
+        return []
+
+    rollup_rows = (await db.execute(
+        select(task.credential_id, *_progress_rollup_columns()).where(task.credential_id.in_(credential_ids)).group_by(task.credential_id)
+    )).all()
+    rollups = {row.credential_id: row for row in rollup_rows}
+    tasks_by_credential = {}
+    if include_tasks:
+        for task_summary in await get_learning_task_summaries(db, credential_ids):
+            tasks_by_credential.setdefault(task_summary.credential_id, []).append(task_summary)
+
+    summaries = []
+    for db_credential in credentials:
+        row = rollups.get(db_credential.id)
+        progress = _to_progress_rollup(row, id=db_credential.id, name=db_credential.website_name) if row else schemas.TaskProgressRollup(id=db_credential.id, name=db_credential.website_name)
+        summaries.append(schemas.LearningWebsiteCredentialSummary.model_validate({
+            **_column_values(db_credential),
+            "progress": progress,
+            "tasks": tasks_by_credential.get(db_credential.id, []) if include_tasks else None,
+        }))
+    return summaries
+
+# --- 日志条目 (LogEntry) 操作 ---
+async def query_log_entries(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    levels: Optional[List[str]] = None,
+    search: Optional[str] = None,
+    cursor: Optional[Tuple[datetime, int]] = None,
+    limit: int = 100,
+    event_codes: Optional[List[str]] = None,
+):
+    """
+    按时间范围、用户、级别、事件代码和消息子串查询日志，按 (timestamp, id) 倒序返回。
+    cursor 为上一页最后一条的 (timestamp, id)，使用键集分页而不是 OFFSET，翻页开销与页码无关。
+    """
+    query = select(models.LogEntry).options(joinedload(models.LogEntry.user))
+    if start is not None:
+        query = query.where(models.LogEntry.timestamp >= start)
+    if end is not None:
+        query = query.where(models.LogEntry.timestamp < end)
+    if user_id is not None:
+        query = query.where(models.LogEntry.user_id == user_id)
+    if levels:
+        query = query.where(models.LogEntry.level.in_(levels))
+    if event_codes:
+        query = query.where(models.LogEntry.event_code.in_(event_codes))
+    if search:
+        # 自由文本日志匹配消息；结构化日志的消息为空，匹配模板固定文本或参数值（参数 JSON 文本）
+        conditions = [
+            models.LogEntry.message.contains(search, autoescape=True),
+            cast(models.LogEntry.params, Text).contains(search, autoescape=True),
+        ]
+        matching_event_codes = event_codes_matching(search)
+        if matching_event_codes:
+            conditions.append(models.LogEntry.event_code.in_(matching_event_codes))
+        query = query.where(or_(*conditions))
+    if cursor is not None:
+        cursor_timestamp, cursor_id = cursor
+        query = query.where(or_(
+            models.LogEntry.timestamp < cursor_timestamp,
+            and_(models.LogEntry.timestamp == cursor_timestamp, models.LogEntry.id < cursor_id)
+        ))
+    result = await db.execute(query.order_by(models.LogEntry.timestamp.desc(), models.LogEntry.id.desc()).limit(limit))
+    return result.scalars().all()
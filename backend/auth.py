@@ -1,15 +1,16 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.config import settings
-from backend.schemas import TokenData
-from backend.database import get_db
-from backend import crud, models
+from backend.schemas import TokenClaims, TokenData
+from backend.database import get_async_db
+from backend import async_crud, models
+from backend.utils.user_cache import user_cache, subject_key
 
 # OAuth2PasswordBearer 是一种安全方案的实现，它将 token 作为 bearer token 发送
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/users/token") # tokenUrl 是用户获取 token 的端点
@@ -25,6 +26,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def build_token_claims(user: models.SystemUser) -> dict:
+    """ 构造写入 JWT 的声明：主体、用户ID、管理员/审批标记和 token 版本 """
+    claims = {
+        "uid": user.id,
+        "admin": user.username == "admin",
+        "approved": bool(user.is_approved),
+        "ver": user.token_version or 0,
+    }
+    # 根据用户登录时提供的是用户名还是手机号，将相应的数据放入 JWT payload
+    if user.username:
+        claims["sub"] = user.username
+    if user.phone_number:
+        claims["phone_number"] = user.phone_number
+    return claims
+
 def verify_access_token(token: str, credentials_exception):
     """ 验证 JWT Access Token 的有效性 """
     try:
@@ -33,31 +49,92 @@ def verify_access_token(token: str, credentials_exception):
         phone_number: Optional[str] = payload.get("phone_number")
         if username is None and phone_number is None:
             raise credentials_exception
-        token_data = TokenData(learning_username=username, phone_number=phone_number) # 统一为 learning_username
+        token_data = TokenData(
+            learning_username=username, # 统一为 learning_username
+            phone_number=phone_number,
+            user_id=payload.get("uid"),
+            is_admin=bool(payload.get("admin", False)),
+            is_approved=bool(payload.get("approved", False)),
+            token_version=payload.get("ver", 0),
+        )
     except JWTError:
         raise credentials_exception
     return token_data
 
-async def get_current_system_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """ 获取当前认证的系统用户 """
-    credentials_exception = HTTPException(
+async def lookup_system_user(db: AsyncSession, token_data: TokenData) -> Optional[models.SystemUser]:
+    """
+    根据 token 主体获取系统用户，优先使用已认证用户缓存，未命中时查询数据库并写入缓存。
+    token 的版本声明与用户当前的 token_version 不一致（已被吊销）时返回 None。
+    """
+    key = subject_key(user_id=token_data.user_id, username=token_data.learning_username, phone_number=token_data.phone_number) # 统一为 learning_username
+    if key is None:
+        return None
+    user = user_cache.get(key)
+    if user is None:
+        if token_data.user_id is not None:
+            user = await async_crud.get_system_user(db, user_id=token_data.user_id)
+        elif token_data.learning_username:
+            user = await async_crud.get_system_user_by_username(db, username=token_data.learning_username)
+        else:
+            user = await async_crud.get_system_user_by_phone_number(db, phone_number=token_data.phone_number)
+        if user is None:
+            return None
+        user_cache.put(key, user)
+    if (user.token_version or 0) != token_data.token_version:
+        return None
+    return user
+
+async def authenticate_token_claims(db: AsyncSession, token_data: TokenData) -> Optional[TokenClaims]:
+    """
+    根据 JWT 声明鉴权：带有 uid 声明的 token 只需校验版本（命中用户缓存时不访问数据库），
+    身份和管理员/审批标记直接取自声明；旧版 token 退回按主体查询用户。
+    """
+    user = await lookup_system_user(db, token_data)
+    if user is None:
+        return None
+    if token_data.user_id is None:
+        return TokenClaims(id=user.id, username=user.username, phone_number=user.phone_number,
+                           is_admin=user.username == "admin", is_approved=bool(user.is_approved))
+    return TokenClaims(id=token_data.user_id, username=token_data.learning_username, phone_number=token_data.phone_number,
+                       is_admin=token_data.is_admin, is_approved=token_data.is_approved)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无法验证凭据",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def get_current_system_user(request: Request, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """ 获取当前认证的系统用户，同一请求内只解析一次 """
+    memo = getattr(request.state, "current_user", None)
+    if memo is not None and memo[0] == token:
+        return memo[1]
+
+    credentials_exception = _credentials_exception()
     token_data = verify_access_token(token, credentials_exception)
     
-    # 尝试根据用户名或手机号找到用户
-    user = None
-    if token_data.learning_username: # 统一为 learning_username
-        user = crud.get_system_user_by_username(db, username=token_data.learning_username) # 统一为 learning_username
-    elif token_data.phone_number:
-        user = crud.get_system_user_by_phone_number(db, phone_number=token_data.phone_number)
-    
+    # 尝试根据用户ID、用户名或手机号找到用户
+    user = await lookup_system_user(db, token_data)
     if user is None:
         raise credentials_exception
+    request.state.current_user = (token, user)
     return user
 
+async def get_current_token_claims(request: Request, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> TokenClaims:
+    """ 只读的高频接口使用：根据 JWT 声明获取当前用户的ID和权限，不加载完整的用户记录，同一请求内只解析一次 """
+    memo = getattr(request.state, "token_claims", None)
+    if memo is not None and memo[0] == token:
+        return memo[1]
+
+    credentials_exception = _credentials_exception()
+    token_data = verify_access_token(token, credentials_exception)
+    claims = await authenticate_token_claims(db, token_data)
+    if claims is None:
+        raise credentials_exception
+    request.state.token_claims = (token, claims)
+    return claims
+
 async def get_current_admin_user(current_user: models.SystemUser = Depends(get_current_system_user)):
     """ 获取当前认证的管理员用户 """
     if current_user.username != "admin":
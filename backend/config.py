@@ -4,5 +4,51 @@ class Settings:
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-super-secret-and-very-long-jwt-secret-key") # JWT 密钥，请在生产环境中更改
     ALGORITHM: str = "HS256" # JWT 算法
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30 # Access Token 有效期（分钟）
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "1024")) # 已认证用户缓存的最大条数，0 表示不缓存
+    USER_CACHE_TTL: float = float(os.getenv("USER_CACHE_TTL", "60")) # 已认证用户缓存的有效期（秒）
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12")) # bcrypt 成本因子，每加 1 哈希耗时翻倍；已有哈希按其自身的成本校验
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) # 密码哈希线程池的线程数（即最大并发哈希数），0 表示 CPU 核数的一半
 
-settings = Settings()
\ No newline at end of file
+    # 日志处理配置（文件、控制台和数据库处理器都在后台监听线程上执行）
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000")) # 监听线程队列的最大长度，队列满时丢弃新日志而不阻塞调用方
+
+    # 数据库日志写入配置（DbLogHandler 只入队，由后台线程批量写入）
+    LOG_DB_QUEUE_SIZE: int = int(os.getenv("LOG_DB_QUEUE_SIZE", "10000")) # 待写入日志队列的最大长度
+    LOG_DB_BATCH_SIZE: int = int(os.getenv("LOG_DB_BATCH_SIZE", "200")) # 单次批量插入的最大条数
+    LOG_DB_FLUSH_INTERVAL: float = float(os.getenv("LOG_DB_FLUSH_INTERVAL", "1.0")) # 最长刷新间隔（秒）
+    LOG_DB_OVERFLOW_POLICY: str = os.getenv("LOG_DB_OVERFLOW_POLICY", "drop_oldest") # 队列满时的策略: drop_oldest / drop_newest / block
+
+    # 自动化学习进度写入配置
+    PROGRESS_FLUSH_INTERVAL: float = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "120")) # 视频播放进度批量写入数据库的间隔（秒），视频完成或停止时立即写入
+
+    # 实时日志 WebSocket 推送配置
+    WS_LOG_BUFFER_SIZE: int = int(os.getenv("WS_LOG_BUFFER_SIZE", "500")) # 每个连接的发送缓冲区长度
+    WS_LOG_OVERFLOW_POLICY: str = os.getenv("WS_LOG_OVERFLOW_POLICY", "drop_oldest") # 缓冲区满时的策略: drop_oldest / coalesce / disconnect
+    WS_LOG_SEND_TIMEOUT: float = float(os.getenv("WS_LOG_SEND_TIMEOUT", "10")) # 单次发送超时（秒），超时视为连接已失效
+    WS_LOG_REPLAY_RING_SIZE: int = int(os.getenv("WS_LOG_REPLAY_RING_SIZE", "1000")) # 内存中保留的最近日志条数，用于断线补发
+    WS_LOG_REPLAY_LIMIT: int = int(os.getenv("WS_LOG_REPLAY_LIMIT", "1000")) # 单次重连最多补发的日志条数
+
+    # 实时日志总线配置（多个 worker 时，各进程的 WebSocket 订阅者通过日志表共享日志）
+    LOG_BUS_BACKEND: str = os.getenv("LOG_BUS_BACKEND", "local") # 实时日志总线: local（单进程） / database（多个 worker 轮询日志表）
+    LOG_BUS_POLL_INTERVAL: float = float(os.getenv("LOG_BUS_POLL_INTERVAL", "0.5")) # database 总线轮询日志表的间隔（秒）
+    LOG_BUS_GAP_TIMEOUT: float = float(os.getenv("LOG_BUS_GAP_TIMEOUT", "2.0")) # database 总线等待未提交日志行的最长时间（秒）
+
+    # 请求数据库语句统计配置
+    QUERY_COUNTER_ENABLED: bool = os.getenv("QUERY_COUNTER_ENABLED", "true").lower() == "true" # 是否统计每个请求的数据库语句数并返回 X-DB-Query-Count 响应头
+    QUERY_BUDGET: int = int(os.getenv("QUERY_BUDGET", "30")) # 单个请求的数据库语句数超过该值时记录警告，0 表示不检查
+    QUERY_REPEAT_THRESHOLD: int = int(os.getenv("QUERY_REPEAT_THRESHOLD", "10")) # 同一语句在一个请求中重复执行达到该次数时记录 N+1 警告，0 表示不检查
+
+    # 指标接口配置
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true" # 是否提供 /metrics 指标接口
+
+    # 日志保留与增量清理配置（后台任务按主键范围分批删除）
+    LOG_RETENTION_ENABLED: bool = os.getenv("LOG_RETENTION_ENABLED", "true").lower() == "true" # 是否启用后台日志保留任务
+    LOG_RETENTION_DAYS: int = int(os.getenv("LOG_RETENTION_DAYS", "30")) # 默认保留天数，0 表示不按时间清理
+    LOG_RETENTION_LEVEL_DAYS: str = os.getenv("LOG_RETENTION_LEVEL_DAYS", "") # 按级别覆盖保留天数，例如 "DEBUG=1,INFO=7,ERROR=90"
+    LOG_RETENTION_MAX_ROWS: int = int(os.getenv("LOG_RETENTION_MAX_ROWS", "0")) # 日志表最大行数，0 表示不限制
+    LOG_PURGE_INTERVAL: float = float(os.getenv("LOG_PURGE_INTERVAL", "3600")) # 两轮清理之间的间隔（秒）
+    LOG_PURGE_BATCH_SIZE: int = int(os.getenv("LOG_PURGE_BATCH_SIZE", "1000")) # 每批删除的主键范围大小
+    LOG_PURGE_BATCH_PAUSE: float = float(os.getenv("LOG_PURGE_BATCH_PAUSE", "0.05")) # 每批之间的停顿（秒）
+    LOG_PARTITION_INTERVAL: str = os.getenv("LOG_PARTITION_INTERVAL", "month") # 启用分区时的分区粒度: month / day
+
+settings = Settings()
@@ -1,7 +1,7 @@
 from fastapi import Request, Depends
 from typing import Optional
-from backend.auth import get_current_system_user
-from backend.models import SystemUser
+from backend.auth import get_current_token_claims
+from backend.schemas import TokenClaims
 
 class RequestContext:
     def __init__(self, user_id: Optional[int] = None, username: Optional[str] = None, ip_address: Optional[str] = None):
@@ -11,7 +11,7 @@ class RequestContext:
 
 async def get_request_context(
     request: Request,
-    current_user: Optional[SystemUser] = Depends(get_current_system_user)
+    current_user: Optional[TokenClaims] = Depends(get_current_token_claims) # 只需用户ID和用户名，直接取自 JWT 声明
 ) -> RequestContext:
     user_id = current_user.id if current_user else None
     username = current_user.username if current_user else None
@@ -1,12 +1,17 @@
 from sqlalchemy.orm import Session, relationship, joinedload
+from sqlalchemy import func, or_, insert, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from backend import models, schemas
+from backend.config import settings
+from backend.utils.user_cache import user_cache
 import bcrypt # 直接导入bcrypt
-from typing import Optional
+from typing import Optional, List, Tuple, Dict, Set, Iterable
 
 def get_password_hash(password: str):
     """ 对密码进行哈希处理 """
     # 生成盐并哈希密码
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS))
     return hashed_password.decode('utf-8')
 
 def verify_password(plain_password: str, hashed_password: str):
@@ -61,6 +66,7 @@ def approve_system_user(db: Session, user_id: int):
         db_user.is_approved = True
         db.commit()
         db.refresh(db_user)
+        user_cache.invalidate_user(db_user) # 使已认证用户缓存中的旧记录失效
         return db_user
     return None
 
@@ -171,27 +177,26 @@ def create_learning_task(
         study_hours=study_hours_to_save, # 保存学时
         current_progress=task.current_progress,
         is_completed=task.is_completed,
+        study_hours_value=models.parse_number(study_hours_to_save),
+        progress_percent=models.parse_number(task.current_progress),
     )
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
     return db_task
 
-def get_learning_tasks_by_credential_id_with_videos(db: Session, credential_id: int):
-    """ 根据凭据ID获取所有学习任务及其关联视频 """
-    return db.query(models.LearningTask).filter(
-        models.LearningTask.credential_id == credential_id
-    ).options(joinedload(models.LearningTask.videos)).all()
-
 def update_learning_task_progress(db: Session, task_id: int, current_progress: str = None, is_completed: bool = None, task_url: str = None, study_hours: str = None):
     """ 更新学习任务的进度和状态 """
     db_task = db.query(models.LearningTask).filter(models.LearningTask.id == task_id).first()
     if db_task:
-        if current_progress is not None: db_task.current_progress = current_progress
+        if current_progress is not None:
+            db_task.current_progress = current_progress
+            db_task.progress_percent = models.parse_number(current_progress)
         if is_completed is not None: db_task.is_completed = is_completed
         if task_url is not None: db_task.task_url = task_url
-        # 如果 study_hours 为 "0" 或空字符串，则设置为 None
-        if study_hours is not None: db_task.study_hours = study_hours if study_hours and study_hours != "0" else None
+        if study_hours is not None:
+            db_task.study_hours = _normalize_study_hours(study_hours)
+            db_task.study_hours_value = models.parse_number(db_task.study_hours)
         db.commit()
         db.refresh(db_task)
     return db_task
@@ -224,12 +229,83 @@ def get_or_create_learning_task(
             task_name=task_name,
             task_url=task_url,
             study_hours=study_hours, # 保存学时
+            study_hours_value=models.parse_number(study_hours),
+            progress_percent=models.parse_number("0.00%"), # 与 current_progress 的默认值一致
         )
         db.add(db_task)
         db.commit()
         db.refresh(db_task)
     return db_task
 
+def _normalize_study_hours(study_hours: Optional[str]) -> Optional[str]:
+    """ 学时为 "0" 或空字符串时保存为 None """
+    return study_hours if study_hours and study_hours != "0" else None
+
+def _upsert_rows(db: Session, model, rows: List[dict], key_columns: Tuple[str, ...], update_values: Dict[str, object]):
+    """
+    批量插入，遇到唯一索引冲突时改为更新：MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE，SQLite 使用 ON CONFLICT DO UPDATE。
+    update_values 的值为以冲突时待插入的行（excluded）为参数的函数，返回要写入的新值。
+    其他数据库退回普通的批量插入。
+    """
+    dialect_name = db.get_bind().dialect.name
+    table = model.__table__
+    if dialect_name == "mysql":
+        statement = mysql_insert(table)
+        statement = statement.on_duplicate_key_update({name: build(statement.inserted) for name, build in update_values.items()})
+    elif dialect_name == "sqlite":
+        statement = sqlite_insert(table)
+        statement = statement.on_conflict_do_update(index_elements=list(key_columns), set_={name: build(statement.excluded) for name, build in update_values.items()})
+    else:
+        statement = insert(table)
+    db.execute(statement, rows)
+
+def sync_learning_tasks(db: Session, credential_id: int, scanned_tasks: List[schemas.LearningTaskBase]) -> Dict[str, models.LearningTask]:
+    """
+    将一次页面扫描得到的任务列表与数据库对齐：缺失的任务批量写入（按唯一索引 upsert，并发扫描时不会产生重复任务），
+    进度有变化的任务批量更新，在同一事务中提交。
+    整页只需固定的几次查询，而不是每个任务各自查询、插入、提交和刷新。返回 任务名称 -> 学习任务 的映射。
+    """
+    scanned_by_name = {task.task_name: task for task in scanned_tasks} # 同名任务以最后一次扫描为准
+    if not scanned_by_name:
+        return {}
+    task_table = models.LearningTask
+    existing_query = db.query(task_table).filter(
+        task_table.credential_id == credential_id,
+        task_table.task_name.in_(scanned_by_name.keys())
+    ).populate_existing() # 任务完成状态可能已在其他会话中修改，覆盖会话中已加载的旧值
+    existing = {task.task_name: task for task in existing_query}
+    new_rows = []
+    changed_rows = []
+    for task_name, task in scanned_by_name.items():
+        if task_name not in existing:
+            new_rows.append({
+                "credential_id": credential_id,
+                "task_name": task_name,
+                "task_url": task.task_url,
+                "study_hours": _normalize_study_hours(task.study_hours),
+                "study_hours_value": models.parse_number(_normalize_study_hours(task.study_hours)),
+                "current_progress": task.current_progress,
+                "progress_percent": models.parse_number(task.current_progress),
+                "is_completed": False,
+            })
+        elif task.current_progress is not None and existing[task_name].current_progress != task.current_progress:
+            changed_rows.append({
+                "id": existing[task_name].id,
+                "current_progress": task.current_progress,
+                "progress_percent": models.parse_number(task.current_progress),
+            })
+    if not new_rows and not changed_rows:
+        return existing # 页面与数据库一致时只需一次查询
+    if new_rows:
+        _upsert_rows(db, task_table, new_rows, ("credential_id", "task_name"), {
+            "current_progress": lambda inserted: inserted.current_progress,
+            "progress_percent": lambda inserted: inserted.progress_percent,
+        })
+    if changed_rows:
+        db.execute(update(task_table), changed_rows) # 按主键批量更新
+    db.commit()
+    return {task.task_name: task for task in existing_query} # 重新加载以取得新任务的ID
+
 # --- 学习视频 (LearningVideo) CRUD 操作 ---
 def get_learning_video(db: Session, video_id: int, task_id: int):
     """ 根据视频ID和任务ID获取学习视频 """
@@ -248,6 +324,7 @@ def get_learning_video_by_title_and_task(db: Session, task_id: int, video_title:
     """ 根据任务ID和视频标题获取学习视频 """
     return db.query(models.LearningVideo).filter(
         models.LearningVideo.task_id == task_id,
+        models.LearningVideo.video_title_hash == models.video_title_hash(video_title), # 走 (task_id, video_title_hash) 唯一索引
         models.LearningVideo.video_title == video_title
     ).first()
 
@@ -300,4 +377,61 @@ def get_or_create_learning_video(db: Session, task_id: int, video_title: str) ->
         db_video.video_title = video_title
         db.commit()
         db.refresh(db_video)
-    return db_video
\ No newline at end of file
+    return db_video
+
+def sync_learning_videos(db: Session, task_id: int, video_titles: Iterable[str], completed_titles: Iterable[str] = ()) -> Tuple[Dict[str, models.LearningVideo], Set[int]]:
+    """
+    将一次页面扫描得到的视频列表与数据库对齐：缺失的视频批量写入（按 (任务ID, 标题摘要) 唯一索引 upsert），
+    页面显示已完成的视频批量标记为完成，在同一事务中提交。
+    返回 (视频标题 -> 学习视频 的映射, 本次新标记为完成的视频ID集合)。
+    """
+    titles = list(dict.fromkeys(video_titles)) # 去重并保持页面顺序
+    if not titles:
+        return {}, set()
+    completed_titles = set(completed_titles)
+    video_table = models.LearningVideo
+    existing_query = db.query(video_table).filter(
+        video_table.task_id == task_id,
+        video_table.video_title_hash.in_([models.video_title_hash(title) for title in titles])
+    ).populate_existing() # 播放进度由 ProgressTracker 在其他会话中写入，覆盖会话中已加载的旧值
+    existing = {video.video_title: video for video in existing_query}
+    new_rows = [
+        {"task_id": task_id, "video_title": title, "video_title_hash": models.video_title_hash(title), "is_completed": title in completed_titles}
+        for title in titles if title not in existing
+    ]
+    newly_completed_ids = {
+        video.id for title, video in existing.items()
+        if title in completed_titles and not video.is_completed
+    }
+    if not new_rows and not newly_completed_ids:
+        return existing, set() # 页面与数据库一致时只需一次查询
+    if new_rows:
+        # 并发写入同一视频时保留已完成状态
+        _upsert_rows(db, video_table, new_rows, ("task_id", "video_title_hash"), {"is_completed": lambda inserted: or_(video_table.__table__.c.is_completed, inserted.is_completed)})
+    if newly_completed_ids:
+        db.execute(update(video_table), [{"id": video_id, "is_completed": True} for video_id in newly_completed_ids])
+    db.commit()
+    videos_by_title = {video.video_title: video for video in existing_query} # 重新加载以取得新视频的ID
+    newly_completed_ids.update(videos_by_title[row["video_title"]].id for row in new_rows if row["is_completed"] and row["video_title"] in videos_by_title)
+    return videos_by_title, newly_completed_ids
+
+# --- 日志条目 (LogEntry) 操作 ---
+def get_max_log_seq(db: Session) -> int:
+    """ 获取数据库中已保存的最大日志序列号，用于应用重启后延续序列号 """
+    return db.query(func.max(models.LogEntry.seq)).scalar() or 0
+
+def get_log_entries_in_seq_range(db: Session, after_seq: int, before_seq: int, user_id: Optional[int] = None, limit: int = 1000, by_id: bool = False):
+    """
+    按序列号范围 (after_seq, before_seq) 获取日志（走 seq 或 (user_id, seq) 索引），超过 limit 时只返回最新的部分。
+    by_id 为 True 时序列号即主键（跨进程日志总线），按主键范围查询。
+    """
+    seq_column = models.LogEntry.id if by_id else models.LogEntry.seq
+    query = db.query(models.LogEntry).options(joinedload(models.LogEntry.user)).filter(
+        seq_column > after_seq,
+        seq_column < before_seq
+    )
+    if user_id is not None:
+        query = query.filter(models.LogEntry.user_id == user_id)
+    entries = query.order_by(seq_column.desc()).limit(limit).all()
+    entries.reverse() # 恢复为按序列号升序
+    return entries
@@ -1,7 +1,14 @@
+import json
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -20,13 +27,209 @@ if not DATABASE_URL:
 
     DATABASE_URL = f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
 
-engine = create_engine(DATABASE_URL)
+# 异步驱动：FastAPI 路由通过异步引擎访问数据库，查询期间不阻塞事件循环
+_ASYNC_DRIVERS = {
+    "mysql": "aiomysql",
+    "sqlite": "aiosqlite",
+}
+
+def _to_async_url(url: str) -> str:
+    """ 将同步数据库 URL 转换为对应的异步驱动 URL，例如 mysql+mysqlconnector:// -> mysql+aiomysql:// """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"不支持的数据库类型: {backend}，请通过 ASYNC_DATABASE_URL 指定异步连接 URL。")
+    return parsed.set(drivername=f"{backend}+{_ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _to_async_url(DATABASE_URL)
+
+# 连接池配置。每个进程有三个互相独立的连接池，单个进程最多占用的连接数为
+# (DB_POOL_SIZE + DB_MAX_OVERFLOW) + (SYNC_DB_POOL_SIZE + SYNC_DB_MAX_OVERFLOW) + (LOG_DB_POOL_SIZE + LOG_DB_MAX_OVERFLOW)，
+# 默认 30 + 10 + 3 = 43；多个 worker 时乘以 worker 数，应小于 MySQL 的 max_connections
+# FastAPI 路由使用的异步连接池
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10")) # 常驻连接数
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20")) # 超出常驻连接数后最多额外创建的连接数
+# 后台自动化任务、视频进度写入、实时日志补发和启动初始化使用的同步连接池
+SYNC_DB_POOL_SIZE = int(os.getenv("SYNC_DB_POOL_SIZE", "5"))
+SYNC_DB_MAX_OVERFLOW = int(os.getenv("SYNC_DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30")) # 连接池耗尽时等待空闲连接的最长时间（秒）
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # 连接最长复用时间（秒），应小于 MySQL 的 wait_timeout
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true" # 取出连接前先检测是否可用，自动替换失效连接
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10")) # 建立新连接的超时时间（秒）
+# 日志写入使用独立的小连接池，日志突发时不会占满 API 请求的连接
+LOG_DB_POOL_SIZE = int(os.getenv("LOG_DB_POOL_SIZE", "2"))
+LOG_DB_MAX_OVERFLOW = int(os.getenv("LOG_DB_MAX_OVERFLOW", "1"))
+
+# 各数据库驱动中表示连接超时的参数名
+_CONNECT_TIMEOUT_ARGS = {
+    "mysqlconnector": "connection_timeout",
+    "pymysql": "connect_timeout",
+    "mysqldb": "connect_timeout",
+    "aiomysql": "connect_timeout",
+    "pysqlite": "timeout",
+}
+
+class PoolMetrics:
+    """ 连接池指标：取出/归还次数、新建与失效连接数、等待空闲连接的耗时和超时次数 """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0 # 新建的数据库连接数
+        self.invalidations = 0 # 被判定失效而丢弃的连接数（包括 pre-ping 检测到的断开连接）
+        self.timeouts = 0 # 等待空闲连接超时的次数
+        self.wait_seconds_total = 0.0 # 从连接池取连接的累计耗时（秒）
+        self.max_wait_seconds = 0.0 # 从连接池取连接的最大耗时（秒）
+
+    def count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def stats(self, pool) -> dict:
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+        if isinstance(pool, QueuePool):
+            data.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": pool.overflow(),
+            })
+        return data
+
+class _MeteredPoolMixin:
+    """ 记录从连接池取连接的等待时间 """
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if self.metrics is not None:
+            self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() 会重建连接池，保留已有的指标
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    """ 记录取连接等待时间的 QueuePool """
+
+class MeteredAsyncAdaptedQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    """ 记录取连接等待时间的异步连接池 """
+
+class StatementTimer:
+    """
+    每个引擎只注册一对游标执行事件：计时后把 (语句, 耗时秒数) 交给各观察者（语句耗时指标、请求查询计数），
+    没有观察者时不计时
+    """
+
+    def __init__(self, target):
+        self.observers = []
+        event.listen(target, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(target, "after_cursor_execute", self._after_cursor_execute)
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.observers and context is not None:
+            context._statement_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_statement_started", None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        for observer in self.observers:
+            observer(statement, seconds)
+
+def _create_engine(pool_size: int, max_overflow: int, database_url: str = DATABASE_URL):
+    """ 按环境变量中的连接池配置创建引擎（异步 URL 创建异步引擎），并挂载连接池指标和语句计时 """
+    url = make_url(database_url)
+    is_async = url.get_driver_name() in _ASYNC_DRIVERS.values()
+    options = {}
+    connect_args = {}
+    timeout_arg = _CONNECT_TIMEOUT_ARGS.get(url.get_driver_name())
+    if timeout_arg and DB_CONNECT_TIMEOUT > 0:
+        connect_args[timeout_arg] = DB_CONNECT_TIMEOUT
+    is_memory_sqlite = url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+    if not is_memory_sqlite: # 内存 SQLite 使用 SingletonThreadPool，不支持以下连接池参数
+        options.update(
+            poolclass=MeteredAsyncAdaptedQueuePool if is_async else MeteredQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    # JSON 列（日志参数）按原文保存非 ASCII 字符，日志查询的子串搜索可以直接匹配中文参数
+    options["json_serializer"] = lambda value: json.dumps(value, ensure_ascii=False)
+    if is_async:
+        new_engine = create_async_engine(database_url, pool_pre_ping=DB_POOL_PRE_PING, connect_args=connect_args, **options)
+        event_target = new_engine.sync_engine # 连接池事件注册在底层的同步引擎上
+    else:
+        new_engine = create_engine(database_url, pool_pre_ping=DB_POOL_PRE_PING, connect_args=connect_args, **options)
+        event_target = new_engine
+
+    metrics = PoolMetrics()
+    new_engine.pool.metrics = metrics
+    event.listen(event_target, "connect", lambda dbapi_connection, connection_record: metrics.count(connects=1))
+    event.listen(event_target, "checkout", lambda dbapi_connection, connection_record, connection_proxy: metrics.count(checkouts=1))
+    event.listen(event_target, "checkin", lambda dbapi_connection, connection_record: metrics.count(checkins=1))
+    event.listen(event_target, "invalidate", lambda dbapi_connection, connection_record, exception: metrics.count(invalidations=1))
+    event_target.statement_timer = StatementTimer(event_target) # 异步引擎的语句事件同样在底层的同步引擎上
+    return new_engine
+
+# 后台自动化任务等使用的同步引擎和会话
+engine = _create_engine(SYNC_DB_POOL_SIZE, SYNC_DB_MAX_OVERFLOW)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 日志写入与日志清理专用的引擎和会话
+log_engine = _create_engine(LOG_DB_POOL_SIZE, LOG_DB_MAX_OVERFLOW)
+LogSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=log_engine)
+# FastAPI 路由使用的异步引擎和会话；提交后不使对象过期，避免在响应序列化时触发隐式的异步加载
+async_engine = _create_engine(DB_POOL_SIZE, DB_MAX_OVERFLOW, ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+def get_pool_stats() -> dict:
+    """ 返回同步连接池、异步（API 路由）连接池和日志连接池的指标 """
+    return {
+        "sync": engine.pool.metrics.stats(engine.pool),
+        "api": async_engine.pool.metrics.stats(async_engine.pool),
+        "log": log_engine.pool.metrics.stats(log_engine.pool),
+    }
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """ FastAPI 依赖：提供异步数据库会话 """
+    async with AsyncSessionLocal() as db:
+        yield db
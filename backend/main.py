@@ -2,7 +2,7 @@
 import asyncio
 import os
 import logging
-from backend.utils.log_config import setup_logging
+from backend.utils.log_config import setup_logging, shutdown_logging
 
 # 解决Windows上Playwright的NotImplementedError
 # 策略设置已移至run.py以确保其在uvicorn启动前生效
@@ -10,30 +10,53 @@ from backend.utils.log_config import setup_logging
 #     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
 from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import FileResponse, PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 
 from backend import crud, schemas
+from backend.config import settings
 from backend.database import SessionLocal, engine, get_db
 from backend.auth import get_current_system_user
 from backend.models import Base  # 导入Base以确保模型被FastAPI识别
+from backend.migrations import run_migrations
+from backend.utils import log_events
+from backend.utils.log_events import log_event
+from backend.utils.log_bus import log_bus
+from backend.utils.log_hub import log_hub
+from backend.utils.log_retention import log_retention_worker
+from backend.utils.metrics import MetricsMiddleware, registry as metrics_registry
+from backend.utils.password_hasher import password_hasher
+from backend.utils.progress_tracker import progress_tracker
+from backend.utils.query_counter import QueryCounterMiddleware
 
 # 导入路由模块
 from backend.api import users
 from backend.api import credentials
 from backend.api import tasks
+from backend.api import logs
 
 app = FastAPI()
+if settings.QUERY_COUNTER_ENABLED:
+    # 统计每个请求的数据库语句数，超出预算或重复执行同一语句（N+1）时记录警告
+    app.add_middleware(QueryCounterMiddleware, budget=settings.QUERY_BUDGET, repeat_threshold=settings.QUERY_REPEAT_THRESHOLD)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware) # 按路由统计请求耗时
 
 @app.on_event("startup")
 async def startup_event():
     setup_logging()
     logger = logging.getLogger(__name__)
-    logger.info("Application startup: Initializing database and creating admin user if needed.")
+    log_event(logger, logging.INFO, log_events.SYSTEM_STARTUP)
     Base.metadata.create_all(bind=engine)
+    applied_migrations = run_migrations(engine) # 为已存在的表补充新增的列和索引
     db: Session = SessionLocal()
     try:
+        # 延续数据库中已有的日志序列号，保证重启后客户端的补发游标依然有效
+        log_hub.start_sequence_after(crud.get_max_log_seq(db))
+        log_bus.start(db) # database 总线从日志表当前的最大主键之后开始轮询
+        for migration in applied_migrations:
+            log_event(logger, logging.INFO, log_events.DB_MIGRATION, migration=migration)
         admin_user = crud.get_system_user_by_username(db, username="admin")
         if not admin_user:
             admin_schema = schemas.SystemUserCreate(
@@ -45,13 +68,25 @@ async def startup_event():
                 is_approved=True # 管理员用户默认已审批
             )
             crud.create_system_user(db, admin_schema)
-            logger.info("管理员用户 'admin' 已自动创建。")
+            log_event(logger, logging.INFO, log_events.ADMIN_CREATED)
         else:
-            logger.info("管理员用户 'admin' 已存在。")
+            log_event(logger, logging.INFO, log_events.ADMIN_EXISTS)
     except Exception as e:
         logger.error(f"创建管理员用户失败: {e}")
     finally:
         db.close()
+    progress_tracker.start() # 后台批量写入视频播放进度
+    if settings.LOG_RETENTION_ENABLED:
+        log_retention_worker.start() # 后台按保留策略分批清理过期日志
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    log_retention_worker.stop()
+    log_bus.stop()
+    progress_tracker.stop() # 写入尚未保存的视频播放进度
+    password_hasher.shutdown()
+    # 停止日志监听线程和后台日志写入线程，并将队列中剩余的日志写入数据库
+    shutdown_logging()
     
 # 将根路由 `/` 重定向到 `/login`
 @app.get("/")
@@ -98,10 +133,17 @@ async def serve_logs_page():
 async def serve_admin_page():
     return "frontend/admin.html"
 
+# Prometheus 文本格式的指标接口
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # 注册 API 路由器
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(credentials.router, prefix="/api/credentials", tags=["credentials"])
 app.include_router(tasks.router, prefix="/api/tasks", tags=["tasks"])
+app.include_router(logs.router, prefix="/api/logs", tags=["logs"])
 logging.getLogger(__name__).info("Tasks router included successfully!")
 
 # LearningWebsiteCredential, login, save_session, 和 start_watching 路由现在由 backend/api/ 处理
\ No newline at end of file
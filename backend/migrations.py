@@ -0,0 +1,160 @@
+from typing import List
+
+from sqlalchemy import bindparam, delete, func, inspect, select, update
+from sqlalchemy.engine import Engine
+
+from backend.models import Base, LearningTask, LearningVideo, parse_number, video_title_hash # 导入模型以确保所有表已注册到元数据
+
+_TASK_UNIQUE_INDEX = "uq_learning_tasks_credential_id_task_name"
+_VIDEO_UNIQUE_INDEX = "uq_learning_videos_task_id_title_hash"
+
+def _server_default_sql(column) -> str:
+    """ 将列的服务端默认值转换为 DDL 片段 """
+    default = column.server_default.arg
+    return default.text if hasattr(default, "text") else f"'{default}'"
+
+def _add_missing_columns(conn, table, existing_columns: set, applied: List[str]):
+    """ 为已存在的表补充模型中新增的列（新增列必须可为空或带有服务端默认值） """
+    for column in table.columns:
+        if column.name in existing_columns:
+            continue
+        column_type = column.type.compile(dialect=conn.dialect)
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+        if column.server_default is not None:
+            ddl += f" DEFAULT {_server_default_sql(column)}"
+        conn.exec_driver_sql(ddl)
+        applied.append(f"已为表 {table.name} 添加列 {column.name}")
+
+def _create_missing_indexes(conn, table, existing_indexes: set, applied: List[str]):
+    """ 为已存在的表补充模型中新增的索引 """
+    for index in table.indexes:
+        if index.name in existing_indexes:
+            continue
+        index.create(bind=conn)
+        applied.append(f"已为表 {table.name} 创建索引 {index.name}")
+
+def _deduplicate_learning_tasks(conn, applied: List[str]):
+    """ 合并 (credential_id, task_name) 重复的任务：保留ID最小的一条，其余任务的视频移到保留的任务下后删除 """
+    tasks = LearningTask.__table__
+    videos = LearningVideo.__table__
+    duplicate_groups = conn.execute(
+        select(tasks.c.credential_id, tasks.c.task_name)
+        .group_by(tasks.c.credential_id, tasks.c.task_name)
+        .having(func.count() > 1)
+    ).all()
+    removed = 0
+    for credential_id, task_name in duplicate_groups:
+        rows = conn.execute(
+            select(tasks.c.id, tasks.c.is_completed)
+            .where(tasks.c.credential_id == credential_id, tasks.c.task_name == task_name)
+            .order_by(tasks.c.id)
+        ).all()
+        keep_id = rows[0].id
+        duplicate_ids = [row.id for row in rows[1:]]
+        conn.execute(update(videos).where(videos.c.task_id.in_(duplicate_ids)).values(task_id=keep_id))
+        if any(row.is_completed for row in rows):
+            conn.execute(update(tasks).where(tasks.c.id == keep_id).values(is_completed=True))
+        conn.execute(delete(tasks).where(tasks.c.id.in_(duplicate_ids)))
+        removed += len(duplicate_ids)
+    if removed:
+        applied.append(f"已合并 {removed} 条重复的学习任务")
+
+def _backfill_video_title_hashes(conn, applied: List[str], batch_size: int = 1000):
+    """ 为已有视频补充标题摘要 """
+    videos = LearningVideo.__table__
+    statement = update(videos).where(videos.c.id == bindparam("video_id")).values(video_title_hash=bindparam("title_hash"))
+    filled = 0
+    while True:
+        rows = conn.execute(
+            select(videos.c.id, videos.c.video_title).where(videos.c.video_title_hash.is_(None)).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        conn.execute(statement, [{"video_id": row.id, "title_hash": video_title_hash(row.video_title)} for row in rows])
+        filled += len(rows)
+    if filled:
+        applied.append(f"已为 {filled} 条学习视频补充标题摘要")
+
+def _backfill_task_numeric_progress(conn, applied: List[str], batch_size: int = 1000):
+    """ 为已有任务按 current_progress / study_hours 文本补充数值形式的进度和学时（按ID分批） """
+    tasks = LearningTask.__table__
+    statement = update(tasks).where(tasks.c.id == bindparam("task_id")).values(
+        progress_percent=bindparam("percent"), study_hours_value=bindparam("hours")
+    )
+    filled = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(tasks.c.id, tasks.c.current_progress, tasks.c.study_hours)
+            .where(tasks.c.id > last_id).order_by(tasks.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        conn.execute(statement, [
+            {"task_id": row.id, "percent": parse_number(row.current_progress), "hours": parse_number(row.study_hours)} for row in rows
+        ])
+        filled += len(rows)
+        last_id = rows[-1].id
+    if filled:
+        applied.append(f"已为 {filled} 条学习任务补充数值进度和学时")
+
+def _deduplicate_learning_videos(conn, applied: List[str]):
+    """ 合并同一任务下标题重复的视频：保留ID最小的一条，合并完成状态和播放进度后删除其余记录 """
+    videos = LearningVideo.__table__
+    duplicate_groups = conn.execute(
+        select(videos.c.task_id, videos.c.video_title_hash)
+        .group_by(videos.c.task_id, videos.c.video_title_hash)
+        .having(func.count() > 1)
+    ).all()
+    removed = 0
+    for task_id, title_hash in duplicate_groups:
+        rows = conn.execute(
+            select(videos.c.id, videos.c.is_completed, videos.c.current_progress_seconds, videos.c.total_duration_seconds)
+            .where(videos.c.task_id == task_id, videos.c.video_title_hash == title_hash)
+            .order_by(videos.c.id)
+        ).all()
+        progress = [row.current_progress_seconds for row in rows if row.current_progress_seconds is not None]
+        durations = [row.total_duration_seconds for row in rows if row.total_duration_seconds is not None]
+        conn.execute(update(videos).where(videos.c.id == rows[0].id).values(
+            is_completed=any(row.is_completed for row in rows),
+            current_progress_seconds=max(progress) if progress else None,
+            total_duration_seconds=max(durations) if durations else None,
+        ))
+        conn.execute(delete(videos).where(videos.c.id.in_([row.id for row in rows[1:]])))
+        removed += len(rows) - 1
+    if removed:
+        applied.append(f"已合并 {removed} 条重复的学习视频")
+
+def run_migrations(engine: Engine) -> List[str]:
+    """
+    幂等地将数据库结构升级到当前模型，返回本次执行的变更说明列表。
+    Base.metadata.create_all 只会创建缺失的表，不会为已存在的表添加新列和索引，因此在其后调用本函数。
+    """
+    applied: List[str] = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        existing_columns = {}
+        existing_indexes = {}
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns[table.name] = {column["name"] for column in inspector.get_columns(table.name)}
+            _add_missing_columns(conn, table, existing_columns[table.name], applied)
+            existing_indexes[table.name] = {index["name"] for index in inspector.get_indexes(table.name)}
+
+        # 数值进度列刚添加时，由已有的文本进度和学时回填
+        if "progress_percent" not in existing_columns.get(LearningTask.__tablename__, {"progress_percent"}):
+            _backfill_task_numeric_progress(conn, applied)
+
+        # 创建唯一索引之前，先合并历史数据中的重复记录（任务合并会移动视频，因此先处理任务）
+        if _TASK_UNIQUE_INDEX not in existing_indexes.get(LearningTask.__tablename__, {_TASK_UNIQUE_INDEX}):
+            _deduplicate_learning_tasks(conn, applied)
+        if _VIDEO_UNIQUE_INDEX not in existing_indexes.get(LearningVideo.__tablename__, {_VIDEO_UNIQUE_INDEX}):
+            _backfill_video_title_hashes(conn, applied)
+            _deduplicate_learning_videos(conn, applied)
+
+        for table in Base.metadata.sorted_tables:
+            if table.name in existing_indexes:
+                _create_missing_indexes(conn, table, existing_indexes[table.name], applied)
+    return applied
@@ -1,7 +1,10 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, DateTime, Text, Index, JSON, Numeric
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
+from typing import Optional
+import hashlib
+import re
 
 from backend.database import Base
 
@@ -14,6 +17,7 @@ class SystemUser(Base):
     hashed_password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True)
     is_approved = Column(Boolean, default=False) # 新增字段：是否已被管理员审批
+    token_version = Column(Integer, nullable=False, default=0, server_default="0") # 递增后该用户已签发的 token 全部失效
 
     credentials = relationship("LearningWebsiteCredential", back_populates="owner", cascade="all, delete-orphan")
 
@@ -44,12 +48,33 @@ class LearningTask(Base):
     current_progress = Column(String(50), default="0.00%") # 任务整体学习进度，例如“0%”, “50%”, “100%”
     is_completed = Column(Boolean, default=False)
     study_hours = Column(String(50), nullable=True) # 新增学时字段
+    # 数值形式的进度和学时，由 current_progress / study_hours 解析得到，用于在 SQL 中汇总
+    progress_percent = Column(Numeric(5, 2), nullable=True) # 例如 "45.50%" -> 45.50
+    study_hours_value = Column(Numeric(8, 2), nullable=True) # 例如 "2小时" -> 2.00
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     credential = relationship("LearningWebsiteCredential", back_populates="tasks")
     videos = relationship("LearningVideo", back_populates="task", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("uq_learning_tasks_credential_id_task_name", "credential_id", "task_name", unique=True), # 扫描任务列表时按 (凭据, 任务名称) 查找和写入
+    )
+
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+def parse_number(text: Optional[str]) -> Optional[float]:
+    """ 取出文本中的第一个数字，例如 "45.50%" -> 45.5、"2小时" -> 2.0，没有数字时返回 None """
+    match = _NUMBER_PATTERN.search(text) if text else None
+    return float(match.group()) if match else None
+
+def video_title_hash(video_title: str) -> str:
+    """ 视频标题的 SHA-256 摘要（十六进制），代替 512 字符的标题参与唯一索引 """
+    return hashlib.sha256(video_title.encode("utf-8")).hexdigest()
+
+def _default_video_title_hash(context) -> str:
+    return video_title_hash(context.get_current_parameters()["video_title"])
+
 # 新增：学习视频模型
 class LearningVideo(Base):
     __tablename__ = "learning_videos"
@@ -57,6 +82,7 @@ class LearningVideo(Base):
     id = Column(Integer, primary_key=True, index=True)
     task_id = Column(Integer, ForeignKey("learning_tasks.id"), nullable=False)
     video_title = Column(String(512), nullable=False) # 视频标题
+    video_title_hash = Column(String(64), nullable=True, default=_default_video_title_hash) # 标题摘要，插入时自动计算
     current_progress_seconds = Column(Integer, nullable=True) # 视频当前播放秒数，可空
     total_duration_seconds = Column(Integer, nullable=True) # 视频总时长秒数，可空
     is_completed = Column(Boolean, default=False)
@@ -65,6 +91,10 @@ class LearningVideo(Base):
 
     task = relationship("LearningTask", back_populates="videos")
 
+    __table_args__ = (
+        Index("uq_learning_videos_task_id_title_hash", "task_id", "video_title_hash", unique=True), # 扫描视频列表时按 (任务, 标题摘要) 查找和写入
+    )
+
 # 新增：日志条目模型
 class LogEntry(Base):
     __tablename__ = "log_entries"
@@ -75,6 +105,21 @@ class LogEntry(Base):
     message = Column(Text, nullable=False)
     user_id = Column(Integer, ForeignKey("system_users.id"), nullable=True) # 关联的系统用户ID，可为空
     ip_address = Column(String(45), nullable=True) # 存储IP地址，IPv6最大长度45字符
+    seq = Column(BigInteger, nullable=True, index=True) # 实时日志序列号，用于断线重连后按游标补发
+    logger_name = Column(String(255), nullable=True) # 产生该日志的日志记录器名称
+    # 结构化日志字段：带事件代码的日志不保存格式化后的消息文本，由显示端按模板格式化
+    event_code = Column(String(64), nullable=True) # 事件代码，见 backend/utils/log_events.py
+    params = Column(JSON(none_as_null=True), nullable=True) # 事件参数
+    task_id = Column(Integer, nullable=True) # 关联的学习任务ID
+    video_id = Column(Integer, nullable=True) # 关联的学习视频ID
 
     # 添加与 SystemUser 的关系，以便通过日志查找用户
-    user = relationship("SystemUser", primaryjoin="LogEntry.user_id == SystemUser.id", foreign_keys=[user_id])
\ No newline at end of file
+    user = relationship("SystemUser", primaryjoin="LogEntry.user_id == SystemUser.id", foreign_keys=[user_id])
+
+    __table_args__ = (
+        Index("ix_log_entries_user_id_seq", "user_id", "seq"), # 按用户补发日志时的范围扫描
+        # 日志查询接口按 (timestamp, id) 倒序做键集分页，以下复合索引分别覆盖无过滤、按用户和按级别的查询
+        Index("ix_log_entries_timestamp_id", "timestamp", "id"),
+        Index("ix_log_entries_user_id_timestamp_id", "user_id", "timestamp", "id"),
+        Index("ix_log_entries_level_timestamp_id", "level", "timestamp", "id"),
+    )
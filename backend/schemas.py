@@ -41,6 +41,8 @@ class LearningTaskCreate(LearningTaskBase):
 class LearningTask(LearningTaskBase):
     id: int
     credential_id: int
+    progress_percent: Optional[float] = None # 数值形式的进度（百分比）
+    study_hours_value: Optional[float] = None # 数值形式的学时
     created_at: datetime
     updated_at: datetime
     videos: List["LearningVideo"] = [] # 新增：关联学习视频列表
@@ -52,6 +54,46 @@ class LearningTask(LearningTaskBase):
 class LearningTaskDetail(LearningTask):
     videos: List[LearningVideo] = [] # 确保这里是 LearningVideo 实例的列表
 
+# 任务进度汇总（按凭据或按系统用户在数据库中分组统计）
+class TaskProgressRollup(BaseModel):
+    id: Optional[int] = None # 凭据ID或系统用户ID，合计行为空
+    name: Optional[str] = None # 网站名称或用户名
+    task_count: int = 0
+    completed_task_count: int = 0
+    total_hours: float = 0.0 # 总学时
+    completed_hours: float = 0.0 # 已完成任务的学时
+    percent_complete: float = 0.0 # 按学时加权的平均进度；没有学时数据时为任务进度的平均值
+
+class TaskProgressSummary(BaseModel):
+    group_by: str # credential 或 user
+    items: List[TaskProgressRollup] = []
+    total: TaskProgressRollup
+
+# 列表接口使用的精简响应模型：只返回计数和进度汇总，关联列表通过 ?include= 按需展开
+class LearningTaskSummary(LearningTaskBase):
+    id: int
+    credential_id: int
+    progress_percent: Optional[float] = None
+    study_hours_value: Optional[float] = None
+    created_at: datetime
+    updated_at: datetime
+    video_count: int = 0 # 视频数
+    completed_video_count: int = 0 # 已完成的视频数
+    videos: Optional[List[LearningVideo]] = None # 仅在 include=videos 时返回
+
+class LearningWebsiteCredentialOut(LearningWebsiteCredentialBase):
+    id: int
+    system_user_id: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class LearningWebsiteCredentialSummary(LearningWebsiteCredentialOut):
+    progress: TaskProgressRollup # 该凭据下任务的计数、学时和进度
+    tasks: Optional[List[LearningTaskSummary]] = None # 仅在 include=tasks 时返回
+
 # --- 学习视频相关 Schema ---
 class LearningVideoBase(BaseModel):
     video_title: str # 视频标题
@@ -103,6 +145,10 @@ class SystemUserApprove(BaseModel):
     user_id: int
     is_approved: bool
 
+# 新增：用于管理员吊销用户已签发的所有 token
+class SystemUserRevokeTokens(BaseModel):
+    user_id: int
+
 # --- 认证相关 Schema ---
 class Token(BaseModel):
     access_token: str
@@ -111,6 +157,18 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     learning_username: Optional[str] = None # 统一为 learning_username
     phone_number: Optional[str] = None
+    user_id: Optional[int] = None # uid 声明；旧版 token 中没有以下声明
+    is_admin: bool = False # admin 声明
+    is_approved: bool = False # approved 声明
+    token_version: int = 0 # ver 声明（旧版 token 视为 0），与用户当前的 token_version 不一致时视为已吊销
+
+# 从 JWT 声明得到的已认证用户信息，只读接口据此鉴权，无需加载完整的用户记录
+class TokenClaims(BaseModel):
+    id: int
+    username: Optional[str] = None
+    phone_number: Optional[str] = None
+    is_admin: bool = False
+    is_approved: bool = False
 
 # 新增：用于查看学习网站密码时，验证系统用户凭据
 class SystemUserCredentials(BaseModel):
@@ -122,4 +180,27 @@ class StartWatchingRequest(BaseModel):
 
 # 新增：用于从前端启动浏览器时接收headless参数
 class LaunchWebRequest(BaseModel):
-    headless: bool = False # 默认为False，即有头模式
\ No newline at end of file
+    headless: bool = False # 默认为False，即有头模式
+
+# --- 日志查询相关 Schema ---
+class LogEntryOut(BaseModel):
+    id: int
+    seq: Optional[int] = None
+    timestamp: Optional[datetime] = None
+    level: str
+    logger_name: Optional[str] = None
+    event_code: Optional[str] = None
+    params: Optional[dict] = None
+    task_id: Optional[int] = None
+    video_id: Optional[int] = None
+    message: str # 带事件代码的日志由服务端按模板格式化
+    user_id: Optional[int] = None
+    username: Optional[str] = None
+    ip_address: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class LogEntryPage(BaseModel):
+    items: List[LogEntryOut] = []
+    next_cursor: Optional[str] = None # 下一页游标，为空表示没有更多数据
@@ -7,9 +7,13 @@ from DrissionPage._configs.chromium_options import ChromiumOptions # 导入 Chro
 from DrissionPage.errors import ElementNotFoundError, PageDisconnectedError, CDPError
 import json # 导入json用于处理cookies
 from collections import deque # 用于存储日志，限制长度
-from typing import Optional # 导入Optional用于类型提示
+from typing import Optional, Union # 导入Optional用于类型提示
 from backend.database import get_db # 导入 get_db
-from backend import crud # 导入 crud
+from backend import crud, schemas # 导入 crud
+from backend.utils import log_events # 结构化日志事件代码
+from backend.utils.log_events import log_event
+from backend.utils.page_driver import PageDriver, as_page_driver # 页面操作接口，离线测量时可替换为假页面
+from backend.utils.progress_tracker import progress_tracker # 视频播放进度的写合并缓存
 from sqlalchemy.orm import Session # 导入 Session
 
 # 获取当前模块的日志记录器
@@ -21,52 +25,26 @@ _active_browser_pages = {}
 _stop_events = {}
 
 # 定义一个简单的日志函数，用于替代GUI中的log
-def console_log(message_content, user_id=None, username=None, ip_address=None, level=logging.INFO):
+def console_log(message_content, user_id=None, username=None, ip_address=None, level=logging.INFO, task_id=None, video_id=None):
     """
-    替代GUI中的log，将消息发送到主日志系统，并预格式化消息内容。
+    替代GUI中的log，将自由文本消息发送到主日志系统。
+    用户前缀不再拼接到消息中，由显示端根据 user_id/username 字段添加；固定格式的消息请使用 log_event 记录事件代码和参数。
     """
-    # 统一格式化消息，即使没有用户信息，也保持前缀一致
-    user_prefix = ""
-    if user_id is not None and username is not None:
-        user_prefix = f"用户 {user_id} ({username})："
-    elif user_id is not None:
-        user_prefix = f"用户 {user_id}："
-    elif username is not None:
-        user_prefix = f"用户 ({username})："
-
-    formatted_message = f"{user_prefix}{message_content}"
-
     extra_data = {
         'user_id': user_id,
         'username': username,
-        'ip_address': ip_address
+        'ip_address': ip_address,
+        'task_id': task_id,
+        'video_id': video_id,
     }
 
-    logger.log(level, formatted_message, extra=extra_data)
+    logger.log(level, message_content, extra=extra_data)
 
 async def send_log_to_queue(message_content: str, user_id: Optional[int] = None, username: Optional[str] = None, ip_address: Optional[str] = None, level=logging.INFO):
     """
     将日志消息发送到主日志系统，以便被DbLogHandler捕获并推送到WebSocket队列。
-    预格式化消息内容。
     """
-    # 统一格式化消息，即使没有用户信息，也保持前缀一致
-    user_prefix = ""
-    if user_id is not None and username is not None:
-        user_prefix = f"用户 {user_id} ({username})："
-    elif user_id is not None:
-        user_prefix = f"用户 {user_id}："
-    elif username is not None:
-        user_prefix = f"用户 ({username})："
-
-    formatted_message = f"{user_prefix}{message_content}"
-
-    extra_data = {
-        'user_id': user_id,
-        'username': username,
-        'ip_address': ip_address
-    }
-
-    logger.log(level, formatted_message, extra=extra_data)
+    console_log(message_content, user_id, username, ip_address, level=level)
 
 def format_seconds_to_hms(seconds: int, threshold_seconds: int = 60) -> str:
     """
@@ -83,7 +61,7 @@ def format_seconds_to_hms(seconds: int, threshold_seconds: int = 60) -> str:
         else:
             return f"{int(minutes):02}:{int(remaining_seconds):02}"
 
-async def process_single_task_videos(user_id: int, page, learning_task, stop_event: asyncio.Event, db: Session, ip_address: Optional[str] = None, username: Optional[str] = None) -> bool:
+async def process_single_task_videos(user_id: int, page: PageDriver, learning_task, stop_event: asyncio.Event, db: Session, ip_address: Optional[str] = None, username: Optional[str] = None) -> bool:
     """ 负责在当前任务的视频列表页面上播放所有未完成的视频。 """
     # --- [修改点] ---
     # 使用 contains(@class, 'childSection') 来匹配所有包含 'childSection' 类的视频条目，
@@ -104,7 +82,7 @@ async def process_single_task_videos(user_id: int, page, learning_task, stop_eve
             console_log("错误：浏览器连接已断开或视频列表容器未加载，退出任务。", user_id, username, ip_address, level=logging.ERROR)
             return False
 
-        await asyncio.sleep(3)
+        await page.sleep(3)
 
         video_to_play_element = None # 存储要播放的视频元素（需要点击的）
         video_to_play_db_obj = None # 存储数据库中对应的 LearningVideo 对象（需要点击的）
@@ -119,11 +97,12 @@ async def process_single_task_videos(user_id: int, page, learning_task, stop_eve
                 console_log("错误：未找到任何视频条目。请检查页面是否已加载，或页面结构已发生改变。", user_id, username, ip_address, level=logging.ERROR)
                 return False # 当前列表无视频，或者发生错误，退出
 
-            console_log("-" * 20 + f" 任务‘{learning_task.task_name}’视频状态诊断 " + "-" * 20, user_id, username, ip_address, level=logging.INFO)
-            # with next(get_db()) as db: # 移除此行，使用外部传入的db会话
+            log_event(logger, logging.INFO, log_events.TASK_DIAGNOSIS_STARTED, user_id, username, ip_address, task_id=learning_task.id, task_name=learning_task.task_name)
+            # 先读取整页视频条目，再一次性与数据库对齐，而不是每个条目各自查询和提交
+            scanned_videos = [] # (序号, 元素, 标题, 进度文本, 是否正在播放)
             for i, video_ele in enumerate(video_elements):
                 try:
-                    await asyncio.sleep(0.5) # 增加短暂等待，确保元素内容加载
+                    await page.sleep(0.5) # 增加短暂等待，确保元素内容加载
                     
                     title_ele = video_ele.ele('.title', timeout=5) # 视频标题的新 XPath
                     progress_text_ele = video_ele.ele('.isFinsh', timeout=5) # 进度文本的新 XPath
@@ -133,46 +112,50 @@ async def process_single_task_videos(user_id: int, page, learning_task, stop_eve
 
                     title_text = title_ele.text.strip() if title_ele else "[标题未找到]"
                     progress_text = progress_text_ele.text.strip() if progress_text_ele else "未完成" # 获取进度文本
-
-                    # 获取或创建数据库中的 LearningVideo 记录
-                    db_video = crud.get_or_create_learning_video(db, learning_task.id, title_text)
-                    db.add(db_video) # 重新附加到会话
-                    db.refresh(db_video) # 显式刷新对象
-                    
-                    # 更新数据库中的视频完成状态，如果页面显示已完成且不是当前正在播放的视频
-                    if "已完成" in progress_text and not db_video.is_completed and not is_active_video:
-                        crud.update_learning_video_progress(db, db_video.id, is_completed=True)
-                        db.add(db_video) # 重新附加到会话
-                        db.refresh(db_video) # 显式刷新对象
-                        console_log(f"视频‘{db_video.video_title}’已在页面显示为完成，更新数据库。", user_id, username, ip_address, level=logging.INFO)
-
-                    # 根据是否active显示当前播放状态，学习状态依然是 progress_text
-                    status_display = progress_text # 学习状态只能是 '待学习' 或 '已完成'
-                    console_log(f"序号 {i+1}: {db_video.video_title} -> 学习状态: '{status_display}' (DB ID: {db_video.id})", user_id, username, ip_address, level=logging.INFO)
-                    
-                    if is_active_video:
-                        console_log(f"视频‘{db_video.video_title}’当前正在播放中。", user_id, username, ip_address, level=logging.INFO)
-
-                    # 如果视频是“待学习”且“正在播放”，则优先处理此视频
-                    if not db_video.is_completed and "待学习" in progress_text and is_active_video:
-                        video_already_playing_element = video_ele
-                        video_already_playing_db_obj = db_video
-                        console_log(f"^^^ 识别到正在播放的待学习视频 (DB ID: {db_video.id}) ^^^", user_id, username, ip_address, level=logging.INFO)
-                        # 移除这里的 break 语句，以便继续扫描所有视频
-
-                    # 判断视频是否未完成（数据库中的 is_completed 为 False）
-                    # 并且页面状态是'待学习'且不是当前正在播放的视频
-                    if not db_video.is_completed and "待学习" in progress_text and \
-                       not is_active_video and video_already_playing_db_obj is None:
-                        if video_to_play_db_obj is None: # 只选择第一个符合条件的视频
-                            video_to_play_element = video_ele
-                            video_to_play_db_obj = db_video
-                            # 只有在没有视频正在播放时，才打印此日志
-                            if video_already_playing_db_obj is None:
-                                console_log(f"^^^ 标记此视频为下一个播放目标 (DB ID: {db_video.id}) ^^^", user_id, username, ip_address, level=logging.INFO)
-
+                    scanned_videos.append((i, video_ele, title_text, progress_text, is_active_video))
                 except Exception as e:
                      console_log(f"读取序号 {i+1} 视频信息时出错: {e}", user_id, username, ip_address, level=logging.ERROR)
+
+            # 获取或创建数据库中的 LearningVideo 记录；页面显示已完成且不是当前正在播放的视频同时标记为完成
+            videos_by_title, newly_completed_ids = crud.sync_learning_videos(
+                db,
+                learning_task.id,
+                [title_text for _, _, title_text, _, _ in scanned_videos],
+                [title_text for _, _, title_text, progress_text, is_active_video in scanned_videos if "已完成" in progress_text and not is_active_video],
+            )
+
+            for i, video_ele, title_text, progress_text, is_active_video in scanned_videos:
+                db_video = videos_by_title.get(title_text)
+                if db_video is None:
+                    continue
+                if db_video.id in newly_completed_ids:
+                    newly_completed_ids.discard(db_video.id) # 同名视频只记录一次
+                    log_event(logger, logging.INFO, log_events.VIDEO_PAGE_COMPLETED, user_id, username, ip_address, task_id=learning_task.id, video_id=db_video.id, title=db_video.video_title)
+
+                # 根据是否active显示当前播放状态，学习状态依然是 progress_text
+                status_display = progress_text # 学习状态只能是 '待学习' 或 '已完成'
+                log_event(logger, logging.INFO, log_events.VIDEO_STATUS, user_id, username, ip_address, task_id=learning_task.id, video_id=db_video.id, index=i + 1, title=db_video.video_title, status=status_display)
+                
+                if is_active_video:
+                    log_event(logger, logging.INFO, log_events.VIDEO_PLAYING, user_id, username, ip_address, task_id=learning_task.id, video_id=db_video.id, title=db_video.video_title)
+
+                # 如果视频是“待学习”且“正在播放”，则优先处理此视频
+                if not db_video.is_completed and "待学习" in progress_text and is_active_video:
+                    video_already_playing_element = video_ele
+                    video_already_playing_db_obj = db_video
+                    console_log(f"^^^ 识别到正在播放的待学习视频 (DB ID: {db_video.id}) ^^^", user_id, username, ip_address, level=logging.INFO)
+                    # 移除这里的 break 语句，以便继续扫描所有视频
+
+                # 判断视频是否未完成（数据库中的 is_completed 为 False）
+                # 并且页面状态是'待学习'且不是当前正在播放的视频
+                if not db_video.is_completed and "待学习" in progress_text and \
+                   not is_active_video and video_already_playing_db_obj is None:
+                    if video_to_play_db_obj is None: # 只选择第一个符合条件的视频
+                        video_to_play_element = video_ele
+                        video_to_play_db_obj = db_video
+                        # 只有在没有视频正在播放时，才打印此日志
+                        if video_already_playing_db_obj is None:
+                            console_log(f"^^^ 标记此视频为下一个播放目标 (DB ID: {db_video.id}) ^^^", user_id, username, ip_address, level=logging.INFO)
             console_log("-" * 55, user_id, username, ip_address, level=logging.INFO)
 
         except (PageDisconnectedError, CDPError):
@@ -192,28 +175,26 @@ async def process_single_task_videos(user_id: int, page, learning_task, stop_eve
             try:
                 # 直接点击视频条目本身来触发播放
                 video_to_play_element.click()
-                console_log(f"已点击视频‘{video_to_play_db_obj.video_title}’条目，等待播放页面加载...", user_id, username, ip_address, level=logging.INFO)
-                await asyncio.sleep(7) # 增加等待时间，确保视频加载到播放器
+                log_event(logger, logging.INFO, log_events.VIDEO_CLICKED, user_id, username, ip_address, task_id=learning_task.id, video_id=video_to_play_db_obj.id, title=video_to_play_db_obj.video_title)
+                await page.sleep(7) # 增加等待时间，确保视频加载到播放器
 
                 # 同时更新主任务的URL，因为它代表了任务实际开始学习的页面
                 # with next(get_db()) as db: # 移除此行，使用外部传入的db会话
                 crud.update_learning_task_progress(db, learning_task.id, task_url=page.url)
-                console_log(f"已将任务‘{learning_task.task_name}’的URL更新为: {page.url}。", user_id, username, ip_address, level=logging.INFO)
+                log_event(logger, logging.INFO, log_events.TASK_URL_UPDATED, user_id, username, ip_address, task_id=learning_task.id, task_name=learning_task.task_name, url=page.url)
 
             except Exception as e:
                 console_log(f"点击视频 '{video_to_play_db_obj.video_title}' 条目时出错: {e}，尝试扫描下一个...", user_id, username, ip_address, level=logging.ERROR)
-                # with next(get_db()) as db: # 移除此行，使用外部传入的db会话
-                crud.update_learning_video_progress(db, video_to_play_db_obj.id, is_completed=True) # 标记为完成，避免重复点击
-                db.add(video_to_play_db_obj) # 重新附加到会话
-                db.refresh(video_to_play_db_obj) # 显式刷新对象
+                progress_tracker.record(video_to_play_db_obj.id, is_completed=True) # 标记为完成，避免重复点击
+                progress_tracker.flush() # 重新扫描前写入，扫描时才能读到完成状态
                 continue # 重新扫描视频列表
 
         # 如果既没有正在播放的待学习视频，也没有可点击的待学习视频，则认为所有视频已完成
         else:
-            console_log(f"诊断完成：任务‘{learning_task.task_name}’未找到任何可学习的视频，所有视频均已完成！", user_id, username, ip_address, level=logging.INFO)
+            log_event(logger, logging.INFO, log_events.TASK_ALL_VIDEOS_DONE, user_id, username, ip_address, task_id=learning_task.id, task_name=learning_task.task_name)
             with next(get_db()) as db_session_inner: # 此处需要一个新的会话，因为外层会话可能已关闭或不适用于此上下文
                 crud.update_learning_task_progress(db_session_inner, learning_task.id, is_completed=True, current_progress="100.00%")
-                console_log(f"任务‘{learning_task.task_name}’已标记为完成。", user_id, username, ip_address, level=logging.INFO)
+                log_event(logger, logging.INFO, log_events.TASK_COMPLETED, user_id, username, ip_address, task_id=learning_task.id, task_name=learning_task.task_name)
             return True # 当前列表所有视频都已完成
 
         is_video_finished = False
@@ -222,18 +203,16 @@ async def process_single_task_videos(user_id: int, page, learning_task, stop_eve
         while not is_video_finished:
             if stop_event.is_set(): # 检查停止信号
                 console_log(f"收到停止信号，退出视频播放监控。", user_id, username, ip_address, level=logging.INFO)
-                # with next(get_db()) as db: # 移除此行，使用外部传入的db会话
-                crud.update_learning_video_progress(db, video_to_play_db_obj.id, current_progress_seconds=int(current_time), total_duration_seconds=int(duration))
-                db.add(video_to_play_db_obj) # 重新附加到会话
-                db.refresh(video_to_play_db_obj) # 显式刷新对象
-                console_log(f"已保存视频‘{video_to_play_db_obj.video_title}’的当前播放进度到数据库。", user_id, username, ip_address, level=logging.INFO)
+                progress_tracker.record(video_to_play_db_obj.id, current_progress_seconds=int(current_time), total_duration_seconds=int(duration))
+                progress_tracker.flush() # 停止时立即写入最终进度
+                log_event(logger, logging.INFO, log_events.VIDEO_PROGRESS_SAVED, user_id, username, ip_address, task_id=learning_task.id, video_id=video_to_play_db_obj.id, title=video_to_play_db_obj.video_title)
                 break
             try:
                 video_player = page.ele('tag:video', timeout=5)
                 js_get_time = "return {currentTime: document.querySelector('video').currentTime, duration: document.querySelector('video').duration};"
                 progress = page.run_js(js_get_time)
                 if not isinstance(progress, dict):
-                    sleep_task = asyncio.create_task(asyncio.sleep(2))
+                    sleep_task = asyncio.create_task(page.sleep(2))
                     stop_task = asyncio.create_task(stop_event.wait())
                     done, pending = await asyncio.wait([sleep_task, stop_task], return_when=asyncio.FIRST_COMPLETED)
                     if stop_task in done: 
@@ -245,26 +224,22 @@ async def process_single_task_videos(user_id: int, page, learning_task, stop_eve
                 duration = progress.get('duration', 0)
                 if duration is None or duration == 0 or current_time is None:
                     console_log("等待视频加载元数据...", user_id, username, ip_address, level=logging.INFO)
-                    await asyncio.sleep(5); continue
+                    await page.sleep(5); continue
                 if current_time >= duration - 3: 
                     is_video_finished = True
-                    console_log(f"视频 '{video_to_play_db_obj.video_title}' 播放完毕。", user_id, username, ip_address, level=logging.INFO)
-                    # with next(get_db()) as db: # 移除此行，使用外部传入的db会话
-                    crud.update_learning_video_progress(db, video_to_play_db_obj.id, current_progress_seconds=int(duration), total_duration_seconds=int(duration), is_completed=True)
-                    db.add(video_to_play_db_obj) # 重新附加到会话
-                    db.refresh(video_to_play_db_obj) # 显式刷新对象
-                    console_log(f"已将视频‘{video_to_play_db_obj.video_title}’标记为完成。", user_id, username, ip_address, level=logging.INFO)
+                    log_event(logger, logging.INFO, log_events.VIDEO_FINISHED, user_id, username, ip_address, task_id=learning_task.id, video_id=video_to_play_db_obj.id, title=video_to_play_db_obj.video_title)
+                    progress_tracker.record(video_to_play_db_obj.id, current_progress_seconds=int(duration), total_duration_seconds=int(duration), is_completed=True)
+                    progress_tracker.flush() # 视频完成时立即写入，重新扫描视频列表时才能读到完成状态
+                    log_event(logger, logging.INFO, log_events.VIDEO_MARKED_COMPLETED, user_id, username, ip_address, task_id=learning_task.id, video_id=video_to_play_db_obj.id, title=video_to_play_db_obj.video_title)
                 else:
                     if int(current_time) > last_reported_time + 9:
                         formatted_current_time = format_seconds_to_hms(int(current_time))
                         formatted_duration = format_seconds_to_hms(int(duration))
-                        console_log(f"播放进度: {formatted_current_time} / {formatted_duration}", user_id, username, ip_address, level=logging.INFO)
+                        log_event(logger, logging.INFO, log_events.VIDEO_PROGRESS, user_id, username, ip_address, task_id=learning_task.id, video_id=video_to_play_db_obj.id, current=formatted_current_time, duration=formatted_duration)
                         last_reported_time = int(current_time)
-                        # with next(get_db()) as db: # 移除此行，使用外部传入的db会话
-                        crud.update_learning_video_progress(db, video_to_play_db_obj.id, current_progress_seconds=int(current_time), total_duration_seconds=int(duration))
-                        db.add(video_to_play_db_obj) # 重新附加到会话
-                        db.refresh(video_to_play_db_obj) # 显式刷新对象
-                    sleep_task = asyncio.create_task(asyncio.sleep(2))
+                        # 只记录到内存，由 ProgressTracker 按间隔批量写入数据库
+                        progress_tracker.record(video_to_play_db_obj.id, current_progress_seconds=int(current_time), total_duration_seconds=int(duration))
+                    sleep_task = asyncio.create_task(page.sleep(2))
                     stop_task = asyncio.create_task(stop_event.wait())
                     done, pending = await asyncio.wait([sleep_task, stop_task], return_when=asyncio.FIRST_COMPLETED)
                     if stop_task in done:
@@ -298,7 +273,7 @@ async def process_single_task_videos(user_id: int, page, learning_task, stop_eve
                     console_log(f"尝试切换iframe时发生错误: {iframe_e}", user_id, username, ip_address, level=logging.WARNING)
 
                 console_log("在当前页面未找到 <video> 播放器，可能页面还未加载完成，重试中...", user_id, username, ip_address, level=logging.WARNING)
-                sleep_task = asyncio.create_task(asyncio.sleep(5))
+                sleep_task = asyncio.create_task(page.sleep(5))
                 stop_task = asyncio.create_task(stop_event.wait())
                 done, pending = await asyncio.wait([sleep_task, stop_task], return_when=asyncio.FIRST_COMPLETED)
                 if stop_task in done: 
@@ -509,7 +484,8 @@ async def stop_auto_watcher_for_user(user_id: int, username: Optional[str] = Non
     else:
         console_log(f"没有找到对应的自动化任务停止事件。", user_id, username, ip_address, level=logging.WARNING)
 
-async def run_auto_watcher(user_id: int, page: ChromiumPage, credential_id: int, ip_address: Optional[str] = None, username: Optional[str] = None): # 移除 initial_url, session_cookies 参数，添加 page 参数
+async def run_auto_watcher(user_id: int, page: Union[ChromiumPage, PageDriver], credential_id: int, ip_address: Optional[str] = None, username: Optional[str] = None): # 移除 initial_url, session_cookies 参数，添加 page 参数
+    page = as_page_driver(page) # ChromiumPage 包装为 DrissionPageDriver
     console_log("正在初始化浏览器 (使用 DrissionPage) 进行自动化学习...", user_id, username, ip_address, level=logging.INFO)
     _stop_events[user_id] = asyncio.Event() # 为当前用户创建停止事件
     
@@ -527,7 +503,7 @@ async def run_auto_watcher(user_id: int, page: ChromiumPage, credential_id: int,
     try:
         console_log(f"自动化学习任务已启动，使用现有浏览器会话。", user_id, username, ip_address, level=logging.INFO)
         console_log("等待页面加载完成...", user_id, username, ip_address, level=logging.INFO)
-        await asyncio.sleep(5) # 等待页面加载
+        await page.sleep(5) # 等待页面加载
         
         # 在进入课程类型循环之前，保存当前的主任务列表页面的URL
         main_task_list_url = page.url
@@ -561,7 +537,7 @@ async def run_auto_watcher(user_id: int, page: ChromiumPage, credential_id: int,
                     else:
                         type_button.click()
                         console_log(f"已点击‘{course_name}’按钮。", user_id, username, ip_address, level=logging.INFO)
-                        await asyncio.sleep(5) # 等待页面加载新的课程列表
+                        await page.sleep(5) # 等待页面加载新的课程列表
                     
                     # 移除此处保存视频列表URL的逻辑，因为这里还是课程类型页，且URL保存已由crud.get_or_create_learning_task处理
                     # current_video_list_url = page.url
@@ -597,9 +573,10 @@ async def run_auto_watcher(user_id: int, page: ChromiumPage, credential_id: int,
                             break # 退出任务列表循环
 
                         console_log("-" * 20 + " 任务状态诊断 " + "-" * 20, user_id, username, ip_address, level=logging.INFO)
+                        scanned_tasks = [] # (序号, 元素, “开始学习”按钮, 扫描到的任务信息)
                         for i, task_ele in enumerate(task_elements):
                             try:
-                                await asyncio.sleep(0.5)
+                                await page.sleep(0.5)
 
                                 # 1. 定位元素
                                 task_title_ele = task_ele.ele('xpath:.//p[contains(@class, "center-title")]', timeout=10)
@@ -621,21 +598,26 @@ async def run_auto_watcher(user_id: int, page: ChromiumPage, credential_id: int,
                                 task_progress = task_progress_ele.text.strip() if task_progress_ele else "0.00%"
                                 task_hours = task_hours_ele.text.strip() if task_hours_ele else "未知"
 
-                                # (数据库操作部分)
-                                with next(get_db()) as db_session:
-                                    db_task = crud.get_or_create_learning_task(db_session, credential.id, task_title, page.url, task_hours)
-                                    if db_task.current_progress != task_progress:
-                                        crud.update_learning_task_progress(db_session, db_task.id, current_progress=task_progress)
-                                console_log(f"序号 {i+1}: 任务名称: {db_task.task_name} -> 学习进度: {task_progress} -> 学时: {task_hours} (DB ID: {db_task.id})", user_id, username, ip_address, level=logging.INFO)
-                                # 4. [修复逻辑漏洞] 将扫描到的可学习任务添加到待处理列表
-                                if start_study_button_ele and not db_task.is_completed:
-                                    tasks_on_page.append({
-                                        "element": task_ele,
-                                        "db_obj": db_task,
-                                        "button": start_study_button_ele
-                                    })
+                                scanned_tasks.append((i, task_ele, start_study_button_ele, schemas.LearningTaskBase(
+                                    task_name=task_title, task_url=page.url, current_progress=task_progress, study_hours=task_hours
+                                )))
                             except Exception as e:
                                 console_log(f"读取序号 {i+1} 任务信息时出错: {e}", user_id, username, ip_address, level=logging.ERROR)
+
+                        # (数据库操作部分) 整页任务一次性与数据库对齐：缺失的批量插入，进度变化的批量更新
+                        tasks_by_name = crud.sync_learning_tasks(db, credential.id, [scanned for _, _, _, scanned in scanned_tasks])
+                        for i, task_ele, start_study_button_ele, scanned in scanned_tasks:
+                            db_task = tasks_by_name.get(scanned.task_name)
+                            if db_task is None:
+                                continue
+                            console_log(f"序号 {i+1}: 任务名称: {db_task.task_name} -> 学习进度: {scanned.current_progress} -> 学时: {scanned.study_hours} (DB ID: {db_task.id})", user_id, username, ip_address, level=logging.INFO)
+                            # 4. [修复逻辑漏洞] 将扫描到的可学习任务添加到待处理列表
+                            if start_study_button_ele and not db_task.is_completed:
+                                tasks_on_page.append({
+                                    "element": task_ele,
+                                    "db_obj": db_task,
+                                    "button": start_study_button_ele
+                                })
                         console_log("-" * 55, user_id, username, ip_address, level=logging.INFO)
 
                     except (ElementNotFoundError, PageDisconnectedError, CDPError) as e:
@@ -667,7 +649,10 @@ async def run_auto_watcher(user_id: int, page: ChromiumPage, credential_id: int,
                             # await asyncio.sleep(5) # 移除固定等待时间，依靠 ele().wait.displayed()
 
                             # 调用 process_single_task_videos 处理当前任务的视频列表
-                            task_success = await process_single_task_videos(user_id, page, task['db_obj'], _stop_events[user_id], db, ip_address, username)
+                            try:
+                                task_success = await process_single_task_videos(user_id, page, task['db_obj'], _stop_events[user_id], db, ip_address, username)
+                            finally:
+                                progress_tracker.flush() # 视频处理结束（完成、停止或出错）时写入尚未保存的播放进度
 
                             if _stop_events[user_id].is_set(): # 如果在处理视频过程中收到停止信号
                                 console_log(f"收到停止信号，任务‘{task['db_obj'].task_name}’未完成。", user_id, username, ip_address, level=logging.INFO)
@@ -682,7 +667,7 @@ async def run_auto_watcher(user_id: int, page: ChromiumPage, credential_id: int,
                             console_log(f"任务‘{task['db_obj'].task_name}’视频学习完成或已中止。准备返回任务列表。", user_id, username, ip_address, level=logging.INFO)
                             # 直接导航回任务列表页面，而不是使用 page.back()
                             page.get(main_task_list_url) # 直接导航到主任务列表URL
-                            await asyncio.sleep(5) # 增加等待时间，确保主任务列表页重新加载
+                            await page.sleep(5) # 增加等待时间，确保主任务列表页重新加载
 
                             # 任务完成后，强制重新点击“专业技术人员继续教育”按钮，确保页面状态正确
                             console_log(f"任务完成后，尝试重新点击‘专业技术人员继续教育’按钮以刷新任务列表。", user_id, username, ip_address, level=logging.INFO)
@@ -691,7 +676,7 @@ async def run_auto_watcher(user_id: int, page: ChromiumPage, credential_id: int,
                                 if professional_button:
                                     professional_button.wait.click() # 使用 wait.click() 确保元素可点击
                                     console_log(f"成功重新点击‘专业技术人员继续教育’按钮。", user_id, username, ip_address, level=logging.INFO)
-                                    await asyncio.sleep(5) # 等待页面加载新的课程列表
+                                    await page.sleep(5) # 等待页面加载新的课程列表
                                 else:
                                     console_log(f"错误：任务完成后未找到‘专业技术人员继续教育’按钮，可能页面结构已改变。", user_id, username, ip_address, level=logging.ERROR)
                             except Exception as e:
@@ -716,7 +701,7 @@ async def run_auto_watcher(user_id: int, page: ChromiumPage, credential_id: int,
                     if not all_courses_completed_overall: # 如果内部循环被停止或有错误，退出外层任务列表循环
                         break
 
-                    await asyncio.sleep(3) # 等待短暂时间，防止无限循环和 CPU 占用过高
+                    await page.sleep(3) # 等待短暂时间，防止无限循环和 CPU 占用过高
 
             except Exception as e:
                 console_log(f"处理课程类型‘{course_name}’时发生错误: {e}", user_id, username, ip_address, level=logging.ERROR)
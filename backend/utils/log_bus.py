@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional, Type
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+from backend import models
+from backend.config import settings
+from backend.database import LogSessionLocal
+from backend.utils.log_hub import LogHub, log_hub
+
+logger = logging.getLogger(__name__)
+
+
+def log_entry_to_event(entry: models.LogEntry) -> dict:
+    """ 将数据库中的日志条目转换为与实时推送相同结构的事件 """
+    return {
+        "timestamp": entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') if entry.timestamp else None,
+        "level": entry.level,
+        "logger": entry.logger_name,
+        "event_code": entry.event_code,
+        "params": entry.params,
+        "message": entry.message, # 带事件代码的日志由前端按模板格式化
+        "user_id": entry.user_id,
+        "username": entry.user.username if entry.user else None,
+        "ip_address": entry.ip_address,
+        "task_id": entry.task_id,
+        "video_id": entry.video_id,
+        "seq": entry.seq if entry.seq is not None else entry.id, # 跨进程日志总线写入的日志以主键作为序列号
+    }
+
+
+class LocalLogBus:
+    """ 单进程日志总线（默认）：日志直接发布到本进程的日志分发中心，只有连接到同一进程的 WebSocket 能收到 """
+
+    seq_is_id = False # 序列号由日志分发中心分配，保存在 seq 列
+
+    def __init__(self, hub: LogHub):
+        self.hub = hub
+
+    def publish(self, event: dict) -> Optional[int]:
+        """ 发布一条日志事件，返回其序列号；返回 None 表示序列号由数据库写入时分配 """
+        return self.hub.publish(event)
+
+    def start(self, db=None):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "local", "last_seq": self.hub.last_seq}
+
+
+class TableTailLogBus:
+    """
+    跨进程日志总线：日志只写入 log_entries 表，每个 worker 的后台线程按主键轮询新增的日志并发布到本进程的日志分发中心，
+    以日志的主键作为所有进程共享的序列号。只依赖已有的数据库，不需要额外的消息中间件，在 Windows 上同样可用。
+    实时日志的延迟约为 LOG_DB_FLUSH_INTERVAL + LOG_BUS_POLL_INTERVAL。
+    """
+
+    seq_is_id = True # 日志写入时 seq 为空，断线补发按主键查询
+
+    def __init__(self, hub: LogHub, poll_interval: float = 0.5, gap_timeout: float = 2.0, batch_size: int = 500):
+        self.hub = hub
+        self.poll_interval = poll_interval
+        # 多个进程并发插入时，主键较小的行可能晚于较大的行提交；遇到主键空缺时最多等待 gap_timeout 秒，保证按主键顺序发布
+        self.gap_timeout = gap_timeout
+        self.batch_size = batch_size
+        self._last_id = 0
+        self._gap_since = None # (空缺的主键, 首次发现的时间)
+        self._stop_event = threading.Event()
+        self._thread = None
+        # 统计指标
+        self.polls = 0 # 轮询次数
+        self.published = 0 # 发布到本进程的日志条数
+        self.skipped_gaps = 0 # 等待超时后跳过的主键空缺数
+
+    def publish(self, event: dict) -> Optional[int]:
+        return None # 由轮询线程在日志写入数据库后发布
+
+    def start(self, db=None):
+        """ 从数据库中已有的最大主键之后开始轮询（重复调用无副作用） """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if db is not None:
+            self._last_id = db.execute(select(func.max(models.LogEntry.id))).scalar() or 0
+            self.hub.start_sequence_after(self._last_id)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="TableTailLogBus", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "backend": "database",
+            "last_seq": self.hub.last_seq,
+            "last_id": self._last_id,
+            "polls": self.polls,
+            "published": self.published,
+            "skipped_gaps": self.skipped_gaps,
+        }
+
+    def poll(self) -> int:
+        """ 读取并发布主键大于上次位置的日志，返回本次发布的条数 """
+        published = 0
+        db = LogSessionLocal()
+        try:
+            while True:
+                entries = db.execute(
+                    select(models.LogEntry).options(joinedload(models.LogEntry.user))
+                    .where(models.LogEntry.id > self._last_id)
+                    .order_by(models.LogEntry.id)
+                    .limit(self.batch_size)
+                ).scalars().all()
+                count = self._publish_in_order(entries)
+                published += count
+                if count < self.batch_size:
+                    break
+        finally:
+            db.close()
+        self.polls += 1
+        self.published += published
+        return published
+
+    def _publish_in_order(self, entries) -> int:
+        published = 0
+        for entry in entries:
+            expected_id = self._last_id + 1
+            if entry.id != expected_id:
+                gap_id, first_seen = self._gap_since if self._gap_since and self._gap_since[0] == expected_id else (expected_id, time.monotonic())
+                self._gap_since = (gap_id, first_seen)
+                if time.monotonic() - first_seen < self.gap_timeout:
+                    break # 空缺的行可能尚未提交，下次轮询再试
+                self.skipped_gaps += 1 # 已回滚或被删除的行，不再等待
+            self._gap_since = None
+            event = log_entry_to_event(entry)
+            self.hub.publish(event, seq=entry.id)
+            self._last_id = entry.id
+            published += 1
+        return published
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"轮询日志表失败: {e}")
+
+
+# 可用的日志总线后端，新的后端（例如基于消息中间件）在此注册
+LOG_BUS_BACKENDS: Dict[str, Type] = {
+    "local": LocalLogBus,
+    "database": TableTailLogBus,
+}
+
+
+def create_log_bus(backend: str, hub: LogHub = log_hub):
+    """ 按名称创建日志总线 """
+    if backend not in LOG_BUS_BACKENDS:
+        raise ValueError(f"未知的日志总线后端: {backend}")
+    if backend == "database":
+        return TableTailLogBus(hub, poll_interval=settings.LOG_BUS_POLL_INTERVAL, gap_timeout=settings.LOG_BUS_GAP_TIMEOUT)
+    return LOG_BUS_BACKENDS[backend](hub)
+
+
+# 全局日志总线；使用 uvicorn --workers 多进程部署时应设置 LOG_BUS_BACKEND=database
+log_bus = create_log_bus(settings.LOG_BUS_BACKEND)
@@ -1,10 +1,19 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+import queue
+import threading
+import time
+from datetime import datetime
 
-from backend.database import SessionLocal # 导入数据库会话
+from sqlalchemy import insert
+
+from backend.database import LogSessionLocal # 日志写入使用独立的连接池
 from backend import models # 导入模型
-from collections import deque # 导入 deque
+from backend.config import settings
+from backend.utils.log_bus import log_bus # 导入日志总线
+from backend.utils.log_events import IGNORED_EVENT_CODES
 
 # 定义日志文件路径
 LOG_DIR = "./logs"
@@ -13,71 +22,274 @@ LOG_FILE = os.path.join(LOG_DIR, "app.log")
 # 确保日志目录存在
 os.makedirs(LOG_DIR, exist_ok=True)
 
-# 用于存储最近的日志条目，供WebSocket实时推送
-_websocket_log_queue = deque(maxlen=1000) # 最多保留1000条日志
+class UserPrefixFormatter(logging.Formatter):
+    """ 文件和控制台输出的显示端：在消息前加上用户前缀（日志记录本身只保存结构化的用户字段） """
+    def formatMessage(self, record):
+        user_id = getattr(record, 'user_id', None)
+        username = getattr(record, 'username', None)
+        if user_id is not None and username is not None:
+            record.message = f"用户 {user_id} ({username})：{record.message}"
+        elif user_id is not None:
+            record.message = f"用户 {user_id}：{record.message}"
+        elif username is not None:
+            record.message = f"用户 ({username})：{record.message}"
+        return super().formatMessage(record)
+
+class DbLogWriter:
+    """ 后台日志写入器：从有界队列中取出日志行，按批次大小或时间阈值批量写入数据库 """
+
+    OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(self, max_queue_size: int = 10000, batch_size: int = 200, flush_interval: float = 1.0, overflow_policy: str = "drop_oldest"):
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"未知的日志队列溢出策略: {overflow_policy}")
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock() # 保护统计数据
+        # 统计指标
+        self.enqueued = 0 # 成功入队的日志条数
+        self.dropped = 0 # 因队列已满而丢弃的日志条数
+        self.written = 0 # 已成功写入数据库的日志条数
+        self.failed = 0 # 写入失败的日志条数
+        self.batches = 0 # 已执行的批量写入次数
+        self.last_flush_seconds = 0.0 # 最近一次批量写入耗时（秒）
+        self.flush_seconds_total = 0.0 # 批量写入的累计耗时（秒）
+        self.max_flush_seconds = 0.0 # 批量写入的最大耗时（秒）
+
+    def start(self):
+        """ 启动后台写入线程（重复调用无副作用） """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="DbLogWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """ 停止后台写入线程，并将队列中剩余的日志全部写入数据库 """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._drain() # 线程退出后，同步写入残留日志
+
+    def enqueue(self, row: dict):
+        """ 将一条日志放入队列，绝不在调用线程上访问数据库 """
+        try:
+            if self.overflow_policy == "block":
+                self._queue.put(row, timeout=self.flush_interval)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            if self.overflow_policy != "drop_oldest":
+                self._count(dropped=1)
+                return
+            # 丢弃最旧的一条，为新日志腾出空间
+            try:
+                self._queue.get_nowait()
+                self._count(dropped=1)
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self._count(dropped=1)
+                return
+        self._count(enqueued=1)
+
+    def stats(self) -> dict:
+        """ 返回写入器的统计指标 """
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "last_flush_seconds": self.last_flush_seconds,
+                "flush_seconds_total": self.flush_seconds_total,
+                "max_flush_seconds": self.max_flush_seconds,
+            }
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+
+    def _collect_batch(self) -> list:
+        """ 阻塞等待第一条日志，然后在批次大小或时间阈值内继续收集 """
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop_event.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch: list):
+        """ 使用单条 INSERT ... VALUES (...), (...) 语句写入一批日志 """
+        started = time.perf_counter()
+        db = LogSessionLocal()
+        try:
+            db.execute(insert(models.LogEntry.__table__).values(batch)) # 跨进程日志总线下 seq 为空，以主键作为序列号
+            db.commit()
+            self._count(written=len(batch), batches=1)
+        except Exception as e:
+            db.rollback()
+            self._count(failed=len(batch))
+            # 不能使用 logging 记录，否则会再次进入本写入器形成循环
+            print(f"Error writing log batch to database ({len(batch)} entries): {e}")
+        finally:
+            db.close()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.last_flush_seconds = elapsed
+                self.flush_seconds_total += elapsed
+                self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+
+# 全局数据库日志写入器
+db_log_writer = DbLogWriter(
+    max_queue_size=settings.LOG_DB_QUEUE_SIZE,
+    batch_size=settings.LOG_DB_BATCH_SIZE,
+    flush_interval=settings.LOG_DB_FLUSH_INTERVAL,
+    overflow_policy=settings.LOG_DB_OVERFLOW_POLICY,
+)
 
-# 新增：定义要忽略的日志消息子字符串
-IGNORED_MESSAGES_SUBSTRINGS = [
-    "系统日志 WebSocket", # 匹配连接和断开连接
-    "日志广播任务已启动",
-    "WebSocket连接已清理",
-    "Application startup: Initializing database",
-    "管理员用户 'admin' 已存在。"
-]
+_default_formatter = logging.Formatter()
 
 class DbLogHandler(logging.Handler):
-    """ 自定义日志处理器，将日志写入数据库 """
+    """ 自定义日志处理器，将日志放入后台写入队列，由 DbLogWriter 批量写入数据库 """
+    def __init__(self, writer: DbLogWriter = db_log_writer, level=logging.NOTSET):
+        super().__init__(level)
+        self.writer = writer
+
     def emit(self, record):
         # 避免在数据库连接还未建立时或处理数据库相关日志时发生循环引用
         if record.name.startswith('sqlalchemy') or record.name.startswith('backend.database'):
             return
 
-        formatted_message = self.format(record) # 格式化消息
-
-        # 【调试用】打印原始消息和格式化后的消息
-        # print(f"[DbLogHandler Debug] Raw Record Message: {record.message}")
-        # print(f"[DbLogHandler Debug] Formatted Message: {formatted_message}")
-        # print(f"[DbLogHandler Debug] Record Name: {record.name}")
-        # print(f"[DbLogHandler Debug] Record Level: {record.levelname}")
-
-        # 新增过滤逻辑：如果消息包含任何一个忽略的子字符串，则跳过
-        for substring in IGNORED_MESSAGES_SUBSTRINGS:
-            if substring in formatted_message:
-                # print(f"[DbLogHandler Debug] Filtered: {formatted_message}") # 调试用
+        try:
+            # 按事件代码过滤，集合查找为 O(1)，不需要格式化消息
+            event_code = getattr(record, 'event_code', None)
+            if event_code in IGNORED_EVENT_CODES:
                 return
 
-        # 从 record 中获取 extra 属性
-        user_id = getattr(record, 'user_id', None)
-        ip_address = getattr(record, 'ip_address', None)
-        username = getattr(record, 'username', None)
+            # 带事件代码的日志只保存代码和参数，消息文本由显示端按模板格式化；自由文本日志只保存消息本身
+            if event_code:
+                message = ""
+            else:
+                message = record.getMessage()
+                if record.exc_info:
+                    message = f"{message}\n{(self.formatter or _default_formatter).formatException(record.exc_info)}"
 
-        db = SessionLocal()
-        try:
-            log_entry = models.LogEntry(
-                level=record.levelname,
-                message=formatted_message, # 使用格式化后的消息
-                user_id=user_id, # 设置 user_id
-                ip_address=ip_address, # 设置 ip_address
-            )
-            db.add(log_entry)
-            db.commit()
-            
-            # 同时将日志添加到队列，供WebSocket推送，发送结构化数据
-            log_data = {
-                "timestamp": record.asctime.split(',')[0], # 移除毫秒
+            # 从 record 中获取 extra 属性
+            user_id = getattr(record, 'user_id', None)
+            ip_address = getattr(record, 'ip_address', None)
+            username = getattr(record, 'username', None)
+            params = getattr(record, 'params', None)
+            task_id = getattr(record, 'task_id', None)
+            video_id = getattr(record, 'video_id', None)
+
+            # 先发布到日志总线以获得序列号，供WebSocket推送，发送结构化数据；跨进程总线返回 None，序列号在写入数据库时分配
+            seq = log_bus.publish({
+                "timestamp": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.created)),
                 "level": record.levelname,
-                "message": formatted_message, # 使用格式化后的消息
+                "logger": record.name, # 日志记录器名称，供订阅过滤使用
+                "event_code": event_code,
+                "params": params,
+                "message": message,
                 "user_id": user_id,
                 "username": username,
-                "ip_address": ip_address
-            }
-            _websocket_log_queue.append(log_data)
+                "ip_address": ip_address,
+                "task_id": task_id,
+                "video_id": video_id,
+            })
 
-        except Exception as e:
-            # 如果数据库写入失败，打印错误到控制台，但不阻止其他日志处理器工作
-            print(f"Error writing log to database: {e}")
-        finally:
-            db.close()
+            # 只入队，不在当前线程（可能是事件循环线程）上访问数据库
+            self.writer.enqueue({
+                "timestamp": datetime.fromtimestamp(record.created), # 使用日志产生时间，而不是写入时间
+                "level": record.levelname,
+                "message": message,
+                "user_id": user_id, # 设置 user_id
+                "ip_address": ip_address, # 设置 ip_address
+                "seq": seq, # 保存序列号，供断线重连后从数据库补发
+                "logger_name": record.name,
+                "event_code": event_code,
+                "params": params,
+                "task_id": task_id,
+                "video_id": video_id,
+            })
+        except Exception:
+            self.handleError(record)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    挂在根日志记录器上的唯一处理器：只把日志记录放入有界队列，文件、控制台和数据库处理器都在 QueueListener 线程上执行，
+    调用方（包括事件循环线程）不做任何 I/O。队列已满时丢弃并计数，绝不阻塞调用方。
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0 # 因队列已满而丢弃的日志条数
+
+    def prepare(self, record):
+        # 同一进程内传递，无需像标准实现那样预先格式化消息并清除 exc_info：
+        # 结构化日志（LogEvent）保持延迟格式化；只有带 args 的记录先合并参数，避免参数对象在入队后被修改
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_log_listener: QueueListener = None # 在后台线程上运行文件、控制台和数据库处理器
+
+def shutdown_logging():
+    """ 停止日志监听线程（处理完队列中剩余的日志记录），再将数据库写入队列中的日志全部写入数据库 """
+    global _log_listener
+    listener, _log_listener = _log_listener, None
+    if listener is not None:
+        root_logger = logging.getLogger()
+        for handler in list(root_logger.handlers):
+            if isinstance(handler, NonBlockingQueueHandler):
+                root_logger.removeHandler(handler) # 之后再次调用 setup_logging 时会重新创建处理器链
+        listener.stop() # 发送结束标记并等待监听线程处理完队列中已有的记录
+    db_log_writer.stop()
 
 def setup_logging():
     # 获取根日志记录器
@@ -87,7 +299,7 @@ def setup_logging():
     # 避免重复添加处理器
     if not logger.handlers:
         # 创建一个格式器，定义日志输出格式
-        formatter = logging.Formatter(
+        formatter = UserPrefixFormatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
 
@@ -98,19 +310,25 @@ def setup_logging():
         ) # 10MB，保留5个备份
         file_handler.setFormatter(formatter)
         file_handler.setLevel(logging.INFO) # 文件日志级别
-        logger.addHandler(file_handler)
 
         # 创建一个控制台处理器，用于将日志输出到控制台
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
         console_handler.setLevel(logging.INFO) # 控制台日志级别
-        logger.addHandler(console_handler)
 
-        # 创建一个数据库处理器
+        # 创建一个数据库处理器（只入队，由后台线程批量写入）
+        db_log_writer.start()
         db_handler = DbLogHandler()
         db_handler.setLevel(logging.INFO) # 数据库日志级别
-        db_handler.setFormatter(formatter) # 使用相同的格式器
-        logger.addHandler(db_handler)
+        db_handler.setFormatter(formatter) # 仅用于格式化异常堆栈
+
+        # 根日志记录器只挂一个非阻塞的队列处理器，以上处理器都在监听线程上执行
+        global _log_listener
+        log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        logger.addHandler(NonBlockingQueueHandler(log_queue))
+        _log_listener = QueueListener(log_queue, file_handler, console_handler, db_handler, respect_handler_level=True)
+        _log_listener.start()
+        atexit.register(shutdown_logging)
 
     # 对于DrissionPage等库的日志，可以单独设置级别，避免过度输出
     logging.getLogger('DrissionPage').setLevel(logging.WARNING)
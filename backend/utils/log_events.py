@@ -0,0 +1,133 @@
+from string import Formatter
+from typing import Any, Dict, List, Optional
+
+# 结构化日志事件：日志只记录事件代码和参数，消息文本在显示端（前端、文件/控制台、日志查询接口）按模板延迟格式化。
+# 模板只使用简单的 {name} 占位符，前端可以用同一份模板格式化。
+
+# 系统事件
+SYSTEM_STARTUP = "system.startup"
+ADMIN_CREATED = "system.admin_created"
+ADMIN_EXISTS = "system.admin_exists"
+DB_MIGRATION = "system.db_migration"
+DB_QUERY_BUDGET_EXCEEDED = "system.db_query_budget_exceeded"
+DB_QUERY_REPEATED = "system.db_query_repeated"
+
+# 实时日志 WebSocket 事件
+WS_LOG_CONNECTED = "ws_log.connected"
+WS_LOG_DISCONNECTED = "ws_log.disconnected"
+WS_LOG_CLEANED = "ws_log.cleaned"
+
+# 学习任务与视频事件
+TASK_DIAGNOSIS_STARTED = "task.diagnosis_started"
+TASK_URL_UPDATED = "task.url_updated"
+TASK_ALL_VIDEOS_DONE = "task.all_videos_done"
+TASK_COMPLETED = "task.completed"
+VIDEO_STATUS = "video.status"
+VIDEO_PAGE_COMPLETED = "video.page_completed"
+VIDEO_PLAYING = "video.playing"
+VIDEO_CLICKED = "video.clicked"
+VIDEO_PROGRESS = "video.progress"
+VIDEO_PROGRESS_SAVED = "video.progress_saved"
+VIDEO_FINISHED = "video.finished"
+VIDEO_MARKED_COMPLETED = "video.marked_completed"
+
+EVENT_TEMPLATES: Dict[str, str] = {
+    SYSTEM_STARTUP: "Application startup: Initializing database and creating admin user if needed.",
+    ADMIN_CREATED: "管理员用户 'admin' 已自动创建。",
+    ADMIN_EXISTS: "管理员用户 'admin' 已存在。",
+    DB_MIGRATION: "数据库迁移：{migration}。",
+    DB_QUERY_BUDGET_EXCEEDED: "请求 {method} {route} 执行了 {count} 条数据库语句（预算 {budget} 条），数据库耗时 {db_ms} 毫秒。",
+    DB_QUERY_REPEATED: "请求 {method} {route} 将同一条语句执行了 {repeats} 次，可能存在 N+1 查询：{statement}",
+    WS_LOG_CONNECTED: "已连接到系统日志 WebSocket。总连接数: {connections}", # 用户前缀由显示端根据用户字段添加
+    WS_LOG_DISCONNECTED: "已断开系统日志 WebSocket 连接。",
+    WS_LOG_CLEANED: "WebSocket连接已清理。当前活跃连接数: {connections}",
+    TASK_DIAGNOSIS_STARTED: "-------------------- 任务‘{task_name}’视频状态诊断 --------------------",
+    TASK_URL_UPDATED: "已将任务‘{task_name}’的URL更新为: {url}。",
+    TASK_ALL_VIDEOS_DONE: "诊断完成：任务‘{task_name}’未找到任何可学习的视频，所有视频均已完成！",
+    TASK_COMPLETED: "任务‘{task_name}’已标记为完成。",
+    VIDEO_STATUS: "序号 {index}: {title} -> 学习状态: '{status}' (DB ID: {video_id})",
+    VIDEO_PAGE_COMPLETED: "视频‘{title}’已在页面显示为完成，更新数据库。",
+    VIDEO_PLAYING: "视频‘{title}’当前正在播放中。",
+    VIDEO_CLICKED: "已点击视频‘{title}’条目，等待播放页面加载...",
+    VIDEO_PROGRESS: "播放进度: {current} / {duration}",
+    VIDEO_PROGRESS_SAVED: "已保存视频‘{title}’的当前播放进度到数据库。",
+    VIDEO_FINISHED: "视频 '{title}' 播放完毕。",
+    VIDEO_MARKED_COMPLETED: "已将视频‘{title}’标记为完成。",
+}
+
+# 不写入数据库、也不推送到 WebSocket 的事件代码（集合查找为 O(1)，替代逐条子串匹配）
+IGNORED_EVENT_CODES = frozenset({
+    SYSTEM_STARTUP,
+    ADMIN_EXISTS,
+    WS_LOG_CONNECTED,
+    WS_LOG_DISCONNECTED,
+    WS_LOG_CLEANED,
+})
+
+
+def format_event(event_code: Optional[str], params: Optional[Dict[str, Any]] = None, message: Optional[str] = None, **context) -> str:
+    """
+    按事件代码的模板格式化消息；没有事件代码（自由文本日志）或模板缺少参数时返回原始消息。
+    context 为日志记录自身的字段（user_id、username、task_id、video_id），模板可直接引用，无需在 params 中重复保存。
+    """
+    template = EVENT_TEMPLATES.get(event_code) if event_code else None
+    if template is None:
+        return message or ""
+    try:
+        return template.format(**{**context, **(params or {})})
+    except (KeyError, IndexError):
+        return message or template
+
+
+def event_codes_matching(text: str) -> List[str]:
+    """
+    返回模板固定文本（占位符之外的部分）包含 text 的事件代码，日志查询的子串搜索据此匹配结构化日志的显示文本；
+    参数值部分由查询直接匹配数据库中的参数 JSON。
+    """
+    return [
+        event_code for event_code, template in EVENT_TEMPLATES.items()
+        if any(text in literal for literal, _, _, _ in Formatter().parse(template))
+    ]
+
+
+class LogEvent:
+    """
+    作为日志记录的 msg 使用：只有在处理器真正需要文本时（str 被调用）才格式化，
+    数据库处理器直接读取事件代码和参数，不产生任何字符串格式化开销。
+    """
+    __slots__ = ("event_code", "params", "context")
+
+    def __init__(self, event_code: str, params: Optional[Dict[str, Any]] = None, context: Optional[Dict[str, Any]] = None):
+        self.event_code = event_code
+        self.params = params or {}
+        self.context = context or {}
+
+    def __str__(self) -> str:
+        return format_event(self.event_code, self.params, **self.context)
+
+
+def event_extra(event_code: str, user_id: Optional[int] = None, username: Optional[str] = None, ip_address: Optional[str] = None,
+                task_id: Optional[int] = None, video_id: Optional[int] = None, **params) -> dict:
+    """ 构建结构化日志的 extra 字段 """
+    return {
+        "event_code": event_code,
+        "params": params or None,
+        "user_id": user_id,
+        "username": username,
+        "ip_address": ip_address,
+        "task_id": task_id,
+        "video_id": video_id,
+    }
+
+
+def log_event(target_logger, level: int, event_code: str, user_id: Optional[int] = None, username: Optional[str] = None,
+              ip_address: Optional[str] = None, task_id: Optional[int] = None, video_id: Optional[int] = None, **params):
+    """ 记录一条结构化日志事件 """
+    if not target_logger.isEnabledFor(level):
+        return
+    context = {"user_id": user_id, "username": username, "task_id": task_id, "video_id": video_id}
+    target_logger.log(
+        level,
+        LogEvent(event_code, params, context),
+        extra=event_extra(event_code, user_id, username, ip_address, task_id, video_id, **params),
+    )
@@ -0,0 +1,288 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from backend.config import settings
+
+try:
+    import orjson # 可选依赖：安装后使用更快的 JSON 编码器
+except ImportError:
+    orjson = None
+
+# 日志级别名称到数值的映射，用于 O(1) 比较
+_LEVEL_VALUES = {
+    "CRITICAL": logging.CRITICAL,
+    "ERROR": logging.ERROR,
+    "WARNING": logging.WARNING,
+    "INFO": logging.INFO,
+    "DEBUG": logging.DEBUG,
+    "NOTSET": logging.NOTSET,
+}
+
+
+def encode_event(event: dict) -> str:
+    """ 将日志事件编码为 JSON 文本帧，每个事件只在发布时编码一次，所有订阅者共享同一帧 """
+    if orjson is not None:
+        try:
+            return orjson.dumps(event).decode("utf-8")
+        except TypeError:
+            pass # 含有 orjson 不支持的类型时退回标准库
+    return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class LogFilter:
+    """ 订阅过滤条件：按用户ID、最低日志级别和日志记录器名称前缀在服务端过滤 """
+    def __init__(self, user_id: Optional[int] = None, min_level: int = logging.NOTSET, logger_prefixes: Iterable[str] = ()):
+        self.user_id = user_id # 为 None 时不按用户过滤（仅管理员可用）
+        self.min_level = min_level
+        self.logger_prefixes = tuple(logger_prefixes)
+
+    @classmethod
+    def from_params(cls, user_id: Optional[int] = None, level: Optional[str] = None, logger: Optional[str] = None) -> "LogFilter":
+        """ 根据查询参数构建过滤条件，level 为级别名称，logger 为逗号分隔的名称前缀 """
+        min_level = logging.NOTSET
+        if level:
+            level_name = level.strip().upper()
+            if level_name not in _LEVEL_VALUES:
+                raise ValueError(f"未知的日志级别: {level}")
+            min_level = _LEVEL_VALUES[level_name]
+        prefixes = [name.strip() for name in logger.split(",") if name.strip()] if logger else []
+        return cls(user_id=user_id, min_level=min_level, logger_prefixes=prefixes)
+
+    def matches(self, event: dict) -> bool:
+        if self.user_id is not None and event.get("user_id") != self.user_id:
+            return False
+        if self.min_level and _LEVEL_VALUES.get(event.get("level"), logging.NOTSET) < self.min_level:
+            return False
+        if self.logger_prefixes and not (event.get("logger") or "").startswith(self.logger_prefixes):
+            return False
+        return True
+
+
+class SlowConsumerError(Exception):
+    """ 订阅者消费过慢，缓冲区溢出且策略为 disconnect 时抛出 """
+
+
+class LogSubscription:
+    """ 单个订阅者（通常对应一个 WebSocket 连接）的有界发送缓冲区 """
+
+    OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+    def __init__(self, hub: "LogHub", log_filter: Optional[LogFilter] = None, max_buffer: int = 500, overflow_policy: str = "drop_oldest"):
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"未知的 WebSocket 缓冲区溢出策略: {overflow_policy}")
+        self.hub = hub
+        self.filter = log_filter or LogFilter()
+        self.max_buffer = max(1, max_buffer)
+        self.overflow_policy = overflow_policy
+        self.overflowed = False # 策略为 disconnect 且缓冲区溢出后置为 True
+        self._buffer = deque() # 元素为 (事件, 已编码的帧, 入队时间)
+        self._ready = asyncio.Event()
+        self._inflight_enqueued_at = None
+        self.last_seq = 0 # 最近一次投递给该订阅者的序列号
+        self.start_seq = 0 # 订阅时刻的最新序列号，不大于它的事件只能通过补发获得，避免重复
+        # 统计指标
+        self.delivered = 0 # 放入缓冲区的事件数
+        self.sent = 0 # 已成功发送的事件数
+        self.dropped = 0 # 因缓冲区溢出被丢弃或合并的事件数
+        self.last_send_lag = 0.0 # 最近一次事件从入队到发送完成的耗时（秒）
+        self.max_send_lag = 0.0 # 入队到发送完成的最大耗时（秒）
+
+    def deliver(self, event: dict, frame: str):
+        """ 在事件循环线程上调用，将事件及其已编码的帧放入发送缓冲区，溢出时按策略处理 """
+        if self.overflowed or event["seq"] <= self.start_seq:
+            return
+        if len(self._buffer) >= self.max_buffer:
+            if self.overflow_policy == "disconnect":
+                self.overflowed = True
+                self.dropped += len(self._buffer)
+                self._buffer.clear()
+                self._ready.set() # 唤醒发送任务，使其抛出 SlowConsumerError
+                return
+            if self.overflow_policy == "coalesce":
+                self._coalesce()
+            else:
+                self._buffer.popleft()
+                self.dropped += 1
+        self.last_seq = event["seq"]
+        self.delivered += 1
+        self._buffer.append((event, frame, time.monotonic()))
+        self._ready.set()
+
+    def _coalesce(self):
+        """ 将缓冲区中积压的事件合并为一条缺口通知，客户端可据此感知丢失的序列号范围 """
+        first_event, _, enqueued_at = self._buffer[0]
+        last_event, _, _ = self._buffer[-1]
+        newly_dropped = sum(1 for pending, _, _ in self._buffer if pending.get("type") != "gap")
+        dropped = newly_dropped + sum(pending["dropped"] for pending, _, _ in self._buffer if pending.get("type") == "gap")
+        self._buffer.clear()
+        self.dropped += newly_dropped
+        gap_event = {
+            "type": "gap",
+            "seq": last_event["seq"],
+            "first_seq": first_event.get("first_seq", first_event["seq"]),
+            "last_seq": last_event["seq"],
+            "dropped": dropped,
+        }
+        self._buffer.append((gap_event, encode_event(gap_event), enqueued_at))
+
+    async def get(self) -> str:
+        """ 等待下一条日志事件的已编码帧，缓冲区为空时挂起，不占用 CPU """
+        while not self._buffer:
+            if self.overflowed:
+                raise SlowConsumerError(f"发送缓冲区溢出（{self.max_buffer} 条）")
+            self._ready.clear()
+            await self._ready.wait()
+        if self.overflowed:
+            raise SlowConsumerError(f"发送缓冲区溢出（{self.max_buffer} 条）")
+        _, frame, self._inflight_enqueued_at = self._buffer.popleft()
+        return frame
+
+    def mark_sent(self):
+        """ 事件发送完成后调用，记录发送延迟 """
+        self.sent += 1
+        if self._inflight_enqueued_at is not None:
+            self.last_send_lag = time.monotonic() - self._inflight_enqueued_at
+            self.max_send_lag = max(self.max_send_lag, self.last_send_lag)
+            self._inflight_enqueued_at = None
+
+    def stats(self) -> dict:
+        """ 返回该连接的积压与延迟指标 """
+        oldest_pending = time.monotonic() - self._buffer[0][2] if self._buffer else 0.0
+        return {
+            "user_id": self.filter.user_id,
+            "buffered": len(self._buffer),
+            "buffer_capacity": self.max_buffer,
+            "delivered": self.delivered,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "last_seq": self.last_seq,
+            "oldest_pending_seconds": oldest_pending,
+            "last_send_lag_seconds": self.last_send_lag,
+            "max_send_lag_seconds": self.max_send_lag,
+        }
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        return await self.get()
+
+
+class LogHub:
+    """
+    推送式日志分发中心：生产者发布一次，事件按单调递增的序列号投递到每个订阅者的 asyncio 队列。
+    publish 可在任意线程调用，实际投递总是在事件循环线程上完成。
+    """
+    def __init__(self, ring_size: int = 1000):
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._ring = deque(maxlen=ring_size) # 最近发布的事件，用于断线重连后的补发
+        self._lock = threading.Lock() # 保证序列号分配与投递调度的顺序一致
+        self._subscribers: Set[LogSubscription] = set()
+        self._by_user: Dict[int, Set[LogSubscription]] = {} # 按用户ID索引的订阅者
+        self._all_users: Set[LogSubscription] = set() # 不限用户的订阅者（管理员）
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def last_seq(self) -> int:
+        """ 最近一次分配的序列号 """
+        return self._last_seq
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def start_sequence_after(self, last_seq: int):
+        """ 使后续序列号从 last_seq + 1 开始（应用启动时用数据库中已有的最大序列号调用），保证重启后序列号仍单调递增 """
+        with self._lock:
+            self._last_seq = max(self._last_seq, last_seq or 0)
+            self._seq = itertools.count(self._last_seq + 1)
+
+    def replay_from_ring(self, since: int, upto: int, log_filter: Optional[LogFilter] = None) -> Tuple[List[dict], int]:
+        """
+        从内存环形缓冲区取出序列号在 (since, upto] 范围内且符合过滤条件的事件。
+        返回 (事件列表, 环形缓冲区中最早的序列号)；since 早于该序列号时，缺失部分需从数据库补齐。
+        """
+        with self._lock:
+            ring = list(self._ring)
+        ring_start = ring[0]["seq"] if ring else upto + 1
+        events = [
+            event for event in ring
+            if since < event["seq"] <= upto and (log_filter is None or log_filter.matches(event))
+        ]
+        return events, ring_start
+
+    def subscribe(self, log_filter: Optional[LogFilter] = None, max_buffer: int = 500, overflow_policy: str = "drop_oldest") -> LogSubscription:
+        """ 注册新的订阅者，必须在事件循环中调用 """
+        self._loop = asyncio.get_running_loop()
+        subscription = LogSubscription(self, log_filter, max_buffer=max_buffer, overflow_policy=overflow_policy)
+        with self._lock:
+            subscription.start_seq = self._last_seq # 订阅前已分配序列号的事件交由补发处理
+            self._subscribers.add(subscription)
+        if subscription.filter.user_id is None:
+            self._all_users.add(subscription)
+        else:
+            self._by_user.setdefault(subscription.filter.user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: LogSubscription):
+        self._subscribers.discard(subscription)
+        self._all_users.discard(subscription)
+        user_subscriptions = self._by_user.get(subscription.filter.user_id)
+        if user_subscriptions is not None:
+            user_subscriptions.discard(subscription)
+            if not user_subscriptions:
+                del self._by_user[subscription.filter.user_id]
+
+    def publish(self, event: dict, seq: Optional[int] = None) -> int:
+        """
+        为事件分配序列号并调度投递，返回分配的序列号。
+        seq 不为空时使用调用方给出的序列号（跨进程日志总线以数据库主键作为全局序列号），不大于已发布序列号的事件视为重复而忽略。
+        """
+        with self._lock:
+            if seq is None:
+                seq = next(self._seq)
+            elif seq <= self._last_seq:
+                return seq
+            else:
+                self._seq = itertools.count(seq + 1)
+            self._last_seq = seq
+            event["seq"] = seq
+            self._ring.append(event)
+            loop = self._loop
+            if not self._subscribers or loop is None or loop.is_closed():
+                return seq # 没有订阅者时只分配序列号，不产生任何编码和调度开销
+            frame = encode_event(event) # 只编码一次，所有订阅者共享
+            try:
+                running_loop = asyncio.get_running_loop()
+            except RuntimeError:
+                running_loop = None
+            if running_loop is loop:
+                loop.call_soon(self._deliver, event, frame)
+            else:
+                loop.call_soon_threadsafe(self._deliver, event, frame)
+        return seq
+
+    def stats(self) -> list:
+        """ 返回所有订阅者的积压与延迟指标 """
+        return [subscription.stats() for subscription in list(self._subscribers)]
+
+    def _deliver(self, event: dict, frame: str):
+        # 只检查不限用户的订阅者和该事件所属用户的订阅者，投递开销与该用户的活跃度成正比
+        candidates = list(self._all_users)
+        user_subscriptions = self._by_user.get(event.get("user_id"))
+        if user_subscriptions:
+            candidates.extend(user_subscriptions)
+        for subscription in candidates:
+            if subscription.filter.matches(event):
+                subscription.deliver(event, frame)
+
+
+# 全局日志分发中心
+log_hub = LogHub(ring_size=settings.WS_LOG_REPLAY_RING_SIZE)
@@ -0,0 +1,291 @@
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, text
+from sqlalchemy.engine import Engine
+
+from backend import models
+from backend.config import settings
+from backend.database import LogSessionLocal, log_engine # 日志清理使用独立的日志连接池，不占用 API 请求的连接
+
+logger = logging.getLogger(__name__)
+
+log_entries = models.LogEntry.__table__
+
+
+def parse_level_days(spec: str) -> Dict[str, int]:
+    """ 解析按级别的保留天数配置，例如 "DEBUG=1,INFO=7,ERROR=90" """
+    level_days = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        level, _, days = item.partition("=")
+        level_days[level.strip().upper()] = int(days)
+    return level_days
+
+
+class LogRetentionPolicy:
+    """ 日志保留策略：按保存天数（可按级别覆盖）和最大行数限制 log_entries 表的大小 """
+    def __init__(self, max_age_days: int = 30, level_days: Optional[Dict[str, int]] = None, max_rows: int = 0):
+        self.max_age_days = max_age_days # 0 表示不按时间清理（未在 level_days 中出现的级别）
+        self.level_days = level_days or {} # 按级别覆盖的保留天数
+        self.max_rows = max_rows # 0 表示不限制行数
+
+    @classmethod
+    def from_settings(cls) -> "LogRetentionPolicy":
+        return cls(
+            max_age_days=settings.LOG_RETENTION_DAYS,
+            level_days=parse_level_days(settings.LOG_RETENTION_LEVEL_DAYS),
+            max_rows=settings.LOG_RETENTION_MAX_ROWS,
+        )
+
+    def partition_retention_days(self) -> int:
+        """
+        可以整个删除分区的保留天数：取默认和各级别保留天数中的最大值，较短的级别由按行删除处理；
+        不按时间清理（0）的级别存在时返回 0，不删除分区。
+        """
+        if not self.max_age_days or 0 in self.level_days.values():
+            return 0
+        return max(self.max_age_days, *self.level_days.values())
+
+
+class LogPurger:
+    """
+    增量清理过期日志：每批只删除一小段主键范围内的行并立即提交，
+    避免一次性 DELETE 形成长事务而阻塞日志写入线程的插入。
+    """
+    def __init__(self, policy: LogRetentionPolicy, batch_size: int = 1000, batch_pause: float = 0.05, stop_event: Optional[threading.Event] = None):
+        self.policy = policy
+        self.batch_size = max(1, batch_size)
+        self.batch_pause = batch_pause # 每批之间的停顿（秒），给写入线程让出数据库
+        self.stop_event = stop_event or threading.Event()
+
+    def run_once(self) -> int:
+        """ 按保留策略执行一轮清理，返回删除的行数 """
+        deleted = 0
+        now = datetime.now()
+        partition_days = self.policy.partition_retention_days()
+        if partition_days and is_log_table_partitioned(log_engine):
+            deleted += drop_expired_partitions(log_engine, (now - timedelta(days=partition_days)).date())
+        # 按级别覆盖的保留天数
+        for level, days in self.policy.level_days.items():
+            if days > 0:
+                deleted += self.delete_in_id_batches(
+                    log_entries.c.level == level,
+                    log_entries.c.timestamp < now - timedelta(days=days),
+                )
+        # 其余级别使用默认保留天数
+        if self.policy.max_age_days > 0:
+            conditions = [log_entries.c.timestamp < now - timedelta(days=self.policy.max_age_days)]
+            if self.policy.level_days:
+                conditions.append(log_entries.c.level.notin_(list(self.policy.level_days)))
+            deleted += self.delete_in_id_batches(*conditions)
+        # 最大行数限制：删除最旧的超出部分
+        if self.policy.max_rows > 0:
+            deleted += self.delete_oldest_over_limit(self.policy.max_rows)
+        return deleted
+
+    def delete_in_id_batches(self, *conditions) -> int:
+        """ 按主键范围分批删除满足条件的行，每批一个短事务 """
+        db = LogSessionLocal()
+        try:
+            low, high = db.query(func.min(log_entries.c.id), func.max(log_entries.c.id)).filter(*conditions).one()
+        finally:
+            db.close()
+        if low is None:
+            return 0
+
+        deleted = 0
+        while low <= high and not self.stop_event.is_set():
+            upper = min(low + self.batch_size, high + 1)
+            db = LogSessionLocal()
+            try:
+                result = db.execute(
+                    delete(log_entries).where(log_entries.c.id >= low, log_entries.c.id < upper, *conditions)
+                )
+                db.commit()
+                deleted += result.rowcount or 0
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            low = upper
+            if self.batch_pause:
+                time.sleep(self.batch_pause)
+        return deleted
+
+    def delete_oldest_over_limit(self, max_rows: int) -> int:
+        """ 行数超过 max_rows 时，按主键顺序删除最旧的超出部分 """
+        db = LogSessionLocal()
+        try:
+            total = db.query(func.count(log_entries.c.id)).scalar() or 0
+            excess = total - max_rows
+            if excess <= 0:
+                return 0
+            threshold_id = db.query(log_entries.c.id).order_by(log_entries.c.id).offset(excess).limit(1).scalar()
+        finally:
+            db.close()
+        if threshold_id is None:
+            return 0
+        return self.delete_in_id_batches(log_entries.c.id < threshold_id)
+
+    def delete_all(self) -> int:
+        """ 分批清空全部日志 """
+        return self.delete_in_id_batches()
+
+
+class LogRetentionWorker:
+    """ 后台日志保留任务：按固定间隔执行一轮增量清理 """
+    def __init__(self, policy: LogRetentionPolicy, interval: float = 3600, batch_size: int = 1000, batch_pause: float = 0.05):
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self.purger = LogPurger(policy, batch_size=batch_size, batch_pause=batch_pause, stop_event=self._stop_event)
+        self._thread = None
+        self.last_run_at: Optional[datetime] = None
+        self.last_deleted = 0
+
+    def start(self):
+        """ 启动后台清理线程（重复调用无副作用） """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="LogRetentionWorker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        # 启动后稍等片刻再执行第一轮，避免与应用启动争用数据库
+        if self._stop_event.wait(min(60, self.interval)):
+            return
+        while not self._stop_event.is_set():
+            try:
+                if is_log_table_partitioned(log_engine):
+                    ensure_future_partitions(log_engine)
+                self.last_deleted = self.purger.run_once()
+                self.last_run_at = datetime.now()
+                if self.last_deleted:
+                    logger.info(f"日志保留任务：已清理 {self.last_deleted} 条过期日志。")
+            except Exception as e:
+                logger.error(f"日志保留任务执行失败: {e}")
+            self._stop_event.wait(self.interval)
+
+
+# --- 可选：MySQL 按时间分区 ---
+# 分区表要求分区键包含在所有唯一键中且不支持外键，因此启用分区时会把主键改为 (id, timestamp) 并移除 user_id 外键。
+
+def _partition_bounds(start: date, count: int, interval: str) -> List[date]:
+    """ 计算从 start 开始的 count 个分区上界（按天或按月） """
+    bounds = []
+    current = start
+    for _ in range(count):
+        if interval == "day":
+            current = current + timedelta(days=1)
+        else:
+            current = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+        bounds.append(current)
+    return bounds
+
+def _partition_name(bound: date) -> str:
+    return f"p{bound:%Y%m%d}"
+
+def is_log_table_partitioned(bind: Engine) -> bool:
+    """ 判断 log_entries 表是否已按时间分区（仅 MySQL 支持） """
+    if bind.dialect.name != "mysql":
+        return False
+    with bind.connect() as conn:
+        count = conn.execute(text(
+            "SELECT COUNT(*) FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'log_entries' AND PARTITION_NAME IS NOT NULL"
+        )).scalar()
+    return bool(count)
+
+def enable_log_partitioning(bind: Engine, interval: str = "month", ahead: int = 3):
+    """ 将 log_entries 表转换为按时间范围分区的表（耗时操作，请在维护窗口通过 clear_logs.py 执行） """
+    if bind.dialect.name != "mysql":
+        raise RuntimeError("只有 MySQL 支持日志表分区。")
+    if is_log_table_partitioned(bind):
+        return
+    with bind.begin() as conn:
+        oldest = conn.execute(text("SELECT MIN(timestamp) FROM log_entries")).scalar()
+        start = (oldest or datetime.now()).date()
+        today = date.today()
+        bounds = []
+        current = start
+        while not bounds or bounds[-1] <= today:
+            current = _partition_bounds(current, 1, interval)[0]
+            bounds.append(current)
+        bounds += _partition_bounds(bounds[-1], ahead, interval)
+        for fk in conn.execute(text(
+            "SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'log_entries' AND CONSTRAINT_TYPE = 'FOREIGN KEY'"
+        )).scalars():
+            conn.execute(text(f"ALTER TABLE log_entries DROP FOREIGN KEY {fk}"))
+        conn.execute(text("ALTER TABLE log_entries MODIFY timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"))
+        conn.execute(text("ALTER TABLE log_entries DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)"))
+        partitions = ", ".join(
+            f"PARTITION {_partition_name(bound)} VALUES LESS THAN (TO_DAYS('{bound.isoformat()}'))" for bound in bounds
+        )
+        conn.execute(text(
+            f"ALTER TABLE log_entries PARTITION BY RANGE (TO_DAYS(timestamp)) ({partitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        ))
+
+def _existing_partitions(conn) -> List[str]:
+    return list(conn.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'log_entries' AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    )).scalars())
+
+def ensure_future_partitions(bind: Engine, interval: Optional[str] = None, ahead: int = 3):
+    """ 从 pmax 中拆分出未来的分区，保证新日志不会落入 pmax """
+    interval = interval or settings.LOG_PARTITION_INTERVAL
+    with bind.begin() as conn:
+        names = [name for name in _existing_partitions(conn) if name != "pmax"]
+        if not names:
+            return
+        last_bound = datetime.strptime(names[-1][1:], "%Y%m%d").date()
+        target = _partition_bounds(date.today(), ahead, interval)[-1]
+        new_bounds = []
+        while last_bound < target:
+            last_bound = _partition_bounds(last_bound, 1, interval)[0]
+            new_bounds.append(last_bound)
+        if not new_bounds:
+            return
+        partitions = ", ".join(
+            f"PARTITION {_partition_name(bound)} VALUES LESS THAN (TO_DAYS('{bound.isoformat()}'))" for bound in new_bounds
+        )
+        conn.execute(text(
+            f"ALTER TABLE log_entries REORGANIZE PARTITION pmax INTO ({partitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        ))
+
+def drop_expired_partitions(bind: Engine, cutoff: date) -> int:
+    """ 整个删除上界不晚于 cutoff 的分区（分区内全部是过期数据），返回删除的行数 """
+    dropped_rows = 0
+    with bind.begin() as conn:
+        for name in _existing_partitions(conn):
+            if name == "pmax" or datetime.strptime(name[1:], "%Y%m%d").date() > cutoff:
+                continue
+            dropped_rows += conn.execute(text(
+                "SELECT TABLE_ROWS FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'log_entries' AND PARTITION_NAME = :name"
+            ), {"name": name}).scalar() or 0
+            conn.execute(text(f"ALTER TABLE log_entries DROP PARTITION {name}"))
+    return dropped_rows
+
+
+# 全局日志保留任务
+log_retention_worker = LogRetentionWorker(
+    LogRetentionPolicy.from_settings(),
+    interval=settings.LOG_PURGE_INTERVAL,
+    batch_size=settings.LOG_PURGE_BATCH_SIZE,
+    batch_pause=settings.LOG_PURGE_BATCH_PAUSE,
+)
@@ -0,0 +1,264 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from sqlalchemy import event
+
+from backend.database import async_engine, engine, get_pool_stats, log_engine
+
+# 默认的延迟分桶（秒），覆盖从毫秒级查询到数秒的慢请求
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape_label_value(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """ 只增不减的计数器，按标签值分别计数 """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """ 累积分桶直方图，按标签值分别统计观测值的分布、总和与次数 """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {} # 标签值 -> [各分桶计数..., 超出最大分桶的计数, 总和, 次数]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(upper_bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]}")
+        return lines
+
+
+# 采集函数返回 (指标名称, 类型, 说明, [(标签, 值), ...]) 的列表，在每次抓取时读取已有的 stats() 指标
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, object], float]]]]]
+
+
+class MetricsRegistry:
+    """ 最小化的 Prometheus 文本格式指标注册表：请求路径上只更新内存中的计数，格式化工作在抓取时进行 """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Collector] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """ 以 Prometheus 文本格式（0.0.4）输出全部指标 """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logging.getLogger(__name__).error(f"采集指标失败: {e}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "auto_study_http_request_duration_seconds", "HTTP 请求处理耗时（秒），按路由模板统计", ("method", "route", "status")
+)
+db_query_duration = registry.histogram(
+    "auto_study_db_query_duration_seconds", "数据库语句执行耗时（秒）", ("pool", "operation")
+)
+db_query_errors = registry.counter(
+    "auto_study_db_query_errors_total", "执行失败的数据库语句数", ("pool",)
+)
+ws_send_lag = registry.histogram(
+    "auto_study_ws_log_send_lag_seconds", "实时日志从进入连接缓冲区到发送完成的耗时（秒）"
+)
+
+
+def _statement_operation(statement: str) -> str:
+    """ 取 SQL 语句的第一个关键字作为操作类型，避免以完整语句作为标签 """
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement and statement.strip() else ""
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def instrument_engine(target, pool: str):
+    """ 通过引擎共用的语句计时统计每条语句的耗时（异步引擎传入其 sync_engine） """
+    def observe_statement(statement, seconds):
+        db_query_duration.observe(seconds, pool=pool, operation=_statement_operation(statement))
+
+    def handle_error(exception_context):
+        db_query_errors.inc(pool=pool)
+
+    target.statement_timer.add_observer(observe_statement)
+    event.listen(target, "handle_error", handle_error)
+
+
+class MetricsMiddleware:
+    """ ASGI 中间件：按路由模板（而不是实际路径，避免标签数量无限增长）记录 HTTP 请求耗时 """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"), # 静态文件和未匹配的路径归为一类
+                status=status_code,
+            )
+
+
+def _collect_runtime_metrics():
+    """ 读取连接池、日志写入器、实时日志、缓存和浏览器实例的现有统计指标 """
+    from backend.utils.auto_watcher_runner import _active_browser_pages
+    from backend.utils.log_bus import log_bus
+    from backend.utils.log_config import NonBlockingQueueHandler, db_log_writer
+    from backend.utils.log_hub import log_hub
+    from backend.utils.progress_tracker import progress_tracker
+    from backend.utils.user_cache import user_cache
+
+    pool_stats = get_pool_stats()
+    pool_fields = ( # (指标名称, stats() 中的字段, 类型, 说明)
+        ("auto_study_db_pool_checked_out", "checked_out", "gauge", "已取出的连接数"),
+        ("auto_study_db_pool_idle", "idle", "gauge", "连接池中的空闲连接数"),
+        ("auto_study_db_pool_overflow", "overflow", "gauge", "超出常驻连接数的连接数"),
+        ("auto_study_db_pool_checkouts_total", "checkouts", "counter", "从连接池取出连接的次数"),
+        ("auto_study_db_pool_connects_total", "connects", "counter", "新建的数据库连接数"),
+        ("auto_study_db_pool_invalidations_total", "invalidations", "counter", "失效丢弃的连接数"),
+        ("auto_study_db_pool_timeouts_total", "timeouts", "counter", "等待空闲连接超时的次数"),
+        ("auto_study_db_pool_wait_seconds_total", "wait_seconds_total", "counter", "从连接池取连接的累计耗时（秒）"),
+    )
+    for name, field, metric_type, documentation in pool_fields:
+        yield name, metric_type, documentation, [({"pool": pool}, stats[field]) for pool, stats in pool_stats.items() if field in stats]
+
+    writer_stats = db_log_writer.stats()
+    yield "auto_study_log_db_queue_depth", "gauge", "等待写入数据库的日志条数", [({}, writer_stats["queue_depth"])]
+    yield "auto_study_log_db_queue_capacity", "gauge", "数据库日志队列容量", [({}, writer_stats["queue_capacity"])]
+    for field, documentation in (("enqueued", "进入数据库日志队列的条数"), ("dropped", "数据库日志队列溢出丢弃的条数"),
+                                 ("written", "已写入数据库的日志条数"), ("failed", "写入失败的日志条数"), ("batches", "批量写入次数")):
+        yield f"auto_study_log_db_{field}_total", "counter", documentation, [({}, writer_stats[field])]
+    yield "auto_study_log_db_flush_seconds_total", "counter", "批量写入日志的累计耗时（秒）", [({}, writer_stats["flush_seconds_total"])]
+    yield "auto_study_log_db_last_flush_seconds", "gauge", "最近一次批量写入日志的耗时（秒）", [({}, writer_stats["last_flush_seconds"])]
+    yield "auto_study_log_db_max_flush_seconds", "gauge", "批量写入日志的最大耗时（秒）", [({}, writer_stats["max_flush_seconds"])]
+    queue_handlers = [handler for handler in logging.getLogger().handlers if isinstance(handler, NonBlockingQueueHandler)]
+    yield "auto_study_log_listener_queue_depth", "gauge", "等待日志监听线程处理的记录数", [({}, sum(handler.queue.qsize() for handler in queue_handlers))]
+    yield "auto_study_log_listener_dropped_total", "counter", "日志监听队列溢出丢弃的记录数", [({}, sum(handler.dropped for handler in queue_handlers))]
+
+    subscriptions = log_hub.stats()
+    yield "auto_study_ws_log_connections", "gauge", "实时日志 WebSocket 连接数", [({}, len(subscriptions))]
+    yield "auto_study_ws_log_buffered", "gauge", "各连接发送缓冲区中的日志条数之和", [({}, sum(item["buffered"] for item in subscriptions))]
+    yield "auto_study_ws_log_oldest_pending_seconds", "gauge", "各连接中最早一条未发送日志的等待时间（秒）", [({}, max((item["oldest_pending_seconds"] for item in subscriptions), default=0.0))]
+    yield "auto_study_ws_log_max_send_lag_seconds", "gauge", "当前各连接的最大发送延迟（秒）", [({}, max((item["max_send_lag_seconds"] for item in subscriptions), default=0.0))]
+    yield "auto_study_ws_log_last_seq", "gauge", "最近发布的日志序列号", [({}, log_hub.last_seq)]
+    bus_stats = log_bus.stats()
+    if "published" in bus_stats:
+        yield "auto_study_log_bus_published_total", "counter", "日志总线从日志表发布到本进程的条数", [({"backend": bus_stats["backend"]}, bus_stats["published"])]
+
+    cache_stats = user_cache.stats()
+    yield "auto_study_user_cache_size", "gauge", "用户缓存条数", [({}, cache_stats["size"])]
+    yield "auto_study_user_cache_requests_total", "counter", "用户缓存查询次数", [({"result": "hit"}, cache_stats["hits"]), ({"result": "miss"}, cache_stats["misses"])]
+
+    tracker_stats = progress_tracker.stats()
+    yield "auto_study_progress_pending", "gauge", "等待写入数据库的视频进度条数", [({}, tracker_stats["pending"])]
+    yield "auto_study_progress_flushes_total", "counter", "视频进度批量写入次数", [({}, tracker_stats["flushes"])]
+    yield "auto_study_progress_rows_written_total", "counter", "批量写入的视频进度行数", [({}, tracker_stats["rows_written"])]
+
+    yield "auto_study_browser_pages", "gauge", "活跃的自动化浏览器实例数", [({}, len(_active_browser_pages))]
+
+
+registry.register_collector(_collect_runtime_metrics)
+
+# 统计同步、异步（API 路由）和日志引擎上的数据库语句
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "api")
+instrument_engine(log_engine, "log")
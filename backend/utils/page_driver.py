@@ -0,0 +1,272 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from DrissionPage.errors import ElementNotFoundError, PageDisconnectedError
+
+
+class PageDriver(ABC):
+    """
+    自动化任务（run_auto_watcher / process_single_task_videos）使用的页面操作接口，缺少任一抽象方法的实现在创建时即报错。
+    ele / eles 返回的元素需提供 ele、text、attr、click、run_js 和 wait.displayed() / wait.click()，与 DrissionPage 的元素一致；
+    找不到页面元素时抛出 ElementNotFoundError，浏览器断开时抛出 PageDisconnectedError。
+    """
+
+    @property
+    @abstractmethod
+    def url(self) -> str:
+        ...
+
+    @property
+    @abstractmethod
+    def title(self) -> str:
+        ...
+
+    @abstractmethod
+    def ele(self, locator: str, timeout: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def eles(self, locator: str, timeout: Optional[float] = None) -> list:
+        ...
+
+    @abstractmethod
+    def run_js(self, script: str, *args):
+        ...
+
+    @abstractmethod
+    def get(self, url: str):
+        ...
+
+    @abstractmethod
+    def change_page(self, frame):
+        """ 切换到 iframe，之后的元素查找和脚本在 iframe 中执行，调用 get() 后回到顶层页面 """
+
+    @abstractmethod
+    def quit(self):
+        ...
+
+    async def sleep(self, seconds: float):
+        """ 等待页面加载或视频播放；假页面可以按比例缩短等待时间 """
+        await asyncio.sleep(seconds)
+
+
+class DrissionPageDriver(PageDriver):
+    """ 基于 DrissionPage ChromiumPage 的实现 """
+
+    def __init__(self, page):
+        self.page = page
+        self._target = page # 当前查找元素和执行脚本的页面或 iframe
+
+    @property
+    def url(self) -> str:
+        return self._target.url
+
+    @property
+    def title(self) -> str:
+        return self._target.title
+
+    def ele(self, locator: str, timeout: Optional[float] = None):
+        return self._target.ele(locator, timeout=timeout)
+
+    def eles(self, locator: str, timeout: Optional[float] = None) -> list:
+        return self._target.eles(locator, timeout=timeout)
+
+    def run_js(self, script: str, *args):
+        return self._target.run_js(script, *args)
+
+    def get(self, url: str):
+        self._target = self.page
+        return self.page.get(url)
+
+    def change_page(self, frame):
+        self._target = self.page.get_frame(frame)
+
+    def quit(self):
+        self.page.quit()
+
+
+def as_page_driver(page) -> PageDriver:
+    """ 已是 PageDriver 的直接返回，ChromiumPage 包装为 DrissionPageDriver """
+    if page is None or isinstance(page, PageDriver):
+        return page
+    return DrissionPageDriver(page)
+
+
+# --- 不启动浏览器的内存假页面，用于离线测量自动化任务的数据库写入、会话和日志量 ---
+
+class FakeVideo:
+    """ 假页面上的一个视频 """
+
+    def __init__(self, title: str, duration: float = 60.0, completed: bool = False):
+        self.title = title
+        self.duration = duration
+        self.completed = completed
+        self.current_time = 0.0
+
+
+class FakeTask:
+    """ 假页面任务列表中的一个任务，学习进度按已完成的视频数计算 """
+
+    def __init__(self, name: str, videos: List[FakeVideo], study_hours: str = "1学时"):
+        self.name = name
+        self.videos = videos
+        self.study_hours = study_hours
+
+    @property
+    def progress(self) -> str:
+        if not self.videos:
+            return "100.00%"
+        return f"{sum(video.completed for video in self.videos) * 100 / len(self.videos):.2f}%"
+
+
+class _FakeWait:
+    def __init__(self, element: "FakeElement"):
+        self.element = element
+
+    def displayed(self):
+        return True
+
+    def click(self):
+        self.element.click()
+
+
+class FakeElement:
+    """ 假页面元素：子元素按定位字符串中包含的关键字查找 """
+
+    def __init__(self, text: str = "", class_name: str = "", children: Optional[Dict[str, "FakeElement"]] = None, on_click: Optional[Callable] = None):
+        self.text = text
+        self.class_name = class_name
+        self.children = children or {}
+        self.on_click = on_click
+        self.wait = _FakeWait(self)
+
+    def ele(self, locator: str, timeout: Optional[float] = None) -> "FakeElement":
+        for key, child in self.children.items():
+            if key in locator:
+                return child
+        raise ElementNotFoundError(f"假页面元素中没有 {locator}")
+
+    def attr(self, name: str) -> Optional[str]:
+        return self.class_name if name == "class" else None
+
+    def click(self):
+        if self.on_click is not None:
+            self.on_click()
+
+    def run_js(self, script: str, *args):
+        return self.class_name if "className" in script else None
+
+
+class FakePageDriver(PageDriver):
+    """
+    内存中的假学习网站：提供与真实网站结构一致的任务列表页和视频列表页，点击“开始学习”进入任务的视频列表，
+    点击视频开始播放，每次通过 run_js 读取进度时播放位置前进 playback_step 秒（自动化任务每 2 秒读取一次）。
+    sleep() 的等待时间乘以 time_scale，默认为 0，整个自动化流程无需等待即可跑完。calls 统计各页面操作的调用次数。
+    """
+
+    def __init__(self, tasks: List[FakeTask], playback_step: float = 2.0, time_scale: float = 0.0, list_url: str = "https://fake.example.com/study"):
+        self.tasks = tasks
+        self.playback_step = playback_step
+        self.time_scale = time_scale
+        self.list_url = list_url
+        self.current_task: Optional[FakeTask] = None # None 表示位于任务列表页
+        self.playing: Optional[FakeVideo] = None
+        self.closed = False
+        self.calls = Counter()
+
+    @classmethod
+    def generate(cls, tasks: int = 5, videos: int = 4, duration: float = 60.0, completed_videos: int = 0, **kwargs) -> "FakePageDriver":
+        """ 生成 tasks 个任务、每个任务 videos 个时长为 duration 秒的视频，每个任务的前 completed_videos 个视频已完成 """
+        return cls([
+            FakeTask(f"模拟任务{t + 1}", [FakeVideo(f"模拟任务{t + 1} 第{v + 1}讲", duration, completed=v < completed_videos) for v in range(videos)], f"{t % 5 + 1}学时")
+            for t in range(tasks)
+        ], **kwargs)
+
+    def _check_open(self, operation: str):
+        if self.closed:
+            raise PageDisconnectedError("假页面已关闭")
+        self.calls[operation] += 1
+
+    @property
+    def url(self) -> str:
+        if self.current_task is None:
+            return self.list_url
+        return f"{self.list_url}/task/{self.tasks.index(self.current_task) + 1}"
+
+    @property
+    def title(self) -> str:
+        return self.current_task.name if self.current_task is not None else "学习任务"
+
+    def open_task(self, task: FakeTask):
+        """ 进入任务的视频列表页（点击“开始学习”） """
+        self.current_task = task
+        self.playing = None
+
+    def play(self, video: FakeVideo):
+        """ 从头播放视频（点击视频条目） """
+        self.playing = video
+        video.current_time = 0.0
+
+    def ele(self, locator: str, timeout: Optional[float] = None) -> FakeElement:
+        self._check_open("ele")
+        if "label" in locator: # 课程类型按钮，始终处于选中状态
+            return FakeElement(class_name="ant-radio-button-wrapper ant-radio-button-wrapper-checked")
+        if self.current_task is None:
+            if "objectList" in locator:
+                return FakeElement()
+        else:
+            if "videoList" in locator:
+                return FakeElement()
+            if "tag:video" in locator and self.playing is not None:
+                return FakeElement()
+        raise ElementNotFoundError(f"假页面中没有 {locator}")
+
+    def eles(self, locator: str, timeout: Optional[float] = None) -> List[FakeElement]:
+        self._check_open("eles")
+        if self.current_task is None and "objectList" in locator:
+            return [self._task_element(task) for task in self.tasks]
+        if self.current_task is not None and "childSection" in locator:
+            return [self._video_element(video) for video in self.current_task.videos]
+        return []
+
+    def _task_element(self, task: FakeTask) -> FakeElement:
+        title = task.name if task.progress != "0.00%" else f"{task.name} 未学习"
+        return FakeElement(children={
+            "center-title": FakeElement(title),
+            "center-center": FakeElement(task.progress),
+            "ul-center": FakeElement(task.study_hours),
+            "开始学习": FakeElement("开始学习", on_click=lambda: self.open_task(task)),
+        })
+
+    def _video_element(self, video: FakeVideo) -> FakeElement:
+        class_name = "childSection active" if video is self.playing else "childSection"
+        return FakeElement(class_name=class_name, on_click=lambda: self.play(video), children={
+            ".title": FakeElement(video.title),
+            ".isFinsh": FakeElement("已完成" if video.completed else "待学习"),
+        })
+
+    def run_js(self, script: str, *args):
+        self._check_open("run_js")
+        if "currentTime" not in script or self.playing is None:
+            return None
+        video = self.playing
+        video.current_time = min(video.duration, video.current_time + self.playback_step)
+        if video.current_time >= video.duration:
+            video.completed = True
+        return {"currentTime": video.current_time, "duration": video.duration}
+
+    def get(self, url: str):
+        self._check_open("get")
+        self.current_task = None # 自动化任务只会导航回任务列表页
+        self.playing = None
+
+    def change_page(self, frame):
+        self._check_open("change_page")
+
+    def quit(self):
+        self.closed = True
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds * self.time_scale)
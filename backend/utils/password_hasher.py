@@ -0,0 +1,42 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from backend import crud
+from backend.config import settings
+
+
+class PasswordHasher:
+    """
+    在有界线程池中执行 bcrypt 哈希和校验，避免每次 100~300ms 的计算阻塞事件循环。
+    bcrypt 计算期间会释放 GIL，因此线程池即可利用多核；线程数同时限制了并发哈希的数量，
+    登录突发时多出的请求在线程池队列中等待，而不会占满 CPU 拖慢其他请求和日志推送。
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hasher")
+        return self._executor
+
+    async def hash(self, password: str) -> str:
+        """ 异步计算密码哈希 """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), crud.get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """ 异步校验明文密码和哈希密码是否匹配 """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), crud.verify_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# 全局密码哈希线程池，线程数默认不超过 CPU 核数的一半，为事件循环和其他线程留出余量
+password_hasher = PasswordHasher(max_workers=settings.PASSWORD_HASH_WORKERS or max(1, (os.cpu_count() or 2) // 2))
@@ -0,0 +1,103 @@
+import logging
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import update
+
+from backend import models
+from backend.config import settings
+from backend.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressTracker:
+    """
+    视频播放进度的写合并缓存：播放监控只在内存中记录每个视频的最新进度，
+    后台线程按固定间隔把有变化的视频用一次批量 UPDATE 写入数据库；视频完成或停止时立即刷新，保证最终进度不丢失。
+    """
+    def __init__(self, flush_interval: float = 120.0):
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, dict] = {} # 视频ID -> 待写入的字段
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock() # 保证同一时间只有一个线程在写入，避免旧进度覆盖新进度
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.flushes = 0 # 执行过的批量写入次数
+        self.rows_written = 0 # 累计写入的视频行数
+        self.records = 0 # 累计记录的进度更新次数
+
+    def record(self, video_id: int, current_progress_seconds: Optional[int] = None, total_duration_seconds: Optional[int] = None, is_completed: Optional[bool] = None):
+        """ 记录视频的最新进度（只更新内存，不访问数据库）；与 crud.update_learning_video_progress 一样，0 秒保存为 None """
+        values = {}
+        if current_progress_seconds is not None:
+            values["current_progress_seconds"] = current_progress_seconds or None
+        if total_duration_seconds is not None:
+            values["total_duration_seconds"] = total_duration_seconds or None
+        if is_completed is not None:
+            values["is_completed"] = is_completed
+        if not values:
+            return
+        with self._lock:
+            self._pending.setdefault(video_id, {}).update(values)
+            self.records += 1
+
+    def flush(self) -> int:
+        """ 将所有待写入的进度按主键批量更新到数据库，返回写入的行数 """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            rows = [{"id": video_id, **values} for video_id, values in pending.items()]
+            db = SessionLocal()
+            try:
+                db.execute(update(models.LearningVideo), rows) # ORM 按主键批量更新，字段相同的行合并为一次 executemany
+                db.commit()
+            except Exception:
+                db.rollback()
+                with self._lock:
+                    # 写入失败时放回队列，保留期间记录的更新进度
+                    for video_id, values in pending.items():
+                        self._pending[video_id] = {**values, **self._pending.get(video_id, {})}
+                raise
+            finally:
+                db.close()
+            self.flushes += 1
+            self.rows_written += len(rows)
+            return len(rows)
+
+    def start(self):
+        """ 启动后台刷新线程（重复调用无副作用） """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ProgressTracker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """ 停止后台线程并写入剩余的进度 """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"写入视频播放进度失败: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {"pending": pending, "records": self.records, "flushes": self.flushes, "rows_written": self.rows_written}
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"写入视频播放进度失败: {e}")
+
+
+# 全局视频播放进度缓存
+progress_tracker = ProgressTracker(flush_interval=settings.PROGRESS_FLUSH_INTERVAL)
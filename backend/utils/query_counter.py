@@ -0,0 +1,103 @@
+import contextvars
+import logging
+import re
+from collections import Counter
+from typing import Optional
+
+from backend.config import settings
+from backend.database import async_engine, engine
+from backend.utils import log_events
+from backend.utils.log_events import log_event
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class RequestQueryStats:
+    """ 单个请求执行的数据库语句数、累计耗时和每种语句（参数化后的 SQL 文本）的执行次数 """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement] += 1
+
+    def most_repeated(self):
+        """ 返回 (执行次数最多的语句, 次数)，没有语句时返回 (None, 0) """
+        if not self.shapes:
+            return None, 0
+        return self.shapes.most_common(1)[0]
+
+
+# 当前请求的语句统计；sync 路由和 asyncio.to_thread 会复制上下文，线程池中执行的查询同样计入发起它的请求
+_current_stats: contextvars.ContextVar[Optional[RequestQueryStats]] = contextvars.ContextVar("request_query_stats", default=None)
+
+
+def current_query_stats() -> Optional[RequestQueryStats]:
+    return _current_stats.get()
+
+
+def _record_statement(statement: str, seconds: float):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+
+
+def instrument_engine(target):
+    """ 通过引擎共用的语句计时把语句计入当前请求（不在请求中执行的语句忽略） """
+    target.statement_timer.add_observer(_record_statement)
+
+
+class QueryCounterMiddleware:
+    """
+    ASGI 中间件：统计每个 HTTP 请求执行的数据库语句数和耗时，通过 X-DB-Query-Count / X-DB-Query-Time-Ms 响应头返回；
+    超过 QUERY_BUDGET 或同一语句重复执行达到 QUERY_REPEAT_THRESHOLD 次（典型的 N+1 查询）时记录警告。
+    """
+
+    def __init__(self, app, budget: int = 30, repeat_threshold: int = 10):
+        self.app = app
+        self.budget = budget
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestQueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode("latin-1")))
+                headers.append((b"x-db-query-time-ms", f"{stats.seconds * 1000:.2f}".encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current_stats.reset(token)
+            self._check(scope, stats)
+
+    def _check(self, scope, stats: RequestQueryStats):
+        route = getattr(scope.get("route"), "path", scope.get("path"))
+        method = scope.get("method")
+        if self.budget and stats.count > self.budget:
+            log_event(logger, logging.WARNING, log_events.DB_QUERY_BUDGET_EXCEEDED,
+                      method=method, route=route, count=stats.count, budget=self.budget, db_ms=round(stats.seconds * 1000, 2))
+        statement, repeats = stats.most_repeated()
+        if self.repeat_threshold and repeats >= self.repeat_threshold:
+            log_event(logger, logging.WARNING, log_events.DB_QUERY_REPEATED,
+                      method=method, route=route, repeats=repeats, statement=_WHITESPACE.sub(" ", statement).strip()[:300])
+
+
+if settings.QUERY_COUNTER_ENABLED:
+    # 日志引擎只由后台线程使用，不参与请求统计
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
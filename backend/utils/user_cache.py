@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from backend import models
+from backend.config import settings
+
+# 缓存的系统用户字段；命中时据此构造一个与任何会话都无关的 SystemUser 对象
+_USER_COLUMNS = tuple(column.name for column in models.SystemUser.__table__.columns)
+
+
+def subject_key(user_id: Optional[int] = None, username: Optional[str] = None, phone_number: Optional[str] = None) -> Optional[Tuple[str, object]]:
+    """ 根据 token 中的主体（用户ID、用户名或手机号，按此优先级）生成缓存键 """
+    if user_id is not None:
+        return ("id", user_id)
+    if username:
+        return ("username", username)
+    if phone_number:
+        return ("phone_number", phone_number)
+    return None
+
+
+class UserCache:
+    """ 已认证系统用户的 TTL + LRU 缓存，按 token 主体缓存用户字段，避免每个请求都查询 system_users 表 """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, object], Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock() # 失效操作可能来自自动化任务等其他线程
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, key: Tuple[str, object]) -> Optional[models.SystemUser]:
+        """ 返回缓存的用户（每次返回新的游离对象，调用方修改它不会影响缓存），未命中或已过期时返回 None """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            values = entry[1]
+        return models.SystemUser(**values)
+
+    def put(self, key: Tuple[str, object], user: models.SystemUser):
+        if not self.enabled:
+            return
+        values = {name: getattr(user, name) for name in _USER_COLUMNS}
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user: models.SystemUser):
+        """ 用户被审批、停用、吊销 token 或修改后调用，移除该用户按用户ID、用户名和手机号缓存的记录 """
+        with self._lock:
+            for key in (subject_key(user_id=user.id), subject_key(username=user.username), subject_key(phone_number=user.phone_number)):
+                if key is not None:
+                    self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# 全局用户缓存；多进程部署时各进程独立缓存，跨进程的变更最多延迟 USER_CACHE_TTL 秒生效
+user_cache = UserCache(max_size=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
@@ -0,0 +1,77 @@
+"""
+日志分发微基准：比较“每个订阅者各自 json.dumps”与“发布时只编码一次”两种方式下，
+单条日志事件的分发开销随订阅者数量的变化。
+
+用法：
+    python benchmarks/bench_log_fanout.py [--events 2000] [--subscribers 1,10,50,200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.utils.log_hub import LogHub, orjson
+
+
+def make_event(i: int) -> dict:
+    return {
+        "timestamp": "2025-01-01 12:00:00",
+        "level": "INFO",
+        "logger": "backend.utils.auto_watcher_runner",
+        "message": f"用户 1 (admin)：播放进度: 00:{i % 60:02} / 45:00",
+        "user_id": None,
+        "username": "admin",
+        "ip_address": "127.0.0.1",
+    }
+
+
+async def run_per_subscriber_encoding(events: int, subscribers: int) -> float:
+    """ 旧方式：每条事件对每个订阅者各编码一次 """
+    queues = [asyncio.Queue() for _ in range(subscribers)]
+    started = time.perf_counter()
+    for i in range(events):
+        event = make_event(i)
+        for q in queues:
+            q.put_nowait(json.dumps(event))
+    for q in queues:
+        while not q.empty():
+            q.get_nowait()
+    return time.perf_counter() - started
+
+
+async def run_hub(events: int, subscribers: int) -> float:
+    """ 新方式：LogHub 发布时编码一次，所有订阅者共享同一帧 """
+    hub = LogHub()
+    subscriptions = [hub.subscribe(max_buffer=events + 1) for _ in range(subscribers)]
+    started = time.perf_counter()
+    for i in range(events):
+        hub.publish(make_event(i))
+    await asyncio.sleep(0) # 让事件循环执行投递回调
+    for subscription in subscriptions:
+        for _ in range(events):
+            await subscription.get()
+            subscription.mark_sent()
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--subscribers", default="1,10,50,200")
+    args = parser.parse_args()
+
+    print(f"JSON 编码器: {'orjson' if orjson is not None else 'json (标准库)'}")
+    print(f"{'订阅者数':>8} {'逐个编码 µs/事件':>18} {'编码一次 µs/事件':>18} {'加速比':>8}")
+    for subscribers in [int(n) for n in args.subscribers.split(",")]:
+        baseline = await run_per_subscriber_encoding(args.events, subscribers)
+        shared = await run_hub(args.events, subscribers)
+        print(f"{subscribers:>8} {baseline / args.events * 1e6:>18.2f} {shared / args.events * 1e6:>18.2f} {baseline / shared:>7.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
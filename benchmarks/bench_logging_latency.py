@@ -0,0 +1,138 @@
+"""
+日志处理器链延迟基准：在自动化任务大量写日志的同时测量 HTTP 请求的处理延迟，
+比较“处理器直接挂在根日志记录器上（在事件循环线程上做文件/控制台 I/O）”与
+“根日志记录器只挂 NonBlockingQueueHandler，处理器在 QueueListener 线程上执行”两种方式。
+
+用法：
+    python benchmarks/bench_logging_latency.py [--requests 500] [--workers 8] [--burst 20]
+
+未设置 DATABASE_URL 时使用临时 SQLite 数据库；控制台输出写入 os.devnull，真实终端的 I/O 开销只会更大。
+"""
+import argparse
+import asyncio
+import logging
+import os
+import queue
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORK_DIR = tempfile.mkdtemp(prefix="bench_logging_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}")
+os.chdir(WORK_DIR) # log_config 会在当前目录下创建 logs/，避免写入项目目录
+
+import httpx
+from fastapi import FastAPI
+
+from backend.database import engine
+from backend.models import Base
+from backend.utils import log_events
+from backend.utils.auto_watcher_runner import console_log
+from backend.utils.log_config import DbLogHandler, NonBlockingQueueHandler, UserPrefixFormatter, db_log_writer
+from backend.utils.log_events import log_event
+
+app = FastAPI()
+
+@app.get("/ping")
+async def ping():
+    return {"ok": True}
+
+
+def build_handlers(devnull):
+    formatter = UserPrefixFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_handler = RotatingFileHandler(os.path.join(WORK_DIR, "bench.log"), maxBytes=10*1024*1024, backupCount=1, encoding='utf-8')
+    console_handler = logging.StreamHandler(devnull)
+    db_handler = DbLogHandler()
+    for handler in (file_handler, console_handler, db_handler):
+        handler.setFormatter(formatter)
+        handler.setLevel(logging.INFO)
+    return [file_handler, console_handler, db_handler]
+
+
+async def automation_worker(worker_id: int, burst: int, stop: asyncio.Event):
+    """ 模拟自动化任务：每轮连续写若干条日志后让出事件循环 """
+    task_logger = logging.getLogger("backend.utils.auto_watcher_runner")
+    tick = 0
+    while not stop.is_set():
+        for _ in range(burst):
+            tick += 1
+            log_event(task_logger, logging.INFO, log_events.VIDEO_PROGRESS, worker_id, f"user{worker_id}", "127.0.0.1",
+                      task_id=worker_id, video_id=tick, current=f"00:{tick % 60:02}", duration="45:00")
+            console_log(f"页面状态检查 #{tick}", worker_id, f"user{worker_id}", "127.0.0.1")
+        await asyncio.sleep(0)
+
+
+async def measure(mode: str, args):
+    """ 以指定方式配置根日志记录器，在后台日志压力下逐个发送请求，返回 (延迟列表（秒）, 队列满时丢弃的日志条数) """
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    handlers = build_handlers(devnull)
+    listener = None
+    queue_handler = None
+    if mode == "direct":
+        for handler in handlers:
+            root_logger.addHandler(handler)
+    else:
+        log_queue = queue.Queue(maxsize=10000)
+        queue_handler = NonBlockingQueueHandler(log_queue)
+        root_logger.addHandler(queue_handler)
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+    db_log_writer.start()
+
+    stop = asyncio.Event()
+    workers = [asyncio.create_task(automation_worker(i + 1, args.burst, stop)) for i in range(args.workers)]
+    latencies = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get("/ping") # 预热
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                response = await client.get("/ping")
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+    finally:
+        stop.set()
+        await asyncio.gather(*workers)
+        if listener is not None:
+            listener.stop()
+        for handler in list(root_logger.handlers):
+            root_logger.removeHandler(handler)
+        for handler in handlers:
+            handler.close()
+        db_log_writer.stop()
+        devnull.close()
+    return latencies, queue_handler.dropped if queue_handler is not None else 0
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="每种方式发送的请求数")
+    parser.add_argument("--workers", type=int, default=8, help="同时写日志的模拟自动化任务数")
+    parser.add_argument("--burst", type=int, default=20, help="每个任务每轮连续写入的日志条数")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    print(f"{'方式':<8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'平均 ms':>9} {'丢弃日志':>8}")
+    for mode in ("direct", "queued"):
+        latencies, dropped = await measure(mode, args)
+        print(
+            f"{mode:<8} {percentile(latencies, 50) * 1e3:>9.2f} {percentile(latencies, 95) * 1e3:>9.2f} "
+            f"{percentile(latencies, 99) * 1e3:>9.2f} {max(latencies) * 1e3:>9.2f} {statistics.mean(latencies) * 1e3:>9.2f} {dropped:>8}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
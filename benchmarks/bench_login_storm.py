@@ -0,0 +1,108 @@
+"""
+登录风暴基准：大量并发登录（bcrypt 校验）的同时测量其他请求的处理延迟，
+比较“在 async 路由中直接调用 bcrypt（阻塞事件循环）”与“在 PasswordHasher 有界线程池中校验”两种方式。
+
+用法：
+    python benchmarks/bench_login_storm.py [--logins 64] [--concurrency 32] [--rounds 12] [--workers 0]
+
+--rounds 为 bcrypt 成本因子，--workers 为线程池线程数（0 表示使用 PASSWORD_HASH_WORKERS 的默认值）。
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://") # 基准不访问数据库，避免导入 backend 时依赖 MySQL 驱动
+
+import bcrypt
+import httpx
+from fastapi import FastAPI
+
+from backend import crud
+from backend.utils.password_hasher import PasswordHasher, password_hasher
+
+app = FastAPI()
+PASSWORD = "Bench@12345"
+HASHED_PASSWORD = None # 在 main() 中按 --rounds 生成
+hasher = password_hasher
+
+
+@app.post("/login/inline")
+async def login_inline():
+    return {"ok": crud.verify_password(PASSWORD, HASHED_PASSWORD)}
+
+
+@app.post("/login/pooled")
+async def login_pooled():
+    return {"ok": await hasher.verify(PASSWORD, HASHED_PASSWORD)}
+
+
+@app.get("/ping")
+async def ping():
+    return {"ok": True}
+
+
+async def measure(client: httpx.AsyncClient, mode: str, args):
+    """
+    并发发送登录请求，同时每 5ms 计划一次 /ping，返回 (ping 延迟列表（秒）, 登录总耗时（秒）)。
+    ping 延迟从计划发送时刻算起，事件循环被阻塞导致的发送推迟也计入延迟。
+    """
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def login():
+        async with semaphore:
+            response = await client.post(f"/login/{mode}")
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    storm = asyncio.ensure_future(asyncio.gather(*(login() for _ in range(args.logins))))
+    latencies = []
+    interval = 0.005
+    planned = time.perf_counter()
+    await asyncio.sleep(0) # 让登录请求先开始执行
+    while not storm.done():
+        (await client.get("/ping")).raise_for_status()
+        latencies.append(time.perf_counter() - planned)
+        planned = max(planned + interval, time.perf_counter())
+        await asyncio.sleep(max(0.0, planned - time.perf_counter()))
+    await storm
+    return latencies, time.perf_counter() - started
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def main():
+    global HASHED_PASSWORD, hasher
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64, help="每种方式发送的登录请求数")
+    parser.add_argument("--concurrency", type=int, default=32, help="同时进行的登录请求数")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt 成本因子")
+    parser.add_argument("--workers", type=int, default=0, help="密码哈希线程池的线程数，0 表示默认值")
+    args = parser.parse_args()
+
+    HASHED_PASSWORD = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=args.rounds)).decode("utf-8")
+    if args.workers:
+        hasher = PasswordHasher(max_workers=args.workers)
+    print(f"bcrypt 成本因子 {args.rounds}，线程池线程数 {hasher.max_workers}，登录请求 {args.logins}，并发 {args.concurrency}")
+    print(f"{'方式':<8} {'ping p50 ms':>12} {'ping p99 ms':>12} {'ping max ms':>12} {'ping 平均 ms':>12} {'ping 次数':>9} {'登录/秒':>9}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/ping") # 预热
+        for mode in ("inline", "pooled"):
+            latencies, elapsed = await measure(client, mode, args)
+            print(
+                f"{mode:<8} {percentile(latencies, 50) * 1e3:>12.2f} {percentile(latencies, 99) * 1e3:>12.2f} "
+                f"{max(latencies) * 1e3:>12.2f} {statistics.mean(latencies) * 1e3:>12.2f} {len(latencies):>9} {args.logins / elapsed:>9.1f}"
+            )
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,182 @@
+"""
+自动化任务离线基准：用 FakePageDriver（内存中的假学习网站）代替浏览器运行完整的 run_auto_watcher，
+统计整个学习流程以及每次页面扫描（读取一次任务列表或视频列表）的数据库语句数、连接签出次数和日志条数。
+不需要 Chromium 和真实网站，可在 CI 中运行；指定 --max-queries-per-scan / --max-logs-per-scan 时超出即以非零状态退出，用于回归检查。
+
+用法：
+    python benchmarks/bench_runner.py [--tasks 5] [--videos 4] [--duration 60] [--completed-videos 1]
+                                      [--max-queries-per-scan 0] [--max-logs-per-scan 0] [--output 结果.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+# 将项目根目录添加到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ORIGINAL_CWD = os.getcwd() # --output 的相对路径相对于启动时的目录
+WORK_DIR = tempfile.mkdtemp(prefix="bench_runner_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}")
+os.chdir(WORK_DIR) # logs/ 写入临时目录，不污染项目目录
+
+from sqlalchemy import event
+
+from backend import crud, models, schemas
+from backend.database import SessionLocal, engine
+from backend.models import Base
+from backend.utils import auto_watcher_runner
+from backend.utils.page_driver import FakePageDriver
+from backend.utils.progress_tracker import progress_tracker
+
+
+class CountingHandler(logging.Handler):
+    """ 按日志记录器、级别和事件代码统计日志条数，不做任何输出 """
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.by_logger = Counter()
+        self.by_level = Counter()
+        self.by_event = Counter()
+
+    def emit(self, record):
+        self.by_logger[record.name] += 1
+        self.by_level[record.levelname] += 1
+        self.by_event[getattr(record, "event_code", None) or "(自由文本)"] += 1
+
+
+class QueryCounter:
+    """ 统计引擎执行的语句（按 SELECT/INSERT/UPDATE/DELETE 分类）、提交次数和连接签出次数 """
+
+    def __init__(self, target):
+        self.statements = Counter()
+        self.checkouts = 0
+        self.commits = 0
+        event.listen(target, "before_cursor_execute", self._on_execute)
+        event.listen(target, "commit", self._on_commit)
+        event.listen(target.pool, "checkout", self._on_checkout)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+    def _on_commit(self, conn):
+        self.commits += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.statements.values())
+
+
+def seed() -> tuple:
+    """ 创建表、系统用户和一条学习网站凭据，返回 (用户ID, 凭据ID) """
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = crud.create_system_user(db, schemas.SystemUserCreate(
+            username="bench", phone_number="13800000000", password="Bench@123", passwordConfirm="Bench@123", is_active=True, is_approved=True,
+        ))
+        credential = crud.create_learning_website_credential(db, user.id, schemas.LearningWebsiteCredentialCreate(website_url="https://fake.example.com/study"))
+        return user.id, credential.id
+    finally:
+        db.close()
+
+
+def completion_counts(credential_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        tasks = db.query(models.LearningTask).filter(models.LearningTask.credential_id == credential_id).all()
+        videos = [video for task in tasks for video in task.videos]
+        return {
+            "tasks": len(tasks),
+            "tasks_completed": sum(task.is_completed for task in tasks),
+            "videos": len(videos),
+            "videos_completed": sum(bool(video.is_completed) for video in videos),
+        }
+    finally:
+        db.close()
+
+
+def per_scan(value: int, scans: int) -> float:
+    return round(value / scans, 2) if scans else 0.0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=5, help="假网站的任务数")
+    parser.add_argument("--videos", type=int, default=4, help="每个任务的视频数")
+    parser.add_argument("--duration", type=float, default=60.0, help="每个视频的时长（秒）")
+    parser.add_argument("--completed-videos", type=int, default=1, help="每个任务中页面上已显示完成的视频数")
+    parser.add_argument("--max-queries-per-scan", type=float, default=0, help="每次扫描的数据库语句数上限，0 表示不检查")
+    parser.add_argument("--max-logs-per-scan", type=float, default=0, help="每次扫描的日志条数上限，0 表示不检查")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    user_id, credential_id = seed()
+    page = FakePageDriver.generate(args.tasks, args.videos, args.duration, args.completed_videos)
+    log_counter = CountingHandler()
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(log_counter)
+    queries = QueryCounter(engine)
+
+    started = time.perf_counter()
+    try:
+        await auto_watcher_runner.run_auto_watcher(user_id, page, credential_id, "127.0.0.1", "bench")
+    finally:
+        root_logger.removeHandler(log_counter)
+    elapsed = time.perf_counter() - started
+
+    scans = page.calls["eles"] # 每次读取任务列表或视频列表各调用一次 eles
+    logs = sum(log_counter.by_logger.values())
+    result = {
+        "seconds": round(elapsed, 3),
+        "scans": scans,
+        "page_calls": dict(page.calls),
+        "statements": {"total": queries.total, **queries.statements},
+        "commits": queries.commits,
+        "connection_checkouts": queries.checkouts,
+        "logs": {"total": logs, "by_level": dict(log_counter.by_level), "by_event": dict(log_counter.by_event.most_common())},
+        "progress_tracker": progress_tracker.stats(),
+        "per_scan": {
+            "statements": per_scan(queries.total, scans),
+            "commits": per_scan(queries.commits, scans),
+            "connection_checkouts": per_scan(queries.checkouts, scans),
+            "logs": per_scan(logs, scans),
+        },
+    }
+    result["completion"] = completion_counts(credential_id) # 在统计之后查询，不计入自动化任务的语句数
+
+    print(f"{'指标':<16} {'合计':>8} {'每次扫描':>10}")
+    print(f"{'页面扫描':<16} {scans:>8}")
+    for name, total in (("数据库语句", result["statements"]["total"]), ("提交", result["commits"]), ("连接签出", result["connection_checkouts"]), ("日志", logs)):
+        print(f"{name:<16} {total:>8} {per_scan(total, scans):>10.2f}")
+    print(f"耗时 {elapsed:.2f} 秒；完成情况: {result['completion']}")
+
+    if args.output:
+        output = os.path.join(ORIGINAL_CWD, args.output)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "result": result}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {output}")
+
+    failures = []
+    if args.max_queries_per_scan and result["per_scan"]["statements"] > args.max_queries_per_scan:
+        failures.append(f"每次扫描的数据库语句数 {result['per_scan']['statements']} 超过上限 {args.max_queries_per_scan}")
+    if args.max_logs_per_scan and result["per_scan"]["logs"] > args.max_logs_per_scan:
+        failures.append(f"每次扫描的日志条数 {result['per_scan']['logs']} 超过上限 {args.max_logs_per_scan}")
+    completion = result["completion"]
+    if completion["tasks_completed"] != args.tasks or completion["videos_completed"] != args.tasks * args.videos:
+        failures.append(f"自动化流程未学完所有任务和视频: {completion}")
+    for failure in failures:
+        print(f"失败: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
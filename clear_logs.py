@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 
@@ -5,23 +6,54 @@ import sys
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, script_dir)
 
-from backend.database import SessionLocal, engine, Base
-from backend.models import LogEntry
+from backend.config import settings
+from backend.database import engine
+from backend.utils.log_retention import (
+    LogPurger,
+    LogRetentionPolicy,
+    enable_log_partitioning,
+    ensure_future_partitions,
+    is_log_table_partitioned,
+)
+
+def main():
+    """ 按保留策略增量清理日志表；每批只删除一小段主键范围并立即提交，不会长时间阻塞日志写入 """
+    parser = argparse.ArgumentParser(description="清理 log_entries 表中的日志。")
+    parser.add_argument("--all", action="store_true", help="分批删除全部日志")
+    parser.add_argument("--days", type=int, help="覆盖 LOG_RETENTION_DAYS，删除早于该天数的日志")
+    parser.add_argument("--max-rows", type=int, help="覆盖 LOG_RETENTION_MAX_ROWS，只保留最新的若干行")
+    parser.add_argument("--batch-size", type=int, default=settings.LOG_PURGE_BATCH_SIZE, help="每批删除的主键范围大小")
+    parser.add_argument("--enable-partitioning", action="store_true", help="将日志表转换为按时间分区的表（仅 MySQL，耗时操作）")
+    args = parser.parse_args()
+
+    if args.enable_partitioning:
+        print("Converting log_entries to a time-partitioned table...")
+        enable_log_partitioning(engine, interval=settings.LOG_PARTITION_INTERVAL)
+        print("log_entries is now partitioned.")
+        return
+
+    policy = LogRetentionPolicy.from_settings()
+    if args.days is not None:
+        policy.max_age_days = args.days
+    if args.max_rows is not None:
+        policy.max_rows = args.max_rows
+    purger = LogPurger(policy, batch_size=args.batch_size)
 
-def clear_log_entries():
-    """Clears all entries from the LogEntry table."""
-    print("Attempting to clear LogEntry table...")
-    db = SessionLocal()
     try:
-        # 删除所有记录
-        num_deleted = db.query(LogEntry).delete()
-        db.commit()
+        if args.all:
+            print("Deleting all log entries in batches...")
+            num_deleted = purger.delete_all()
+        else:
+            print("Purging log entries according to the retention policy...")
+            if is_log_table_partitioned(engine):
+                ensure_future_partitions(engine)
+            num_deleted = purger.run_once()
         print(f"Successfully deleted {num_deleted} log entries from the database.")
+    except KeyboardInterrupt:
+        purger.stop_event.set() # 已提交的批次保留，下次运行会从剩余部分继续
+        print("Interrupted; already deleted batches have been committed.")
     except Exception as e:
-        db.rollback()
         print(f"Error clearing log entries: {e}")
-    finally:
-        db.close()
 
 if __name__ == "__main__":
-    clear_log_entries()
\ No newline at end of file
+    main()
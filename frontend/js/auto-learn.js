@@ -5,6 +5,9 @@ const statusMessageDiv = document.getElementById('statusMessage');
 
 let authToken = null;
 let logWebSocket = null;
+let lastLogSeq = null; // 已收到的最后一条日志序列号，断线重连时用于补发错过的日志
+const LOG_RECONNECT_DELAY_MS = 3000; // 断线后自动重连的等待时间
+let eventTemplates = {}; // 事件代码到消息模板的映射，由服务端提供（见后端 log_events.py）
 
 // 辅助函数：显示状态消息
 function showStatusMessage(message, isError = false) {
@@ -43,6 +46,40 @@ async function authenticatedFetch(url, options) {
     return response;
 }
 
+// 加载结构化日志的消息模板
+async function loadEventTemplates() {
+    try {
+        const response = await authenticatedFetch('/api/logs/event-templates', { method: 'GET' });
+        if (response.ok) {
+            eventTemplates = await response.json();
+        }
+    } catch (error) {
+        console.error('加载日志消息模板失败:', error);
+    }
+}
+
+// 辅助函数：在显示时按事件代码的模板格式化消息，没有事件代码的日志直接使用消息文本
+function formatLogMessage(logData) {
+    const template = logData.event_code ? eventTemplates[logData.event_code] : undefined;
+    let message = logData.message || '';
+    if (template !== undefined) {
+        const params = logData.params || {};
+        message = template.replace(/\{(\w+)\}/g, (match, name) => {
+            if (name in params) return params[name];
+            return logData[name] !== undefined && logData[name] !== null ? logData[name] : match;
+        });
+    }
+    // 用户前缀不再保存在消息中，在此根据用户字段添加
+    if (logData.user_id !== null && logData.user_id !== undefined && logData.username) {
+        return `用户 ${logData.user_id} (${logData.username})：${message}`;
+    } else if (logData.user_id !== null && logData.user_id !== undefined) {
+        return `用户 ${logData.user_id}：${message}`;
+    } else if (logData.username) {
+        return `用户 (${logData.username})：${message}`;
+    }
+    return message;
+}
+
 // 连接日志 WebSocket
 function connectLogWebSocket() {
     if (logWebSocket && logWebSocket.readyState === WebSocket.OPEN) {
@@ -56,39 +93,36 @@ function connectLogWebSocket() {
         window.location.href = '/login';
         return;
     }
-    logWebSocket = new WebSocket(`${wsProtocol}//${window.location.host}/api/tasks/ws/logs?token=${authToken}`);
+    // 重连时携带已收到的最后一个序列号，由服务端补发断线期间的日志
+    const sinceParam = lastLogSeq !== null ? `&since=${lastLogSeq}` : '';
+    logWebSocket = new WebSocket(`${wsProtocol}//${window.location.host}/api/tasks/ws/logs?token=${authToken}${sinceParam}`);
 
     logWebSocket.onopen = (event) => {
         console.log('日志 WebSocket 已连接。');
-        logDisplay.textContent = ''; // 清空所有旧日志
+        if (lastLogSeq === null) {
+            logDisplay.textContent = ''; // 首次连接时清空所有旧日志，重连时保留并续接
+        }
         // logDisplay.textContent = `WebSocket 连接成功，等待日志...\n`; // 移除前端的欢迎消息
     };
 
     logWebSocket.onmessage = (event) => {
         try {
             const logData = JSON.parse(event.data);
+            if (typeof logData.seq === 'number') {
+                lastLogSeq = logData.seq; // 记录续传游标
+            }
 
-            // 定义要忽略的日志消息子字符串 (与后端log_config.py中的IGNORED_MESSAGES_SUBSTRINGS保持一致)
-            const IGNORED_MESSAGES_SUBSTRINGS = [
-                "系统日志 WebSocket", // 匹配连接和断开连接
-                "日志广播任务已启动",
-                "WebSocket连接已清理",
-                "Application startup: Initializing database",
-                "管理员用户 'admin' 已存在。",
-                "INFO:     connection open", // Uvicorn连接日志
-                "INFO:     connection closed" // Uvicorn连接日志
-            ];
-
-            // 过滤日志：如果消息包含任何一个忽略的子字符串，则跳过
-            for (const substring of IGNORED_MESSAGES_SUBSTRINGS) {
-                if (logData.message.includes(substring)) {
-                    return; // 忽略此日志
-                }
+            // 服务端因本连接消费过慢而合并的日志缺口通知
+            if (logData.type === 'gap') {
+                logDisplay.textContent += `……（网络较慢，已省略 ${logData.dropped} 条日志）\n`;
+                logDisplay.scrollTop = logDisplay.scrollHeight;
+                return;
             }
 
-            let logEntry = logData.message; // Extract the message field
+            // 需要忽略的日志已由服务端按事件代码过滤，这里无需再逐条匹配子字符串
+            let logEntry = formatLogMessage(logData);
             
-            // 移除时间戳、模块名和日志级别前缀 (例如: "2025-08-21 19:33:27,308 - backend.main - INFO - ")
+            // 移除旧版本日志中保存的时间戳、模块名和日志级别前缀 (例如: "2025-08-21 19:33:27,308 - backend.main - INFO - ")
             logEntry = logEntry.replace(/^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - [a-zA-Z0-9\._]+ - (INFO|WARNING|ERROR|DEBUG|CRITICAL) - /, '');
             
             // 移除 AutoWatcherRunner 特有前缀 (如果仍然存在)
@@ -118,6 +152,9 @@ function connectLogWebSocket() {
         console.log('日志 WebSocket 已关闭:', event);
         showStatusMessage('WebSocket 连接已关闭。' + event.reason, true);
         // logDisplay.textContent += 'WebSocket 连接已关闭。\n';
+        if (event.code !== 1008) { // 1008 表示认证失败，不再重连
+            setTimeout(connectLogWebSocket, LOG_RECONNECT_DELAY_MS); // 自动重连并补发断线期间的日志
+        }
     };
 }
 
@@ -144,12 +181,13 @@ stopLearningBtn.addEventListener('click', async () => {
 });
 
 // 页面加载时执行
-document.addEventListener('DOMContentLoaded', () => {
+document.addEventListener('DOMContentLoaded', async () => {
     authToken = localStorage.getItem('authToken');
     if (!authToken) {
         window.location.href = '/login';
         return;
     }
+    await loadEventTemplates(); // 先加载消息模板，再接收结构化日志
     // 连接日志 WebSocket
     connectLogWebSocket();
 });
\ No newline at end of file
@@ -73,40 +73,16 @@ async function fetchAndDisplayCredentials() {
                     `<button class="btn-view-password small-action-btn" data-id="${credential.id}">查看密码</button>` :
                     `未设置`;
 
-                // 计算任务进度
-                let totalTasks = 0;
-                let completedTasks = 0;
+                // 任务进度由后端汇总（credential.progress），不再下载全部任务和视频
+                const progress = credential.progress;
                 let taskProgressContent = '无任务';
 
-                if (credential.tasks && credential.tasks.length > 0) {
-                    totalTasks = credential.tasks.length;
-                    completedTasks = credential.tasks.filter(task => task.is_completed).length;
-                    
-                    // 计算总学时
-                    let totalStudyHours = 0;
-                    credential.tasks.forEach(task => {
-                        if (task.study_hours) {
-                            // 假设 study_hours 是 "X小时" 或 "X"
-                            const hours = parseInt(task.study_hours.replace('小时', ''));
-                            if (!isNaN(hours)) {
-                                totalStudyHours += hours;
-                            }
-                        }
-                    });
-
+                if (progress && progress.task_count > 0) {
+                    const completedPercent = (progress.completed_task_count / progress.task_count * 100).toFixed(2);
                     // 调整显示顺序：学时在前，进度在后
-                    taskProgressContent = `学时: ${totalStudyHours}小时 - 进度: ${completedTasks} / ${totalTasks} (${(completedTasks / totalTasks * 100).toFixed(2)}%)`;
-                    
-                    // 可以考虑添加一个 tooltip 或展开/折叠功能来显示详细任务列表
-                    const detailedTasks = credential.tasks.map(task => 
-                        `<li>${task.task_name} - ${task.current_progress} (${task.study_hours || '0小时'})</li>` // 详细任务也显示学时
-                    ).join('');
                     taskProgressContent = `
                         <div title="${credential.website_name || 'N/A'}">
-                            <span class="task-summary">${taskProgressContent}</span>
-                            <div class="task-details" style="display:none;">
-                                <ul>${detailedTasks}</ul>
-                            </div>
+                            <span class="task-summary">学时: ${progress.total_hours}小时 - 进度: ${progress.completed_task_count} / ${progress.task_count} (${completedPercent}%)</span>
                         </div>
                     `;
                 }
@@ -21,8 +21,21 @@ document.addEventListener('DOMContentLoaded', () => {
     // 并且 WebSocket 路径是 /api/tasks/ws/logs
     const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
     const wsUrl = `${wsProtocol}//${window.location.host}/api/tasks/ws/logs?token=${authToken}`;
-
-    const socket = new WebSocket(wsUrl);
+    let lastLogSeq = null; // 已收到的最后一条日志序列号，断线重连时用于补发错过的日志
+    let eventTemplates = {}; // 事件代码到消息模板的映射，由服务端提供（见后端 log_events.py）
+
+    // 辅助函数：在显示时按事件代码的模板格式化消息，没有事件代码的日志直接使用消息文本
+    function formatLogMessage(logData) {
+        const template = logData.event_code ? eventTemplates[logData.event_code] : undefined;
+        if (template === undefined) {
+            return logData.message || '';
+        }
+        const params = logData.params || {};
+        return template.replace(/\{(\w+)\}/g, (match, name) => {
+            if (name in params) return params[name];
+            return logData[name] !== undefined && logData[name] !== null ? logData[name] : match;
+        });
+    }
 
     // 辅助函数：将日志数据添加到表格
     function addLogToTable(logData) {
@@ -39,7 +52,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         // 消息
         const messageCell = row.insertCell();
-        let displayMessage = logData.message;
+        let displayMessage = formatLogMessage(logData);
         // 移除可能的特定前缀，如果存在的话
         displayMessage = displayMessage.replace(/^\[AutoWatcherRunner\](\[用户 \d+\])?\s*/, '').trim();
         messageCell.textContent = displayMessage;
@@ -62,48 +75,74 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    socket.onopen = (event) => {
-        console.log('WebSocket连接已建立', event);
-    };
-
-    socket.onmessage = (event) => {
-        try {
-            const logData = JSON.parse(event.data); // 解析JSON数据
-            addLogToTable(logData);
-        } catch (e) {
-            // 检查是否是Uvicorn的内部连接日志，如果是则忽略
-            const rawMessage = event.data.trim();
-            if (rawMessage.includes("INFO:     connection open") || rawMessage.includes("INFO:     connection closed")) {
-                console.log("忽略Uvicorn连接日志:", rawMessage);
-                return; // 忽略这些日志
+    function connect() {
+        // 重连时携带已收到的最后一个序列号，由服务端补发断线期间的日志
+        const socket = new WebSocket(lastLogSeq !== null ? `${wsUrl}&since=${lastLogSeq}` : wsUrl);
+
+        socket.onopen = (event) => {
+            console.log('WebSocket连接已建立', event);
+        };
+
+        socket.onmessage = (event) => {
+            try {
+                const logData = JSON.parse(event.data); // 解析JSON数据
+                if (typeof logData.seq === 'number') {
+                    lastLogSeq = logData.seq; // 记录续传游标
+                }
+                if (logData.type === 'gap') {
+                    // 服务端因本连接消费过慢而合并的日志缺口通知
+                    const row = logTableBody.insertRow();
+                    const cell = row.insertCell();
+                    cell.colSpan = 6;
+                    cell.textContent = `……（网络较慢，已省略 ${logData.dropped} 条日志）`;
+                    cell.style.color = 'gray';
+                    return;
+                }
+                addLogToTable(logData);
+            } catch (e) {
+                // 检查是否是Uvicorn的内部连接日志，如果是则忽略
+                const rawMessage = event.data.trim();
+                if (rawMessage.includes("INFO:     connection open") || rawMessage.includes("INFO:     connection closed")) {
+                    console.log("忽略Uvicorn连接日志:", rawMessage);
+                    return; // 忽略这些日志
+                }
+                console.error('解析日志数据失败:', e, event.data);
+                // 如果解析失败，可能是纯文本日志，直接显示为一条完整消息
+                const row = logTableBody.insertRow();
+                const cell = row.insertCell();
+                cell.colSpan = 6; 
+                cell.textContent = `[非JSON日志] ${event.data}`;
+                cell.style.color = 'orange';
             }
-            console.error('解析日志数据失败:', e, event.data);
-            // 如果解析失败，可能是纯文本日志，直接显示为一条完整消息
-            const row = logTableBody.insertRow();
-            const cell = row.insertCell();
-            cell.colSpan = 6; 
-            cell.textContent = `[非JSON日志] ${event.data}`;
-            cell.style.color = 'orange';
-        }
-    };
-
-    socket.onclose = (event) => {
-        console.warn('WebSocket连接已关闭', event);
-        if (event.code === 1008) { // 1008: 策略违反 (通常是认证失败)
-            const authErrorRow = logTableBody.insertRow();
-            const authErrorCell = authErrorRow.insertCell();
-            authErrorCell.colSpan = 5;
-            authErrorCell.textContent = '认证失败，请重新登录。';
-            authErrorCell.style.color = 'red';
-            alert('认证失败，请重新登录！');
-            localStorage.removeItem('authToken'); // 清除无效的token
-            window.location.href = '/login'; // 重定向到登录页面
-        }
-    };
+        };
+
+        socket.onclose = (event) => {
+            console.warn('WebSocket连接已关闭', event);
+            if (event.code === 1008) { // 1008: 策略违反 (通常是认证失败)
+                const authErrorRow = logTableBody.insertRow();
+                const authErrorCell = authErrorRow.insertCell();
+                authErrorCell.colSpan = 5;
+                authErrorCell.textContent = '认证失败，请重新登录。';
+                authErrorCell.style.color = 'red';
+                alert('认证失败，请重新登录！');
+                localStorage.removeItem('authToken'); // 清除无效的token
+                window.location.href = '/login'; // 重定向到登录页面
+            } else {
+                setTimeout(connect, 3000); // 自动重连并补发断线期间的日志
+            }
+        };
+
+        socket.onerror = (error) => {
+            console.error('WebSocket发生错误', error);
+        };
+    }
 
-    socket.onerror = (error) => {
-        console.error('WebSocket发生错误', error);
-    };
+    // 先加载消息模板，再接收结构化日志
+    fetch('/api/logs/event-templates', { headers: { 'Authorization': `Bearer ${authToken}` } })
+        .then(response => response.ok ? response.json() : {})
+        .then(templates => { eventTemplates = templates; })
+        .catch(error => console.error('加载日志消息模板失败:', error))
+        .finally(connect);
 
     // Optional: Keep connection alive by sending pings if server supports it
     // setInterval(() => {
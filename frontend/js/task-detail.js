@@ -71,6 +71,37 @@ function getTaskStatusDisplay(task) {
     }
 }
 
+// 在任务标题行之后插入该任务的视频行（首次展开任务时才向后端请求视频列表）
+async function loadTaskVideos(taskHeaderRow, taskId) {
+    const response = await authenticatedFetch(`/api/tasks/${taskId}`, { method: 'GET' });
+    if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.detail || response.statusText);
+    }
+    const task = await response.json();
+    let insertIndex = taskHeaderRow.sectionRowIndex + 1;
+    if (task.videos && task.videos.length > 0) {
+        // 对视频按ID进行排序
+        task.videos.sort((a, b) => a.id - b.id);
+
+        task.videos.forEach((video, index) => {
+            const row = videosListBody.insertRow(insertIndex++);
+            row.classList.add('task-video-item', `task-${taskId}-videos`); // 添加类用于控制显示/隐藏
+            row.innerHTML = `
+                <td>${index + 1}</td>
+                <td>${video.video_title}</td>
+                <td>${formatSecondsToMinutesAndSeconds(video.current_progress_seconds)}</td>
+                <td>${formatSecondsToMinutesAndSeconds(video.total_duration_seconds)}</td>
+                <td>${video.is_completed ? '是' : '否'}</td>
+            `;
+        });
+    } else {
+        const row = videosListBody.insertRow(insertIndex);
+        row.classList.add('task-video-item', `task-${taskId}-videos`); // 确保无视频行也被隐藏/显示
+        row.innerHTML = `<td colspan="5" style="text-align: center;">该任务暂无视频。</td>`; /* colspan 调整为5 */
+    }
+}
+
 // 获取并显示任务详情和视频列表
 async function fetchAndDisplayTaskDetails(credentialId) {
     try {
@@ -107,42 +138,18 @@ async function fetchAndDisplayTaskDetails(credentialId) {
                 const taskSummaryRow = videosListBody.insertRow();
                 taskSummaryRow.innerHTML = `
                     <td colspan="5" class="collapsible-task-header" data-task-id="${task.id}" style="font-weight: bold; background-color: #f2f2f2; padding: 10px; cursor: pointer;">
-                        <span class="toggle-icon">[+]</span> 任务${task.id}: ${cleanTaskName(task.task_name)} - 学时: ${task.study_hours && task.study_hours !== '0小时' ? task.study_hours : '0小时'} - 状态: ${getTaskStatusDisplay(task)}
+                        <span class="toggle-icon">[+]</span> 任务${task.id}: ${cleanTaskName(task.task_name)} - 学时: ${task.study_hours && task.study_hours !== '0小时' ? task.study_hours : '0小时'} - 视频: ${task.completed_video_count} / ${task.video_count} - 状态: ${getTaskStatusDisplay(task)}
                     </td>
                 `;
-
-                if (task.videos && task.videos.length > 0) {
-                    // 对视频按ID进行排序
-                    task.videos.sort((a, b) => a.id - b.id);
-                    
-                    task.videos.forEach((video, index) => {
-                        const row = videosListBody.insertRow();
-                        row.classList.add('task-video-item', `task-${task.id}-videos`); // 添加类用于控制显示/隐藏
-                        row.style.display = 'none'; // 默认隐藏
-                        row.innerHTML = `
-                            <td>${index + 1}</td>
-                            <td>${video.video_title}</td>
-                            <td>${formatSecondsToMinutesAndSeconds(video.current_progress_seconds)}</td>
-                            <td>${formatSecondsToMinutesAndSeconds(video.total_duration_seconds)}</td>
-                            <td>${video.is_completed ? '是' : '否'}</td>
-                        `;
-                    });
-                } else {
-                    const row = videosListBody.insertRow();
-                    row.classList.add('task-video-item', `task-${task.id}-videos`); // 确保无视频行也被隐藏/显示
-                    row.style.display = 'none'; // 默认隐藏
-                    row.innerHTML = `<td colspan="5" style="text-align: center;">该任务暂无视频。</td>`; /* colspan 调整为5 */
-                }
             });
 
-            // 更新顶部的任务摘要信息，可以根据所有任务的总进度来计算
-            const totalTasksCount = tasks.length;
-            const completedTasksCount = tasks.filter(t => t.is_completed).length;
-            const overallProgress = totalTasksCount > 0 ? (completedTasksCount / totalTasksCount * 100).toFixed(2) : '0.00';
+            // 更新顶部的任务摘要信息，使用后端汇总的凭据进度
+            const progress = credentialData.progress;
+            const overallProgress = progress.task_count > 0 ? (progress.completed_task_count / progress.task_count * 100).toFixed(2) : '0.00';
 
             taskNameHeader.textContent = `${websiteName}的任务详情`;
-            taskProgressSpan.textContent = `${completedTasksCount} / ${totalTasksCount} (${overallProgress}%)`;
-            taskHoursSpan.textContent = tasks.reduce((sum, t) => sum + (parseInt(t.study_hours) || 0), 0) + '小时';
+            taskProgressSpan.textContent = `${progress.completed_task_count} / ${progress.task_count} (${overallProgress}%)`;
+            taskHoursSpan.textContent = progress.total_hours + '小时';
 
         } else {
             const errorData = await response.json();
@@ -171,12 +178,24 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 为任务标题添加点击事件，实现收起/展开功能
-    videosListBody.addEventListener('click', (event) => {
+    videosListBody.addEventListener('click', async (event) => {
         const target = event.target.closest('.collapsible-task-header');
         if (target) {
             const taskId = target.dataset.taskId;
-            const videoRows = document.querySelectorAll(`.task-${taskId}-videos`);
             const toggleIcon = target.querySelector('.toggle-icon');
+            if (!target.dataset.videosLoaded) {
+                // 首次展开时加载视频列表，加载后的视频行默认显示
+                target.dataset.videosLoaded = 'true';
+                try {
+                    await loadTaskVideos(target.parentElement, taskId);
+                    if (toggleIcon) toggleIcon.textContent = '[-]';
+                } catch (error) {
+                    delete target.dataset.videosLoaded;
+                    alert('获取视频列表失败: ' + error.message);
+                }
+                return;
+            }
+            const videoRows = document.querySelectorAll(`.task-${taskId}-videos`);
 
             videoRows.forEach(row => {
                 if (row.style.display === 'none') {
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# 将项目根目录添加到 Python 路径，并在导入 backend 之前指定临时 SQLite 数据库（不依赖 MySQL）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='auto_study_tests_'), 'test.db')}")
@@ -0,0 +1,47 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert
+
+from backend.database import log_engine
+from backend.main import app
+from backend.models import Base
+from backend.utils import log_events
+from backend.utils.log_retention import log_entries
+
+
+@pytest.fixture
+def client():
+    Base.metadata.create_all(bind=log_engine)
+    with TestClient(app) as test_client:
+        with log_engine.begin() as conn:
+            conn.execute(delete(log_entries))
+        yield test_client
+    with log_engine.begin() as conn:
+        conn.execute(delete(log_entries))
+
+
+def admin_headers(client: TestClient) -> dict:
+    response = client.post("/api/users/token", data={"username": "admin", "password": "Admin@123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_search_matches_rendered_text_of_structured_logs(client):
+    """ q 同时匹配自由文本日志的消息、结构化日志的参数值和模板固定文本 """
+    with log_engine.begin() as conn:
+        conn.execute(insert(log_entries), [
+            {"level": "INFO", "message": "", "event_code": log_events.VIDEO_FINISHED, "params": {"title": "Intro to Foo"}},
+            {"level": "INFO", "message": "", "event_code": log_events.VIDEO_FINISHED, "params": {"title": "入门课程"}},
+            {"level": "INFO", "message": "", "event_code": log_events.TASK_COMPLETED, "params": {"task_name": "Bar"}},
+            {"level": "INFO", "message": "free text Foo", "event_code": None, "params": None},
+        ])
+    headers = admin_headers(client)
+
+    def search(q: str) -> list:
+        response = client.get("/api/logs", params={"q": q}, headers=headers)
+        assert response.status_code == 200
+        return sorted(item["message"] for item in response.json()["items"])
+
+    assert search("Foo") == ["free text Foo", "视频 'Intro to Foo' 播放完毕。"]
+    assert search("入门") == ["视频 '入门课程' 播放完毕。"]
+    assert search("播放完毕") == ["视频 'Intro to Foo' 播放完毕。", "视频 '入门课程' 播放完毕。"]
+    assert search("Baz") == []
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from backend.database import LogSessionLocal, log_engine
+from backend.models import Base
+from backend.utils import log_retention
+from backend.utils.log_retention import LogPurger, LogRetentionPolicy, log_entries
+
+
+@pytest.fixture
+def log_table():
+    Base.metadata.create_all(bind=log_engine)
+    with log_engine.begin() as conn:
+        conn.execute(delete(log_entries))
+    yield
+    with log_engine.begin() as conn:
+        conn.execute(delete(log_entries))
+
+
+def insert_log(level: str, age_days: int):
+    with log_engine.begin() as conn:
+        conn.execute(insert(log_entries).values(level=level, message=f"{level} {age_days}", timestamp=datetime.now() - timedelta(days=age_days)))
+
+
+def remaining_logs():
+    db = LogSessionLocal()
+    try:
+        return sorted(db.execute(select(log_entries.c.message)).scalars())
+    finally:
+        db.close()
+
+
+def test_run_once_keeps_partitions_for_longer_level_override(log_table, monkeypatch):
+    """ 分区表只删除超过最长保留天数的分区，保留期更长的级别（ERROR=90）不会随默认的 30 天被删除 """
+    dropped_cutoffs = []
+    monkeypatch.setattr(log_retention, "is_log_table_partitioned", lambda bind: True)
+    monkeypatch.setattr(log_retention, "drop_expired_partitions", lambda bind, cutoff: dropped_cutoffs.append(cutoff) or 0)
+    for level, age_days in (("ERROR", 45), ("ERROR", 100), ("INFO", 45), ("INFO", 10), ("DEBUG", 2)):
+        insert_log(level, age_days)
+
+    policy = LogRetentionPolicy(max_age_days=30, level_days={"DEBUG": 1, "ERROR": 90})
+    deleted = LogPurger(policy, batch_pause=0).run_once()
+
+    assert dropped_cutoffs == [(datetime.now() - timedelta(days=90)).date()]
+    assert deleted == 3
+    assert remaining_logs() == ["ERROR 45", "INFO 10"]
+
+
+def test_run_once_skips_partitions_when_a_level_is_kept_forever(log_table, monkeypatch):
+    """ 某个级别的保留天数为 0（不清理）时，不能整个删除分区 """
+    dropped_cutoffs = []
+    monkeypatch.setattr(log_retention, "is_log_table_partitioned", lambda bind: True)
+    monkeypatch.setattr(log_retention, "drop_expired_partitions", lambda bind, cutoff: dropped_cutoffs.append(cutoff) or 0)
+    insert_log("ERROR", 400)
+    insert_log("INFO", 45)
+
+    LogPurger(LogRetentionPolicy(max_age_days=30, level_days={"ERROR": 0}), batch_pause=0).run_once()
+
+    assert dropped_cutoffs == []
+    assert remaining_logs() == ["ERROR 400"]